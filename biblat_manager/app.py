@@ -9,9 +9,10 @@ import click
 from biblat_manager.config import settings
 
 COV = None
+COV_INCLUDE = 'biblat_manager/webapp/*'
 if os.environ.get('FLASK_COVERAGE'):
     import coverage
-    COV = coverage.coverage(branch=True, include='biblat_manager/webapp/*')
+    COV = coverage.coverage(branch=True, include=COV_INCLUDE)
     COV.start()
 
 from biblat_manager.webapp import create_app, models, controllers, utils  # NOQA
@@ -120,11 +121,469 @@ def create_superuser():
         print('Nuevo usuario creado con éxito!')
 
 
+@app.cli.command('import-users')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--format', 'fmt', type=click.Choice(['csv', 'jsonl']),
+              default=None, help='Formato del archivo (default: extensión).')
+@click.option('--chunk-size', type=int, default=500,
+              help='Filas por lote (una consulta $in y un insert_many).')
+@click.option('--workers', type=int, default=None,
+              help='Procesos para calcular los hashes (default: CPUs).')
+@click.option('--resume/--no-resume', default=True,
+              help='Continuar desde el último lote importado.')
+@click.option('--report', type=click.Path(dir_okay=False), default=None,
+              help='Reporte CSV de errores (default: <archivo>.errors.csv).')
+@click.option('--confirmed', is_flag=True, default=False,
+              help='Marcar los correos como confirmados si el archivo no '
+                   'indica email_confirmed.')
+def import_users(path, fmt, chunk_size, workers, resume, report, confirmed):
+    """
+    Importa usuarios desde un archivo CSV o JSONL con las columnas email,
+    password y opcionalmente username y email_confirmed
+    """
+    from biblat_manager.webapp import importer
+    with open(path, 'rb') as f:
+        total = sum(1 for line in f)
+    with click.progressbar(length=total, label='Importando usuarios',
+                           show_pos=True) as bar:
+        summary = importer.import_users(
+            path, fmt=fmt, chunk_size=chunk_size, workers=workers,
+            resume=resume, report=report, email_confirmed=confirmed,
+            rounds=app.config.get('PASSWORD_HASH_ROUNDS'),
+            progress=bar.update)
+    print('Importados: %(imported)d, omitidos: %(skipped)d, '
+          'con error: %(failed)d' % summary)
+    print('Reporte de errores: %s' % summary['report'])
+
+
+@app.cli.command('resend-confirmations')
+@click.option('--batch-size', type=int, default=100,
+              help='Usuarios por lote y por conexión SMTP.')
+@click.option('--rate', type=float, default=None,
+              help='Máximo de correos por segundo.')
+@click.option('--resume/--no-resume', default=True,
+              help='Continuar desde el último lote enviado.')
+@click.option('--queue', is_flag=True, default=False,
+              help='Registrar los correos en el outbox en vez de enviarlos.')
+def resend_confirmations(batch_size, rate, resume, queue):
+    """
+    Reenvía el correo de confirmación a todos los usuarios con el correo
+    electrónico sin confirmar
+    """
+    total = models.User.objects(email_confirmed=False).count()
+    base_url = app.config.get('BASE_URL')
+    with app.test_request_context(base_url=base_url):
+        with click.progressbar(length=total,
+                               label='Reenviando confirmaciones') as bar:
+            summary = controllers.resend_confirmation_emails(
+                batch_size=batch_size, rate=rate,
+                checkpoint=controllers.RESEND_CONFIRMATIONS_CHECKPOINT,
+                resume=resume, queue=queue, progress=bar.update)
+    print('Correos enviados: %(sent)d, fallidos: %(failed)d' % summary)
+
+
+@app.cli.command('bulk-users')
+@click.argument('action', type=click.Choice(controllers.BULK_USER_ACTIONS))
+@click.argument('user_ids', nargs=-1)
+@click.option('--from-file', type=click.File('r'), default=None,
+              help='Archivo con un id de usuario por línea.')
+@click.option('--queue', is_flag=True, default=False,
+              help='Registrar los correos en el outbox en vez de enviarlos.')
+def bulk_users(action, user_ids, from_file, queue):
+    """
+    Aplica ACTION (delete, confirm, resend, reset_password) a los usuarios
+    USER_IDS con una sola operación en mongoDB
+    """
+    user_ids = list(user_ids)
+    if from_file is not None:
+        user_ids.extend(line.strip() for line in from_file if line.strip())
+    if not user_ids:
+        raise click.UsageError('Indique al menos un id de usuario.')
+    base_url = app.config.get('BASE_URL')
+    with app.test_request_context(base_url=base_url):
+        results = controllers.bulk_user_action(action, user_ids, queue=queue)
+    for user_id, status in results.items():
+        print('%s\t%s' % (user_id, status))
+
+
+@app.cli.command('build-password-filter')
+@click.argument('wordlist', type=click.Path(exists=True, dir_okay=False))
+@click.option('--output', default=None,
+              help='Archivo del filtro (default: PASSWORD_FILTER_PATH).')
+@click.option('--error-rate', type=float, default=0.001,
+              help='Tasa de falsos positivos del filtro.')
+def build_password_filter(wordlist, output, error_rate):
+    """
+    Genera el filtro de Bloom de contraseñas comunes a partir de WORDLIST
+    (una contraseña por línea)
+    """
+    from biblat_manager.webapp import passwordfilter
+    output = output or app.config.get('PASSWORD_FILTER_PATH')
+    if not output:
+        raise click.UsageError('Indique --output o PASSWORD_FILTER_PATH.')
+    count = passwordfilter.build_password_filter(wordlist, output,
+                                                 error_rate=error_rate)
+    print('%d contraseñas, %d bytes: %s' % (count, os.path.getsize(output),
+                                            output))
+
+
+# Mail
+@app.cli.command('mail-worker')
+@click.option('--batch-size', type=int, default=None,
+              help='Correos por lote (default: MAIL_OUTBOX_BATCH_SIZE).')
+@click.option('--interval', type=float, default=5.0,
+              help='Segundos de espera cuando el outbox está vacío.')
+@click.option('--once', is_flag=True, default=False,
+              help='Vaciar el outbox una vez y terminar.')
+def mail_worker(batch_size, interval, once):
+    """Envía los correos registrados en el outbox"""
+    import time
+    from biblat_manager.webapp import outbox
+    while True:
+        sent, failed = outbox.process_outbox(batch_size)
+        if sent or failed:
+            print('Correos enviados: %d, fallidos: %d' % (sent, failed))
+        if once:
+            break
+        time.sleep(interval)
+
+
+# mongoDB
+@app.cli.command('migrate-user-ids')
+@click.option('--batch-size', type=int, default=1000,
+              help='Usuarios por lote.')
+@click.option('--dry-run', is_flag=True, default=False,
+              help='Sólo contar los usuarios a migrar.')
+@click.option('--samples', type=int, default=200,
+              help='Búsquedas por _id para medir la latencia.')
+def migrate_user_ids(batch_size, dry_run, samples):
+    """
+    Migra los ids de los usuarios de string hexadecimal a UUID binario y
+    reporta el tamaño de los índices y la latencia antes y después
+    """
+    from biblat_manager.webapp import userids
+
+    def print_report(title, report):
+        print('== %s ==' % title)
+        print('ids string: %(string)d, binarios: %(binary)d' % report['ids'])
+        indexes = report['indexes']
+        if indexes is None:
+            print('tamaño de índices: no disponible')
+        else:
+            print('tamaño total de índices: %s bytes, documento promedio: '
+                  '%s bytes' % (indexes['total_index_size'],
+                                indexes['avg_obj_size']))
+            for name, size in sorted(indexes['index_sizes'].items()):
+                print('  %-30s %12s bytes' % (name, size))
+        print('búsqueda por _id (%(count)d): p50 %(p50_ms).3f ms, '
+              'p95 %(p95_ms).3f ms' % report['lookup'])
+
+    print_report('Antes', userids.user_id_report(samples))
+    if dry_run:
+        summary = userids.migrate_user_ids(dry_run=True)
+        print('Por migrar: %(migrated)d, se omitirían: %(skipped)d' %
+              summary)
+        return
+    total = userids.id_format_counts(models.User._get_collection())['string']
+    with click.progressbar(length=total, label='Migrando ids') as bar:
+        summary = userids.migrate_user_ids(batch_size, progress=bar.update)
+    print('Migrados: %(migrated)d, omitidos: %(skipped)d, '
+          'con error: %(failed)d' % summary)
+    print_report('Después', userids.user_id_report(samples))
+
+
+@app.cli.command('migrate')
+@click.option('--batch-size', type=int, default=None,
+              help='Documentos por lote (default: MIGRATIONS_BATCH_SIZE).')
+@click.option('--target', type=int, default=None,
+              help='Aplicar hasta esta versión.')
+@click.option('--dry-run', is_flag=True, default=False,
+              help='No escribir: estimar la duración con una muestra.')
+@click.option('--sample', type=int, default=100,
+              help='Documentos de la muestra de --dry-run.')
+def migrate(batch_size, target, dry_run, sample):
+    """
+    Aplica las migraciones de datos pendientes (biblat_manager/migrations)
+    por lotes; una ejecución interrumpida continúa donde se quedó
+    """
+    from biblat_manager.webapp.migrations import MigrationRunner
+    batch_size = batch_size or app.config['MIGRATIONS_BATCH_SIZE']
+    runner = MigrationRunner(batch_size=batch_size)
+    pending = runner.pending(target)
+    if not pending:
+        print('No hay migraciones pendientes')
+        return
+    if dry_run:
+        total = 0.0
+        for migration in pending:
+            estimate = runner.estimate(migration, sample)
+            total += estimate['estimated_seconds']
+            print('%s: %d documentos en %d lotes, muestra de %d (%d '
+                  'operaciones), ~%.1f s' % (
+                      migration.label, estimate['documents'],
+                      estimate['batches'], estimate['sampled'],
+                      estimate['operations'], estimate['estimated_seconds']))
+        print('Total estimado (lectura y transformación): ~%.1f s' % total)
+        return
+    for migration in pending:
+        documents = migration.get_collection().count_documents(
+            migration.query)
+        with click.progressbar(length=documents,
+                               label=migration.label) as bar:
+            runner.progress = bar.update
+            summary = runner.apply(migration)
+        print('%s: %s' % (migration.label, ', '.join(
+            '%s=%s' % item for item in sorted(summary.items()))))
+
+
+@app.cli.command('migrate-status')
+def migrate_status():
+    """Lista las migraciones de datos aplicadas y pendientes"""
+    from biblat_manager.webapp.migrations import MigrationRunner
+    runner = MigrationRunner()
+    applied = runner.applied()
+    for migration in runner.migrations:
+        state = applied.get(migration.version)
+        if state is None:
+            print('[ ] %s' % migration.label)
+        else:
+            print('[x] %s  %s (%.1f s)' % (
+                migration.label,
+                state['applied_at'].strftime('%Y-%m-%d %H:%M:%S'),
+                state.get('seconds', 0)))
+
+
+@app.cli.command('ensure-indexes')
+def ensure_indexes():
+    """Construye en segundo plano los índices declarados en los modelos"""
+    from biblat_manager.webapp import indexes
+    for collection, missing in indexes.ensure_indexes().items():
+        print('%s: %d índices creados %s' % (collection, len(missing),
+                                               missing or ''))
+
+
+@app.cli.command('index-audit')
+def index_audit():
+    """
+    Ejecuta explain() sobre las consultas registradas y reporta las que
+    recorren toda la colección (COLLSCAN) u ordenan en memoria (SORT)
+    """
+    from biblat_manager.webapp import indexes
+    failures = 0
+    for name, stages, problems in indexes.audit_query_shapes():
+        status = 'OK' if not problems else ', '.join(problems)
+        failures += bool(problems)
+        print('%-45s %-30s %s' % (name, ' > '.join(stages), status))
+    sys.exit(1 if failures else 0)
+
+
+@app.cli.command('warm-up')
+def warm_up():
+    """
+    Ejecuta el warm-up de los workers de gunicorn (plantillas, catálogos y
+    conexión a mongoDB) y reporta el tiempo de cada paso
+    """
+    import time
+    from biblat_manager.webapp import warmup
+    timings = warmup.warm_up(app, started=time.perf_counter())
+    for name, (seconds, count) in timings.items():
+        print('%-15s %9.1f ms  (%d)' % (name, seconds * 1000, count))
+
+
+# Archivos estáticos
+@app.cli.command('build-assets')
+def build_assets():
+    """
+    Genera en static/dist los paquetes CSS/JS con hash en el nombre, sus
+    versiones .gz y el manifiesto que usa static_url
+    """
+    from biblat_manager.webapp import assets
+    manifest = assets.build_assets(app.static_folder)
+    for name, hashed in sorted(manifest.items()):
+        print('%-35s -> %s' % (name, hashed))
+
+
+# Benchmarks
+@app.cli.command('bench')
+@click.option('--target', '-t', multiple=True,
+              type=click.Choice(['mongomock', 'mongod']),
+              help='Base de datos (default: mongomock y mongod si responde).')
+@click.option('--sizes', default='10,10000',
+              help='Usuarios en la colección para list_users, p. ej. '
+                   '10,10000,1000000.')
+@click.option('--iterations', '-n', type=int, default=100,
+              help='Iteraciones por benchmark.')
+@click.option('--save/--no-save', default=False,
+              help='Guardar los resultados como nueva línea base.')
+@click.option('--threshold', type=float, default=0.2,
+              help='Cambio en p95 considerado regresión (0.2 = 20%).')
+def bench(target, sizes, iterations, save, threshold):
+    """Ejecuta los benchmarks y los compara con la línea base"""
+    from biblat_manager.benchmarks import core, scenarios
+    targets = list(target) or ['mongomock', 'mongod']
+    sizes = [int(size) for size in sizes.split(',') if size.strip()]
+    regressions = 0
+    for name in targets:
+        if name == 'mongod' and not scenarios.mongod_available(
+                settings.config['benchmark']):
+            print('mongod no disponible, se omite')
+            continue
+        print('== %s ==' % name)
+        bench_app = scenarios.create_bench_app(name)
+        results = scenarios.run_benchmarks(
+            bench_app, sizes, iterations,
+            progress=lambda step: print('... %s' % step))
+        print(core.format_results(results))
+        path = core.baseline_path(name)
+        for row in core.compare(results, core.load_baseline(path),
+                                threshold):
+            regressions += row[4]
+            print('%-40s p95 %9.3f -> %9.3f ms (%+.0f%%)%s' % (
+                row[0], row[1], row[2], row[3] * 100,
+                '  REGRESIÓN' if row[4] else ''))
+        if save:
+            core.save_baseline(path, name, results)
+            print('Línea base guardada en: %s' % path)
+    sys.exit(1 if regressions else 0)
+
+
+@app.cli.command('bench-workers')
+@click.option('--worker-class', '-k', multiple=True,
+              type=click.Choice(['sync', 'gevent']),
+              help='Clase de worker de gunicorn (default: sync y gevent).')
+@click.option('--clients', default='50,200,1000',
+              help='Clientes concurrentes, p. ej. 50,200,1000.')
+@click.option('--workers', '-w', type=int, default=2,
+              help='Workers de gunicorn.')
+@click.option('--duration', type=float, default=10.0,
+              help='Segundos de carga por nivel de concurrencia.')
+@click.option('--path', default='/login', help='Ruta a solicitar.')
+@click.option('--config', 'config_name', default='testing',
+              type=click.Choice(sorted(settings.config)),
+              help='Configuración del servidor (benchmark usa mongod).')
+def bench_workers(worker_class, clients, workers, duration, path,
+                  config_name):
+    """Compara el throughput de los workers sync y gevent de gunicorn"""
+    from biblat_manager.benchmarks import core, workers as bench
+    results = bench.run_worker_benchmarks(
+        worker_classes=list(worker_class) or ['sync', 'gevent'],
+        clients=[int(count) for count in clients.split(',') if count],
+        workers=workers, duration=duration, path=path,
+        config_name=config_name,
+        progress=lambda step: print('... %s' % step))
+    print(core.format_results(results))
+    for name, stats in sorted(results.items()):
+        if stats['errors']:
+            print('%s: %d errores' % (name, stats['errors']))
+
+
+@app.cli.command('bench-emails')
+@click.option('--lengths', default='1000,10000,100000',
+              help='Longitud de las entradas maliciosas, p. ej. 1000,10000.')
+@click.option('--iterations', '-n', type=int, default=20,
+              help='Iteraciones por benchmark.')
+def bench_emails(lengths, iterations):
+    """
+    Compara el tiempo de validación de correos del validador lineal y la
+    expresión regular anterior, incluyendo entradas maliciosas
+    """
+    from biblat_manager.benchmarks import core, emails
+    results = emails.run_email_benchmarks(
+        lengths=[int(length) for length in lengths.split(',') if length],
+        iterations=iterations)
+    print(core.format_results(results))
+
+
+@app.cli.command('loadtest')
+@click.option('--url', default=None,
+              help='URL del servidor (default: dentro del proceso).')
+@click.option('--target', '-t', default='mongomock',
+              type=click.Choice(['mongomock', 'mongod']),
+              help='Base de datos de la prueba dentro del proceso.')
+@click.option('--sessions', '-c', type=int, default=10,
+              help='Sesiones de personal concurrentes.')
+@click.option('--duration', type=float, default=30.0,
+              help='Segundos de carga.')
+@click.option('--users', type=int, default=1000,
+              help='Usuarios del conjunto de datos sintético.')
+@click.option('--seed', is_flag=True, default=False,
+              help='Con --url, generar los usuarios sintéticos en la base de '
+                   'esta configuración (sólo testing o benchmark).')
+@click.option('--edit-ratio', type=float, default=0.2,
+              help='Probabilidad de editar el usuario abierto.')
+@click.option('--think', type=float, default=0.0,
+              help='Pausa en segundos entre peticiones de una sesión.')
+@click.option('--email', default=None,
+              help='Correo del usuario de todas las sesiones (default: un '
+                   'usuario sintético por sesión).')
+@click.option('--password', default=None,
+              help='Contraseña del usuario de --email.')
+@click.option('--random-seed', type=int, default=None,
+              help='Semilla para repetir la misma navegación.')
+@click.option('--output', type=click.Path(dir_okay=False), default=None,
+              help='Guardar los resultados en JSON.')
+def loadtest(url, target, sessions, duration, users, seed, edit_ratio,
+             think, email, password, random_seed, output):
+    """
+    Simula sesiones concurrentes de personal (login, listado, detalle,
+    edición, idioma y menú) y reporta la latencia y los errores por
+    endpoint. Cada sesión usa su propio usuario sintético; contra un
+    servidor con más sesiones que RATELIMIT_IP el límite de intentos debe
+    estar desactivado (RATELIMIT_ENABLED)
+    """
+    from biblat_manager.benchmarks import core, loadtest as load, scenarios
+    credentials = None
+    if email:
+        credentials = {'email': email, 'password': password or ''}
+    elif users < 2 * sessions:
+        raise click.BadParameter(
+            'se necesitan al menos %d usuarios sintéticos para %d sesiones'
+            % (2 * sessions, sessions), param_hint='--users')
+    if seed and url is not None and not app.config.get('TESTING'):
+        # seed_users crea un administrador con contraseña conocida
+        raise click.UsageError('--seed sólo se permite con la configuración '
+                               'testing o benchmark (BIBLAT_CONFIG)')
+    if url is None:
+        if target == 'mongod' and not scenarios.mongod_available(
+                settings.config['benchmark']):
+            print('mongod no disponible')
+            sys.exit(1)
+        load_app = scenarios.create_bench_app(target)
+        with load_app.app_context():
+            scenarios.seed_users(users)
+
+        def transport_factory():
+            return load.AppTransport(load_app)
+    else:
+        if seed:
+            scenarios.seed_users(users)
+
+        def transport_factory():
+            return load.HttpTransport(url)
+    print('%d sesiones durante %.0f s contra %s' % (
+        sessions, duration, url or target))
+    results = load.run_loadtest(
+        transport_factory, sessions=sessions, duration=duration,
+        edit_ratio=edit_ratio, think=think, credentials=credentials,
+        seed=random_seed)
+    print(load.format_loadtest(results))
+    if '429' in results.get('loadtest:login.post', {}).get('error_codes', {}):
+        print('Hubo logins rechazados por el límite de intentos (429): '
+              'desactive RATELIMIT_ENABLED en el servidor o amplíe '
+              'RATELIMIT_IP')
+    if output:
+        core.save_baseline(output, url or target, results)
+        print('Resultados guardados en: %s' % output)
+    sys.exit(1 if any(stats['errors'] for stats in results.values()) else 0)
+
+
 # Comando de pruebas unitarias
 @app.cli.command()
 @click.option('--coverage/--no-coverage', default=False,
               help='Ejecutar tests con cobertura.')
-def test(coverage):
+@click.option('--parallel', type=int, default=1,
+              help='Procesos para ejecutar los tests (0: uno por CPU).')
+def test(coverage, parallel):
     """Ejecutar pruebas unitarias."""
     if coverage and not os.environ.get('FLASK_COVERAGE'):
         import subprocess
@@ -132,11 +591,22 @@ def test(coverage):
         sys.exit(subprocess.call(sys.argv))
 
     import unittest
-    tests = unittest.TestLoader().discover('biblat_manager/tests')
-    ret = not unittest.TextTestRunner(verbosity=2).run(tests).wasSuccessful()
+    if parallel == 1:
+        tests = unittest.TestLoader().discover('biblat_manager/tests')
+        ret = not unittest.TextTestRunner(verbosity=2).run(
+            tests).wasSuccessful()
+    else:
+        from biblat_manager.tests.parallel import run_parallel
+        tests = unittest.TestLoader().discover('biblat_manager/tests',
+                                               top_level_dir='.')
+        ret = not run_parallel(tests, parallel or os.cpu_count(),
+                               coverage_include=COV_INCLUDE if COV else None)
 
     if COV:
         COV.stop()
+        if parallel != 1:
+            # Datos de cada proceso (.coverage.*)
+            COV.combine()
         COV.save()
         print('Coverage Summary:')
         COV.report()
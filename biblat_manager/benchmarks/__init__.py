@@ -0,0 +1,18 @@
+# -*- coding: utf-8 -*-
+"""
+    Benchmarks de las rutas críticas de Biblat Manager, se ejecutan con:
+
+        flask bench [--target mongomock|mongod] [--sizes 10,10000] [--save]
+
+    Los resultados se comparan con la línea base guardada en
+    ``biblat_manager/benchmarks/baselines/<target>.json``.
+
+    El throughput de gunicorn con workers sync y gevent se compara con:
+
+        flask bench-workers [--clients 50,200,1000] [--config benchmark]
+
+    Carga de extremo a extremo con sesiones de personal concurrentes
+    (dentro del proceso o contra un gunicorn ya iniciado):
+
+        flask loadtest [--sessions 50] [--duration 60] [--url http://...]
+"""
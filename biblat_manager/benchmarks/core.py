@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+import datetime
+import json
+import os
+import platform
+import time
+
+BASELINES_DIR = os.path.join(os.path.dirname(__file__), 'baselines')
+
+
+def percentile(samples, pct):
+    """Percentil ``pct`` (0-100) de ``samples`` por rango más cercano"""
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    rank = int(round(pct / 100.0 * (len(ordered) - 1)))
+    return ordered[rank]
+
+
+def summarize(samples, elapsed):
+    """
+    Regresa las estadísticas de una lista de latencias (segundos):
+    p50/p95/p99/media en milisegundos y operaciones por segundo.
+    """
+    count = len(samples)
+    return {
+        'count': count,
+        'p50_ms': percentile(samples, 50) * 1000,
+        'p95_ms': percentile(samples, 95) * 1000,
+        'p99_ms': percentile(samples, 99) * 1000,
+        'mean_ms': (sum(samples) / count * 1000) if count else 0.0,
+        'ops_per_sec': count / elapsed if elapsed else 0.0,
+    }
+
+
+def measure(func, iterations, warmup=3, setup=None):
+    """
+    Ejecuta ``func`` ``iterations`` veces (más ``warmup`` sin medir) y
+    regresa sus estadísticas. ``setup`` se llama antes de cada iteración
+    y su tiempo no se cuenta.
+    """
+    for i in range(warmup):
+        func(setup() if setup else None)
+    samples = []
+    elapsed = 0.0
+    for i in range(iterations):
+        arg = setup() if setup else None
+        start = time.perf_counter()
+        func(arg)
+        duration = time.perf_counter() - start
+        samples.append(duration)
+        elapsed += duration
+    return summarize(samples, elapsed)
+
+
+def baseline_path(target):
+    return os.path.join(BASELINES_DIR, '%s.json' % target)
+
+
+def save_baseline(path, target, results):
+    directory = os.path.dirname(path)
+    if directory and not os.path.isdir(directory):
+        os.makedirs(directory)
+    data = {
+        'meta': {
+            'target': target,
+            'date': datetime.datetime.utcnow().isoformat(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+        },
+        'results': results,
+    }
+    with open(path, 'w') as f:
+        json.dump(data, f, indent=2, sort_keys=True)
+
+
+def load_baseline(path):
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def compare(results, baseline, threshold=0.2, metric='p95_ms'):
+    """
+    Compara ``results`` con ``baseline['results']`` usando ``metric``.
+    Regresa una lista de tuplas ``(nombre, antes, ahora, cambio,
+    regresion)``, donde ``regresion`` es True si el cambio supera
+    ``threshold`` (0.2 = 20% más lento).
+    """
+    rows = []
+    previous = (baseline or {}).get('results', {})
+    for name, stats in sorted(results.items()):
+        if name not in previous or not previous[name].get(metric):
+            continue
+        before = previous[name][metric]
+        now = stats[metric]
+        change = (now - before) / before
+        rows.append((name, before, now, change, change > threshold))
+    return rows
+
+
+def format_results(results):
+    lines = ['%-40s %8s %9s %9s %9s %10s' % (
+        'benchmark', 'n', 'p50 ms', 'p95 ms', 'p99 ms', 'ops/s')]
+    for name, stats in sorted(results.items()):
+        lines.append('%-40s %8d %9.3f %9.3f %9.3f %10.1f' % (
+            name, stats['count'], stats['p50_ms'], stats['p95_ms'],
+            stats['p99_ms'], stats['ops_per_sec']))
+    return '\n'.join(lines)
@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+"""
+    Benchmark de la validación de correos: compara ``is_valid_email`` con
+    la expresión regular anterior en correos normales y en entradas
+    construidas para forzar el backtracking, de longitud creciente.
+"""
+import re
+
+from biblat_manager.webapp.emailvalidator import (is_valid_email,
+                                                  validate_emails)
+
+from .core import measure
+
+# Expresión usada antes en ``utils.check_valid_email`` (sólo como referencia)
+LEGACY_REGEX_EMAIL = re.compile(
+    r"[a-z0-9!#$%&'*+/=?^_`{|}~-]+(?:\.[a-z0-9!#$%&'*+/=?^_`{|}~-]+)*@(?:["
+    r"a-z0-9](?:[a-z0-9-]*[a-z0-9])?\.)+[a-z0-9](?:[a-z0-9-]*[a-z0-9])?",
+    re.IGNORECASE)
+
+ENGINES = {
+    'linear': is_valid_email,
+    'regex': lambda email: bool(LEGACY_REGEX_EMAIL.match(email)),
+}
+
+# Entradas que obligan a la expresión anterior a retroceder sobre todo el
+# texto antes de rechazarlo
+WORST_CASES = {
+    'local_dots': lambda n: 'a.' * n,
+    'label_hyphen': lambda n: 'a@' + 'a-' * n + '.a',
+    'label_no_dot': lambda n: 'a@' + 'a-' * n + '_',
+}
+VALID_EMAILS = ['usuario%d@biblat.unam.mx' % i for i in range(100)]
+
+
+def run_email_benchmarks(lengths=(1000, 10000, 100000), iterations=20,
+                         progress=None):
+    """
+    Regresa ``{'email:<motor>:<caso>': estadísticas}``: ``valid`` valida
+    100 correos normales, ``<caso>.<n>`` una entrada maliciosa de ``n``
+    repeticiones y ``batch`` usa ``validate_emails``.
+    """
+    results = {}
+    for engine, validate in sorted(ENGINES.items()):
+        if progress:
+            progress(engine)
+
+        def run_valid(arg, validate=validate):
+            for email in VALID_EMAILS:
+                assert validate(email)
+        results['email:%s:valid' % engine] = measure(run_valid, iterations)
+        for case, build in sorted(WORST_CASES.items()):
+            for length in lengths:
+                email = build(length)
+
+                def run_worst(arg, email=email, validate=validate):
+                    assert not validate(email)
+                results['email:%s:%s.%d' % (engine, case, length)] = \
+                    measure(run_worst, iterations)
+
+    def run_batch(arg):
+        assert all(validate_emails(VALID_EMAILS))
+    results['email:linear:batch'] = measure(run_batch, iterations)
+    return results
@@ -0,0 +1,267 @@
+# -*- coding: utf-8 -*-
+"""
+    Generador de carga de extremo a extremo: N sesiones concurrentes de
+    personal (un hilo por sesión) que inician sesión y navegan como en el
+    uso real (listado de usuarios con distintos ``order_by`` y páginas,
+    detalles, ediciones, cambio de idioma y menú). Las peticiones se hacen
+    dentro del proceso con el cliente de pruebas de Flask o contra una URL
+    (p. ej. gunicorn) y se reportan los percentiles de latencia y los
+    errores por endpoint.
+
+    Cada sesión inicia sesión con su propio usuario sintético confirmado
+    de ``scenarios.seed_users`` (``session_credentials``), para no agotar
+    el límite de intentos por correo (RATELIMIT_EMAIL). El límite por IP
+    (RATELIMIT_IP, 30/60 por omisión) sí se comparte: contra un servidor
+    con más sesiones que esa capacidad se debe desactivar
+    (RATELIMIT_ENABLED) o ampliar; los 429 se reportan en ``login.post``.
+    Las ediciones sólo se envían para los usuarios sintéticos
+    (``bench<n>@biblat.unam.mx``).
+"""
+import collections
+import html
+import http.cookiejar
+import random
+import re
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+
+from .core import summarize
+from .scenarios import ADMIN, SYNTHETIC_EMAIL_FORMAT
+
+ORDER_BY = (None, 'username', '-username', 'email', '-email',
+            'email_confirmed', '-email_confirmed')
+LANGUAGES = ('es_MX', 'en_US')
+
+USER_ID = re.compile(r'/usuarios/detalle/([0-9a-f]{32})')
+NEXT_PAGE = re.compile(r'href="([^"]+)" aria-label="Next"')
+INPUT = r'<input[^>]*\bname="%s"[^>]*>'
+VALUE = re.compile(r'\bvalue="([^"]*)"')
+SYNTHETIC_EMAIL = re.compile(r'^bench\d+@biblat\.unam\.mx$')
+
+
+def input_value(body, name):
+    """Valor del ``<input>`` ``name`` de un formulario (None si no está)"""
+    field = re.search(INPUT % re.escape(name), body or '')
+    value = VALUE.search(field.group(0)) if field else None
+    return html.unescape(value.group(1)) if value else None
+
+
+def session_credentials(index):
+    """
+    Usuario sintético de la sesión ``index``: ``seed_users`` confirma los
+    usuarios impares, por lo que se necesitan ``2 * sesiones`` usuarios
+    """
+    return {'email': SYNTHETIC_EMAIL_FORMAT % (2 * index + 1),
+            'password': ADMIN['password']}
+
+
+class AppTransport(object):
+    """Peticiones dentro del proceso con ``app.test_client()``"""
+
+    def __init__(self, app):
+        self.client = app.test_client()
+
+    def request(self, method, path, data=None):
+        response = self.client.open(path, method=method, data=data)
+        return response.status_code, response.get_data(as_text=True)
+
+
+class _NoRedirect(urllib.request.HTTPRedirectHandler):
+    # Se mide cada petición por separado, sin seguir las redirecciones
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+class HttpTransport(object):
+    """Peticiones HTTP contra ``base_url`` con cookies de sesión propias"""
+
+    def __init__(self, base_url, timeout=30):
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+        self.opener = urllib.request.build_opener(
+            urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()),
+            _NoRedirect)
+
+    def request(self, method, path, data=None):
+        body = urllib.parse.urlencode(data).encode('utf-8') \
+            if data is not None else None
+        request = urllib.request.Request(self.base_url + path, data=body,
+                                         method=method)
+        try:
+            with self.opener.open(request, timeout=self.timeout) as response:
+                return response.status, response.read().decode('utf-8')
+        except urllib.error.HTTPError as e:
+            return e.code, e.read().decode('utf-8', 'replace')
+
+
+class LoadStats(object):
+    """Latencias y errores por endpoint, compartidos por las sesiones"""
+
+    def __init__(self):
+        self.samples = collections.defaultdict(list)
+        self.errors = collections.defaultdict(collections.Counter)
+        self._lock = threading.Lock()
+
+    def record(self, endpoint, seconds, error=None):
+        with self._lock:
+            if error is None:
+                self.samples[endpoint].append(seconds)
+            else:
+                self.errors[endpoint][error] += 1
+
+    def results(self, elapsed):
+        """
+        Regresa ``{'loadtest:<endpoint>': estadísticas}`` de ``summarize``
+        más ``errors`` (total) y ``error_codes``.
+        """
+        results = {}
+        for endpoint in set(self.samples) | set(self.errors):
+            stats = summarize(self.samples.get(endpoint, []), elapsed)
+            errors = self.errors.get(endpoint, collections.Counter())
+            stats['errors'] = sum(errors.values())
+            stats['error_codes'] = dict((str(code), count)
+                                        for code, count in errors.items())
+            results['loadtest:%s' % endpoint] = stats
+        return results
+
+
+class StaffSession(object):
+    """
+    Una sesión de personal. ``edit_ratio`` es la probabilidad de editar el
+    usuario abierto en cada vuelta y ``think`` la pausa entre peticiones.
+    """
+
+    def __init__(self, transport, stats, credentials=None, edit_ratio=0.2,
+                 think=0.0, seed=None):
+        self.transport = transport
+        self.stats = stats
+        self.credentials = credentials or ADMIN
+        self.edit_ratio = edit_ratio
+        self.think = think
+        self.random = random.Random(seed)
+        self.user_ids = []
+
+    def request(self, endpoint, method, path, data=None, expected=(200,)):
+        start = time.perf_counter()
+        try:
+            status, body = self.transport.request(method, path, data)
+        except Exception as e:
+            self.stats.record(endpoint, None, error=type(e).__name__)
+            return None
+        seconds = time.perf_counter() - start
+        if status not in expected:
+            self.stats.record(endpoint, seconds, error=status)
+            return None
+        self.stats.record(endpoint, seconds)
+        if self.think:
+            time.sleep(self.think)
+        return body
+
+    def _form(self, body, **data):
+        token = input_value(body, 'csrf_token')
+        if token:
+            data['csrf_token'] = token
+        return data
+
+    def login(self):
+        body = self.request('login', 'GET', '/login')
+        data = self._form(body, email=self.credentials['email'],
+                          password=self.credentials['password'])
+        return self.request('login.post', 'POST', '/login', data,
+                            expected=(302,)) is not None
+
+    def browse(self):
+        order_by = self.random.choice(ORDER_BY)
+        path = '/usuarios'
+        if order_by:
+            path += '?order_by=%s' % order_by
+        for page in range(self.random.randint(1, 3)):
+            body = self.request('list_users', 'GET', path)
+            if body is None:
+                return
+            self.user_ids = USER_ID.findall(body) or self.user_ids
+            next_page = NEXT_PAGE.search(body)
+            if not next_page:
+                break
+            path = html.unescape(next_page.group(1))
+
+    def open_user(self):
+        if not self.user_ids:
+            return
+        user_id = self.random.choice(self.user_ids)
+        self.request('user_detail', 'GET', '/usuarios/detalle/%s' % user_id)
+        if self.random.random() < self.edit_ratio:
+            self.edit_user(user_id)
+
+    def edit_user(self, user_id):
+        path = '/usuarios/editar/%s' % user_id
+        body = self.request('user_edit', 'GET', path)
+        if body is None:
+            return
+        email = input_value(body, 'email')
+        username = input_value(body, 'username')
+        if not (email and username and SYNTHETIC_EMAIL.match(email)):
+            return
+        data = self._form(body, username=username, email=email,
+                          password=ADMIN['password'],
+                          confirm=ADMIN['password'])
+        self.request('user_edit.post', 'POST', path, data)
+
+    def switch_locale(self):
+        self.request('set_locale', 'GET',
+                     '/set_locale/%s/' % self.random.choice(LANGUAGES),
+                     expected=(302,))
+
+    def toggle_menu(self):
+        self.request('menutoggle', 'GET', '/menutoggle/')
+
+    def run(self, deadline):
+        if not self.login():
+            return
+        while time.perf_counter() < deadline:
+            self.browse()
+            self.open_user()
+            self.switch_locale()
+            self.toggle_menu()
+
+
+def run_loadtest(transport_factory, sessions=10, duration=30.0,
+                 edit_ratio=0.2, think=0.0, credentials=None, seed=None):
+    """
+    Ejecuta ``sessions`` sesiones concurrentes durante ``duration``
+    segundos; ``transport_factory()`` crea el transporte (cookies propias)
+    de cada sesión. Sin ``credentials`` cada sesión usa su propio usuario
+    (``session_credentials``). Regresa los resultados de
+    ``LoadStats.results``.
+    """
+    stats = LoadStats()
+    start = time.perf_counter()
+    deadline = start + duration
+    threads = []
+    for i in range(sessions):
+        session = StaffSession(
+            transport_factory(), stats,
+            credentials=credentials or session_credentials(i),
+            edit_ratio=edit_ratio, think=think,
+            seed=None if seed is None else seed + i)
+        thread = threading.Thread(target=session.run, args=(deadline,),
+                                  name='loadtest-%d' % i, daemon=True)
+        threads.append(thread)
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return stats.results(time.perf_counter() - start)
+
+
+def format_loadtest(results):
+    lines = ['%-30s %8s %9s %9s %9s %9s %8s' % (
+        'endpoint', 'n', 'p50 ms', 'p95 ms', 'p99 ms', 'req/s', 'errores')]
+    for name, stats in sorted(results.items()):
+        lines.append('%-30s %8d %9.3f %9.3f %9.3f %9.1f %8d%s' % (
+            name, stats['count'], stats['p50_ms'], stats['p95_ms'],
+            stats['p99_ms'], stats['ops_per_sec'], stats['errors'],
+            ' %s' % stats['error_codes'] if stats['errors'] else ''))
+    return '\n'.join(lines)
@@ -0,0 +1,205 @@
+# -*- coding: utf-8 -*-
+import itertools
+
+from flask import current_app, render_template, url_for
+from mongoengine.connection import disconnect
+from pymongo import MongoClient
+from pymongo.errors import PyMongoError
+
+from biblat_manager.webapp import create_app, limiter, user_cache, utils
+from biblat_manager.webapp.models import User, load_user
+from biblat_manager.webapp.pagination import encode_cursor
+
+from .core import measure
+
+ADMIN = {
+    'email': 'bench-admin@biblat.unam.mx',
+    'password': 'F00barbaz$',
+}
+# Usuarios de ``seed_users``: los impares tienen el correo confirmado
+SYNTHETIC_USERNAME_FORMAT = 'bench%07d'
+SYNTHETIC_EMAIL_FORMAT = 'bench%07d@biblat.unam.mx'
+
+# Configuración de la aplicación para cada destino de los benchmarks
+TARGETS = {
+    'mongomock': 'testing',
+    'mongod': 'benchmark',
+}
+
+
+def mongod_available(app_config):
+    """Regresa True si el mongod de la configuración ``benchmark`` responde"""
+    settings = app_config.MONGODB_SETTINGS
+    try:
+        client = MongoClient(settings['host'], settings.get('port', 27017),
+                             serverSelectionTimeoutMS=500)
+        client.admin.command('ping')
+        return True
+    except PyMongoError:
+        return False
+
+
+def create_bench_app(target):
+    """
+    Crea la aplicación para ``target`` con la base de datos vacía. El
+    limitador de intentos de login se desactiva para medir sólo la vista.
+    """
+    disconnect()
+    app = create_app(TARGETS[target])
+    limiter.enabled = False
+    with app.app_context():
+        User._get_collection().database.client.drop_database(
+            app.config['MONGODB_SETTINGS']['db'])
+    return app
+
+
+def seed_users(total, chunk=10000):
+    """
+    Completa la colección de usuarios hasta ``total`` documentos con
+    inserciones masivas, todos con la contraseña de ``ADMIN``.
+    """
+    collection = User._get_collection()
+    if not User.get_by_email(ADMIN['email']):
+        User(username='bench-admin', email=ADMIN['email'],
+             password=ADMIN['password'], email_confirmed=True).save()
+    password = User.get_by_email(ADMIN['email']).password
+    existing = collection.count_documents({})
+    id_field = User._fields['_id']
+    counter = itertools.count(existing)
+    while existing < total:
+        size = min(chunk, total - existing)
+        docs = []
+        for i in range(size):
+            n = next(counter)
+            docs.append({
+                '_id': id_field.to_mongo(utils.generate_uuid_32_string()),
+                'username': SYNTHETIC_USERNAME_FORMAT % n,
+                'email': SYNTHETIC_EMAIL_FORMAT % n,
+                'password': password,
+                'email_confirmed': bool(n % 2),
+            })
+        collection.insert_many(docs, ordered=False)
+        existing += size
+
+
+def logged_client(app):
+    client = app.test_client()
+    with app.test_request_context():
+        client.post(url_for('main.login'), data=ADMIN)
+    return client
+
+
+def bench_login(app, iterations):
+    with app.test_request_context():
+        login_url = url_for('main.login')
+
+    def run(client):
+        response = client.post(login_url, data=ADMIN)
+        assert response.status_code == 302, response.status_code
+
+    return measure(run, iterations, setup=app.test_client)
+
+
+def bench_load_user(app, iterations, cached):
+    user_id = User.get_by_email(ADMIN['email']).pk
+
+    def setup():
+        if not cached:
+            user_cache.clear()
+
+    def run(arg):
+        with app.app_context():
+            assert load_user(user_id) is not None
+
+    return measure(run, iterations, setup=setup)
+
+
+def bench_list_users(app, iterations, size):
+    """Primera página y una página a la mitad del listado ordenado"""
+    client = logged_client(app)
+    middle = User.objects.order_by('email', '_id').skip(size // 2).first()
+    cursor = encode_cursor({'id': middle.pk, 'v': middle.email, 'd': 'next'})
+    with app.test_request_context():
+        first_url = url_for('main.list_users', order_by='email')
+        deep_url = url_for('main.list_users', order_by='email', cursor=cursor)
+    results = {}
+    for name, url in (('first', first_url), ('middle', deep_url)):
+        def run(arg, url=url):
+            response = client.get(url)
+            assert response.status_code == 200, response.status_code
+        results[name] = measure(run, iterations)
+    return results
+
+
+def bench_user_add(app, iterations):
+    client = logged_client(app)
+    counter = itertools.count()
+    with app.test_request_context():
+        user_add_url = url_for('main.user_add')
+
+    def setup():
+        n = next(counter)
+        return {
+            'username': 'new%06d' % n,
+            'email': 'new%06d@biblat.unam.mx' % n,
+            'password': ADMIN['password'],
+            'confirm': ADMIN['password'],
+        }
+
+    def run(data):
+        response = client.post(user_add_url, data=data)
+        assert response.status_code == 302, response.status_code
+
+    return measure(run, iterations, setup=setup)
+
+
+def bench_confirm_token(app, iterations):
+    with app.test_request_context():
+        ts = utils.get_timed_serializer()
+        salt = current_app.config.get('TOKEN_EMAIL_SALT')
+        max_age = current_app.config.get('TOKEN_MAX_AGE')
+        token = ts.dumps(ADMIN['email'], salt=salt)
+
+        def run(arg):
+            ts.loads(token, salt=salt, max_age=max_age)
+
+        return measure(run, iterations)
+
+
+def bench_render_sidebar(app, iterations):
+    with app.test_request_context('/'):
+        def run(arg):
+            render_template('sidebar_layout.html')
+
+        return measure(run, iterations)
+
+
+def run_benchmarks(app, sizes=(10, 10000), iterations=100, progress=None):
+    """
+    Ejecuta todos los benchmarks sobre ``app`` y regresa un diccionario
+    ``{nombre: estadísticas}``. ``list_users`` se mide para cada tamaño de
+    la colección en ``sizes``.
+    """
+    progress = progress or (lambda name: None)
+    results = {}
+    with app.app_context():
+        seed_users(1)
+        progress('login')
+        results['login'] = bench_login(app, iterations)
+        progress('load_user')
+        results['load_user.cold'] = bench_load_user(app, iterations, False)
+        results['load_user.cached'] = bench_load_user(app, iterations, True)
+        progress('confirm_email.token')
+        results['confirm_email.token'] = bench_confirm_token(app, iterations)
+        progress('render.sidebar_layout')
+        results['render.sidebar_layout'] = bench_render_sidebar(app,
+                                                                iterations)
+        progress('user_add')
+        results['user_add'] = bench_user_add(app, iterations)
+        for size in sorted(sizes):
+            progress('list_users.%d' % size)
+            seed_users(size)
+            for name, stats in bench_list_users(app, iterations,
+                                                size).items():
+                results['list_users.%d.%s' % (size, name)] = stats
+    return results
@@ -0,0 +1,127 @@
+# -*- coding: utf-8 -*-
+"""
+    Benchmark de throughput de gunicorn con workers sync y gevent: levanta
+    el servidor en un puerto libre y lo carga con N clientes concurrentes
+    (un cliente asyncio con una conexión por petición).
+"""
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+import time
+
+from .core import summarize
+
+PACKAGE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+GUNICORN_CONF = os.path.join(PACKAGE_DIR, 'config', 'gunicorn_conf.py')
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def start_server(worker_class, workers, port, config_name, timeout=30):
+    """Inicia gunicorn y espera a que acepte conexiones"""
+    env = dict(os.environ,
+               BIBLAT_CONFIG=config_name,
+               BIBLAT_WORKER_CLASS=worker_class,
+               PYTHONPATH=os.path.dirname(PACKAGE_DIR))
+    process = subprocess.Popen(
+        [sys.executable, '-c', 'from gunicorn.app.wsgiapp import run; run()',
+         '-c', GUNICORN_CONF,
+         '--workers', str(workers), '--bind', '127.0.0.1:%d' % port,
+         '--chdir', PACKAGE_DIR, '--log-level', 'warning', 'app:app'],
+        env=env)
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError('gunicorn terminó con código %d' %
+                               process.returncode)
+        try:
+            socket.create_connection(('127.0.0.1', port), 0.5).close()
+            return process
+        except OSError:
+            time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError('gunicorn no respondió en %d segundos' % timeout)
+
+
+async def _request(port, raw):
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    try:
+        writer.write(raw)
+        await writer.drain()
+        status_line = await reader.readline()
+        await reader.read()
+    finally:
+        writer.close()
+    return int(status_line.split(b' ', 2)[1])
+
+
+async def _client(port, raw, end, samples, errors):
+    while time.perf_counter() < end:
+        start = time.perf_counter()
+        try:
+            status = await _request(port, raw)
+        except (OSError, ValueError, IndexError):
+            status = None
+        if status is None or status >= 500:
+            errors.append(status)
+        else:
+            samples.append(time.perf_counter() - start)
+
+
+async def _load(port, path, clients, duration):
+    raw = ('GET %s HTTP/1.1\r\nHost: 127.0.0.1:%d\r\n'
+           'Connection: close\r\n\r\n' % (path, port)).encode('ascii')
+    samples, errors = [], []
+    end = time.perf_counter() + duration
+    await asyncio.gather(*[_client(port, raw, end, samples, errors)
+                           for i in range(clients)])
+    return samples, errors
+
+
+def run_load(port, path, clients, duration):
+    """
+    Ejecuta ``clients`` clientes concurrentes contra ``path`` durante
+    ``duration`` segundos. Regresa las estadísticas de ``summarize`` más
+    ``errors`` (respuestas 5xx o conexiones fallidas).
+    """
+    loop = asyncio.new_event_loop()
+    try:
+        samples, errors = loop.run_until_complete(
+            _load(port, path, clients, duration))
+    finally:
+        loop.close()
+    stats = summarize(samples, duration)
+    stats['errors'] = len(errors)
+    return stats
+
+
+def run_worker_benchmarks(worker_classes=('sync', 'gevent'),
+                          clients=(50, 200, 1000), workers=2, duration=10,
+                          path='/login', config_name='testing',
+                          progress=None):
+    """
+    Regresa ``{'workers:<clase>:c<clientes>': estadísticas}`` para cada
+    clase de worker y nivel de concurrencia.
+    """
+    results = {}
+    for worker_class in worker_classes:
+        port = free_port()
+        server = start_server(worker_class, workers, port, config_name)
+        try:
+            # Primera petición fuera de la medición
+            run_load(port, path, 1, 0.1)
+            for count in clients:
+                if progress:
+                    progress('%s con %d clientes' % (worker_class, count))
+                results['workers:%s:c%d' % (worker_class, count)] = \
+                    run_load(port, path, count, duration)
+        finally:
+            server.terminate()
+            server.wait()
+    return results
@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+"""
+    Configuración de gunicorn para Biblat Manager
+
+    Con la variable de entorno ``prometheus_multiproc_dir`` cada worker
+    escribe sus métricas en ese directorio y /metrics las suma. El
+    directorio se crea y se vacía al cargar esta configuración y al
+    terminar un worker se descartan sus gauges. La variable se define sólo
+    para gunicorn (ver Dockerfile): los comandos ``flask`` no deben escribir
+    métricas en el directorio de los workers.
+
+    Con BIBLAT_PRELOAD=true la aplicación se construye una sola vez en el
+    proceso maestro (--preload) y la conexión a mongoDB se abre en cada
+    worker. Con BIBLAT_WARM_START (activo por omisión) cada worker compila
+    las plantillas, carga los catálogos de LANGUAGES y abre la conexión a
+    mongoDB antes de recibir peticiones; el tiempo de arranque se reporta
+    en el log y en /metrics.
+
+    BIBLAT_WORKER_CLASS=gevent activa los workers cooperativos: cada worker
+    atiende hasta BIBLAT_WORKER_CONNECTIONS peticiones concurrentes mientras
+    esperan a mongoDB o al servidor SMTP. El monkey patching se aplica aquí,
+    antes de importar la aplicación, para que pymongo, Flask-Mail y los
+    locks de la aplicación usen las versiones cooperativas; el hash de
+    contraseñas se ejecuta en hilos reales (ver webapp/passwords.py).
+
+    Uso: gunicorn -c biblat_manager/config/gunicorn_conf.py app:app
+"""
+import glob
+import os
+import time
+
+worker_class = os.environ.get('BIBLAT_WORKER_CLASS', 'sync')
+worker_connections = int(os.environ.get('BIBLAT_WORKER_CONNECTIONS', 1000))
+
+if worker_class == 'gevent':
+    from gevent import monkey
+    monkey.patch_all()
+
+from prometheus_client import multiprocess  # NOQA
+
+
+def _env_flag(name, default):
+    return os.environ.get(name, default).lower() in ('true', '1', 'yes')
+
+
+preload_app = _env_flag('BIBLAT_PRELOAD', 'false')
+warm_start = _env_flag('BIBLAT_WARM_START', 'true')
+
+
+def _prepare_metrics_dir():
+    """
+    Crea y vacía el directorio de métricas al cargar esta configuración,
+    antes de que se importe la aplicación (con --preload se importa antes
+    de ``on_starting``). Al recargar la configuración (HUP) el proceso
+    maestro no lo vuelve a vaciar: los workers activos siguen escribiendo.
+    """
+    path = os.environ.get('prometheus_multiproc_dir')
+    if not path or os.environ.get('BIBLAT_METRICS_DIR_PID') == \
+            str(os.getpid()):
+        return
+    os.makedirs(path, exist_ok=True)
+    for filename in glob.glob(os.path.join(path, '*.db')):
+        os.remove(filename)
+    os.environ['BIBLAT_METRICS_DIR_PID'] = str(os.getpid())
+
+
+_prepare_metrics_dir()
+
+
+def post_fork(server, worker):
+    worker.biblat_forked_at = time.perf_counter()
+
+
+def post_worker_init(worker):
+    if not warm_start:
+        return
+    from biblat_manager.webapp.warmup import format_timings, warm_up
+    timings = warm_up(worker.wsgi, started=worker.biblat_forked_at)
+    worker.log.info('Worker %s listo: %s', worker.pid,
+                    format_timings(timings))
+
+
+def child_exit(server, worker):
+    if os.environ.get('prometheus_multiproc_dir'):
+        multiprocess.mark_process_dead(worker.pid)
@@ -7,15 +7,41 @@ import os
     Variables de entorno:
 
         - BIBLAT_SECRET_KEY: Clave necesaria para la seguridad de las sesiones
+        - BIBLAT_BASE_URL: URL pública para los enlaces generados desde la terminal (default: 'http://localhost:8000')
 
         - BIBLAT_MONGODB_NAME:    nombre de la base (default: 'biblat')
         - BIBLAT_MONGODB_HOST:    host del servicio (default: 'localhost')
         - BIBLAT_MONGODB_PORT:    puerto del servicio (default: 27017)
         - BIBLAT_MONGODB_USER:    [opcional] usuario de la base (default: None)
         - BIBLAT_MONGODB_PASS:    [opcional] password de la base (default: None)
+        - BIBLAT_MONGODB_URI:     [opcional] URI de conexión (mongodb:// o mongodb+srv://), reemplaza a host/port/user/pass (default: None)
+        - BIBLAT_MONGODB_REPLICA_SET:           [opcional] nombre del replica set (default: None)
+        - BIBLAT_MONGODB_MAX_POOL_SIZE:         conexiones máximas por proceso (default: 100)
+        - BIBLAT_MONGODB_MIN_POOL_SIZE:         conexiones abiertas aunque no se usen (default: 0)
+        - BIBLAT_MONGODB_CONNECT_TIMEOUT_MS:    tiempo máximo para abrir una conexión (default: 10000)
+        - BIBLAT_MONGODB_SOCKET_TIMEOUT_MS:     [opcional] tiempo máximo de espera de una respuesta (default: None)
+        - BIBLAT_MONGODB_SERVER_SELECTION_TIMEOUT_MS: tiempo máximo para encontrar un servidor disponible (default: 10000)
+        - BIBLAT_MONGODB_WAIT_QUEUE_TIMEOUT_MS: [opcional] espera máxima por una conexión libre del pool (default: None)
+        - BIBLAT_MONGODB_W:                     [opcional] write concern: número de nodos o 'majority' (default: None)
+        - BIBLAT_MONGODB_WTIMEOUT_MS:           [opcional] tiempo máximo de espera del write concern (default: None)
+        - BIBLAT_MONGODB_LISTING_READ_PREFERENCE: lectura de los listados y reportes: primary, primaryPreferred, secondary, secondaryPreferred o nearest (default: secondaryPreferred)
+        - BIBLAT_MONGODB_LISTING_MAX_STALENESS:   retraso máximo en segundos de los secundarios para los listados, -1 sin límite (default: 90)
+        - BIBLAT_COUNT_CACHE_TTL: vigencia en segundos de los totales de los listados (default: 60)
+        - BIBLAT_SLOW_QUERY_MS:   umbral de las consultas lentas, 0 lo desactiva (default: 100)
+        - BIBLAT_SLOW_QUERY_LOG_SIZE: tamaño en bytes de la colección capped (default: 16777216)
+        - BIBLAT_SLOW_QUERY_QUEUE_SIZE: consultas lentas pendientes de escribir por proceso (default: 1000)
+        - BIBLAT_MIGRATIONS_BATCH_SIZE: documentos por lote de flask migrate (default: 1000)
 
         - BIBLAT_TOKEN_EMAIL_SALT: Clave para la seguridad de los tokens
 
+        - BIBLAT_USER_CACHE_TTL:  vida en segundos de los usuarios en caché; es el tiempo máximo que otro worker puede ver un usuario ya modificado o borrado (default: 2)
+        - BIBLAT_USER_CACHE_SIZE: máximo de usuarios en caché por proceso (default: 1024)
+
+        - BIBLAT_JINJA_BYTECODE_CACHE_DIR:  directorio del bytecode de las plantillas, debe pertenecer al usuario de la aplicación; vacío lo desactiva (default: directorio 0700 por usuario de Jinja en $TMPDIR)
+        - BIBLAT_MANAGER_WEBAPP_VERSION:    versión de la aplicación (argumento de docker build), forma parte de la llave de los fragmentos {% cache %} (default: '')
+        - BIBLAT_FRAGMENT_CACHE_TTL:        vida en segundos de los fragmentos {% cache %}, 0 la desactiva (default: 300)
+        - BIBLAT_CONDITIONAL_GET:           ETag y 304 Not Modified en listados y detalles (default: True)
+
         - BIBLAT_MAIL_SERVER:               host del servicio (default: 'localhost')
         - BIBLAT_MAIL_PORT:                 puerto del servicio (default: 25)
         - BIBLAT_MAIL_USE_TLS:              cifrado TLS (default: False)
@@ -25,11 +51,57 @@ import os
         - BIBLAT_MAIL_DEFAULT_SENDER:       remitente de los correos (default: info@biblat.unam.mx) 
         - BIBLAT_ MAIL_MAX_EMAILS:          envío máximo por conexión (default: None)
         - BIBLAT_MAIL_ASCII_ATTACHMENTS:    conversión de los nombres de archivo a su equivalente en ASCII (default: None)
+        - BIBLAT_MAIL_OUTBOX:               registrar los correos para flask mail-worker, que debe estar en ejecución (servicio biblat_manager_mail_worker de docker-compose.yml) (default: true)
+        - BIBLAT_MAIL_OUTBOX_BATCH_SIZE:    correos por lote del worker (default: 50)
+        - BIBLAT_MAIL_OUTBOX_MAX_ATTEMPTS:  intentos antes de marcar un correo como fallido (default: 5)
+        - BIBLAT_MAIL_OUTBOX_RETRY_DELAY:   segundos antes del primer reintento, se duplica en cada intento (default: 30)
+
+        - BIBLAT_PASSWORD_HASH_ROUNDS:      costo de bcrypt para las contraseñas (default: 12)
+        - BIBLAT_PASSWORD_HASH_EXECUTOR:    pool para calcular hashes con workers gevent: thread, process o sync; con workers sync se calculan en la petición (default: thread)
+        - BIBLAT_PASSWORD_HASH_WORKERS:     tamaño máximo del pool de hashes (default: 2)
+        - BIBLAT_PASSWORD_FILTER_PATH:      [opcional] filtro de contraseñas comunes de flask build-password-filter (default: None)
+
+        - BIBLAT_SERVER_TIMING:             encabezado Server-Timing en las respuestas (default: False)
+        - BIBLAT_PROFILE:                   activa cProfile para una muestra de las peticiones (default: None)
+        - BIBLAT_PROFILE_DIR:               directorio de los archivos .prof (default: tmp/profiles)
+        - BIBLAT_PROFILE_SAMPLE_RATE:       fracción de peticiones perfiladas (default: 0.01)
+        - BIBLAT_PROFILE_SLOW_MS:           sólo se guardan las peticiones más lentas que este valor (default: 500)
+
+        - BIBLAT_METRICS_ENABLED:           métricas de Prometheus en /metrics (default: True)
+        - BIBLAT_METRICS_TOKEN:             token 'Bearer' requerido para leer /metrics; sin él la ruta no se registra (default: None)
+        - BIBLAT_METRICS_PUBLIC:            sirve /metrics sin token, a cualquiera que alcance la aplicación (latencias por endpoint, límite de intentos, comandos de mongoDB) (default: False)
+        - prometheus_multiproc_dir:         directorio de métricas compartido por los workers de gunicorn
+
+        - BIBLAT_RATELIMIT_BACKEND:         contadores de intentos: memory o mongo (default: memory)
+        - BIBLAT_RATELIMIT_IP:              intentos por IP 'capacidad/segundos' (default: 30/60)
+        - BIBLAT_RATELIMIT_EMAIL:           intentos por correo 'capacidad/segundos' (default: 5/60)
+        - BIBLAT_PROXY_FIX:                 número de proxies de confianza delante de la aplicación; toma la IP del cliente de X-Forwarded-For, 0 lo desactiva (default: 0)
 """
 
 
+def _int_or_none(value):
+    return int(value) if value not in (None, '') else None
+
+
+def mongodb_uri(uri, name):
+    """
+    Agrega la base ``name`` a ``uri`` cuando no la indica (flask-mongoengine
+    usaría la base 'test')
+    """
+    scheme, rest = uri.split('://', 1)
+    hosts, slash, path = rest.partition('/')
+    if not slash:
+        hosts, question, options = hosts.partition('?')
+    else:
+        database, question, options = path.partition('?')
+        if database:
+            return uri
+    return '%s://%s/%s%s%s' % (scheme, hosts, name, question, options)
+
+
 class Config:
     SECRET_KEY = os.environ.get('BIBLAT_SECRET_KEY', 'secr3t-k3y')
+    WEBAPP_VERSION = os.environ.get('BIBLAT_MANAGER_WEBAPP_VERSION', '')
 
     # Idioma predeterminado:
     BABEL_DEFAULT_LOCALE = 'es_MX'
@@ -47,18 +119,91 @@ class Config:
     MONGODB_USER = os.environ.get('BIBLAT_MONGODB_USER', None)
     MONGODB_PASS = os.environ.get('BIBLAT_MONGODB_PASS', None)
 
+    MONGODB_URI = os.environ.get('BIBLAT_MONGODB_URI', None)
+
     MONGODB_SETTINGS = {
         'db': MONGODB_NAME,
         'host': MONGODB_HOST,
         'port': int(MONGODB_PORT),
+        # Conexión perezosa: con gunicorn --preload la conexión se abre en
+        # cada worker después del fork y no en el proceso maestro
+        'connect': False,
+        # Pool y tiempos de espera del cliente de pymongo (los valores None
+        # se descartan y se usa el default del driver)
+        'replicaSet': os.environ.get('BIBLAT_MONGODB_REPLICA_SET') or None,
+        'maxPoolSize': int(
+            os.environ.get('BIBLAT_MONGODB_MAX_POOL_SIZE', 100)),
+        'minPoolSize': int(os.environ.get('BIBLAT_MONGODB_MIN_POOL_SIZE', 0)),
+        'connectTimeoutMS': int(
+            os.environ.get('BIBLAT_MONGODB_CONNECT_TIMEOUT_MS', 10000)),
+        'socketTimeoutMS': _int_or_none(
+            os.environ.get('BIBLAT_MONGODB_SOCKET_TIMEOUT_MS')),
+        'serverSelectionTimeoutMS': int(
+            os.environ.get('BIBLAT_MONGODB_SERVER_SELECTION_TIMEOUT_MS',
+                           10000)),
+        'waitQueueTimeoutMS': _int_or_none(
+            os.environ.get('BIBLAT_MONGODB_WAIT_QUEUE_TIMEOUT_MS')),
+        'wTimeoutMS': _int_or_none(
+            os.environ.get('BIBLAT_MONGODB_WTIMEOUT_MS')),
     }
 
-    if MONGODB_USER and MONGODB_PASS:
+    if MONGODB_URI:
+        # La URI incluye hosts, credenciales y opciones del replica set
+        MONGODB_SETTINGS['host'] = mongodb_uri(MONGODB_URI, MONGODB_NAME)
+        del MONGODB_SETTINGS['port']
+    elif MONGODB_USER and MONGODB_PASS:
         MONGODB_SETTINGS['username'] = MONGODB_USER
         MONGODB_SETTINGS['password'] = MONGODB_PASS
 
+    # Write concern: número de nodos o 'majority'
+    MONGODB_W = os.environ.get('BIBLAT_MONGODB_W')
+    if MONGODB_W:
+        MONGODB_SETTINGS['w'] = int(MONGODB_W) if MONGODB_W.isdigit() \
+            else MONGODB_W
+
+    # Los listados y reportes (``readpreference.for_listing``) pueden leer
+    # de los secundarios con un retraso máximo; login y escrituras usan el
+    # primario
+    MONGODB_LISTING_READ_PREFERENCE = os.environ.get(
+        'BIBLAT_MONGODB_LISTING_READ_PREFERENCE', 'secondaryPreferred')
+    MONGODB_LISTING_MAX_STALENESS = int(
+        os.environ.get('BIBLAT_MONGODB_LISTING_MAX_STALENESS', 90))
+
+    # Documentos por lote (un bulk_write) de las migraciones de flask migrate
+    MIGRATIONS_BATCH_SIZE = int(
+        os.environ.get('BIBLAT_MIGRATIONS_BATCH_SIZE', 1000))
+
+    # Vigencia en segundos del total de documentos en los listados
+    COUNT_CACHE_TTL = int(os.environ.get('BIBLAT_COUNT_CACHE_TTL', 60))
+    # Consultas más lentas que SLOW_QUERY_MS se registran en una colección
+    # capped de SLOW_QUERY_LOG_SIZE bytes
+    SLOW_QUERY_MS = float(os.environ.get('BIBLAT_SLOW_QUERY_MS', 100))
+    SLOW_QUERY_COLLECTION = 'slow_queries'
+    SLOW_QUERY_LOG_SIZE = int(
+        os.environ.get('BIBLAT_SLOW_QUERY_LOG_SIZE', 16 * 1024 * 1024))
+    SLOW_QUERY_QUEUE_SIZE = int(
+        os.environ.get('BIBLAT_SLOW_QUERY_QUEUE_SIZE', 1000))
+
+    # URL pública, para generar enlaces desde los comandos de la terminal
+    BASE_URL = os.environ.get('BIBLAT_BASE_URL', 'http://localhost:8000')
+
+    # Plantillas
+    # None: directorio por usuario (modo 0700) de FileSystemBytecodeCache
+    JINJA_BYTECODE_CACHE_DIR = os.environ.get(
+        'BIBLAT_JINJA_BYTECODE_CACHE_DIR')
+    FRAGMENT_CACHE_TTL = int(os.environ.get('BIBLAT_FRAGMENT_CACHE_TTL', 300))
+    FRAGMENT_CACHE_SIZE = 256
+    # ETag y 304 Not Modified a partir de la versión de cada colección; el
+    # ETag cambia cada CONDITIONAL_GET_WINDOW segundos (token CSRF)
+    CONDITIONAL_GET = os.environ.get(
+        'BIBLAT_CONDITIONAL_GET', 'true').lower() in ('true', '1', 'yes')
+    CONDITIONAL_GET_WINDOW = 1800
+
     # Login
     USE_SESSION_FOR_NEXT = True
+    # Caché de usuarios de la sesión (segundos, 0 la desactiva)
+    USER_CACHE_TTL = int(os.environ.get('BIBLAT_USER_CACHE_TTL', 2))
+    USER_CACHE_SIZE = int(os.environ.get('BIBLAT_USER_CACHE_SIZE', 1024))
 
     # Mail
     MAIL_SERVER = os.environ.get('BIBLAT_MAIL_SERVER', 'localhost')
@@ -71,17 +216,66 @@ class Config:
         'BIBLAT_MAIL_DEFAULT_SENDER', 'info@biblat.unam.mx'
     )
     MAIL_MAX_EMAILS = os.environ.get('BIBLAT_MAIL_MAX_EMAILS', None)
+    if MAIL_MAX_EMAILS:
+        MAIL_MAX_EMAILS = int(MAIL_MAX_EMAILS)
     MAIL_ASCII_ATTACHMENTS = os.environ.get(
         'BIBLAT_MAIL_ASCII_ATTACHMENTS', False
     )
 
+    # Outbox: las vistas registran los correos y los envía flask mail-worker
+    MAIL_OUTBOX = os.environ.get('BIBLAT_MAIL_OUTBOX', 'true').lower() in (
+        'true', '1', 'yes')
+    MAIL_OUTBOX_BATCH_SIZE = int(
+        os.environ.get('BIBLAT_MAIL_OUTBOX_BATCH_SIZE', 50))
+    MAIL_OUTBOX_MAX_ATTEMPTS = int(
+        os.environ.get('BIBLAT_MAIL_OUTBOX_MAX_ATTEMPTS', 5))
+    MAIL_OUTBOX_RETRY_DELAY = int(
+        os.environ.get('BIBLAT_MAIL_OUTBOX_RETRY_DELAY', 30))
+    MAIL_OUTBOX_LOCK_SECONDS = 300
+
     # TIEMPO de EXPIRACIÓN para Los tokens
     TOKEN_MAX_AGE = 86400  # valor en segundos: 86400 = 60*60*24 = 1 día
     TOKEN_EMAIL_SALT = os.environ.get('BIBLAT_TOKEN_EMAIL_SALT',
                                       'email-secr3t-k3y')
 
-    # webassets
-    # SASS_STYLE = 'compressed'
+    # Hash de contraseñas
+    PASSWORD_HASH_ROUNDS = int(
+        os.environ.get('BIBLAT_PASSWORD_HASH_ROUNDS', 12))
+    PASSWORD_HASH_EXECUTOR = os.environ.get('BIBLAT_PASSWORD_HASH_EXECUTOR',
+                                            'thread')
+    PASSWORD_HASH_WORKERS = int(
+        os.environ.get('BIBLAT_PASSWORD_HASH_WORKERS', 2))
+    # Filtro de Bloom de contraseñas comunes (flask build-password-filter)
+    PASSWORD_FILTER_PATH = os.environ.get('BIBLAT_PASSWORD_FILTER_PATH')
+
+    # Límite de intentos en login y recuperación de contraseña
+    RATELIMIT_ENABLED = True
+    RATELIMIT_BACKEND = os.environ.get('BIBLAT_RATELIMIT_BACKEND', 'memory')
+    RATELIMIT_COLLECTION = 'rate_limits'
+    RATELIMIT_IP = os.environ.get('BIBLAT_RATELIMIT_IP', '30/60')
+    RATELIMIT_EMAIL = os.environ.get('BIBLAT_RATELIMIT_EMAIL', '5/60')
+    # Proxies de confianza (X-Forwarded-For) para obtener la IP del cliente
+    PROXY_FIX = int(os.environ.get('BIBLAT_PROXY_FIX', 0))
+
+    # Instrumentación: encabezado Server-Timing y cProfile de peticiones lentas
+    SERVER_TIMING = os.environ.get('BIBLAT_SERVER_TIMING', '').lower() in (
+        'true', '1', 'yes')
+    PROFILE = os.environ.get('BIBLAT_PROFILE')
+    PROFILE_DIR = os.environ.get('BIBLAT_PROFILE_DIR', 'tmp/profiles')
+    PROFILE_SAMPLE_RATE = float(
+        os.environ.get('BIBLAT_PROFILE_SAMPLE_RATE', 0.01))
+    PROFILE_SLOW_MS = float(os.environ.get('BIBLAT_PROFILE_SLOW_MS', 500))
+
+    # Métricas de Prometheus
+    METRICS_ENABLED = os.environ.get(
+        'BIBLAT_METRICS_ENABLED', 'true').lower() in ('true', '1', 'yes')
+    METRICS_TOKEN = os.environ.get('BIBLAT_METRICS_TOKEN')
+    METRICS_PUBLIC = os.environ.get(
+        'BIBLAT_METRICS_PUBLIC', '').lower() in ('true', '1', 'yes')
+
+    # Archivos estáticos de flask build-assets (static/dist), se sirven con
+    # Cache-Control immutable por ASSETS_MAX_AGE segundos
+    ASSETS_MAX_AGE = 365 * 24 * 60 * 60
 
     @staticmethod
     def init_app(app):
@@ -95,11 +289,30 @@ class DevelopmentConfig(Config):
 class TestingConfig(Config):
     TESTING = True
     WTF_CSRF_ENABLED = False
+    # flask test --parallel usa una base distinta en cada proceso
+    TEST_MONGODB_NAME = os.environ.get('BIBLAT_TEST_MONGODB_NAME',
+                                       'biblat_test')
     MONGODB_SETTINGS = {
-        'db': 'biblat_test',
-        'host': 'mongomock://localhost/biblat_test',
+        'db': TEST_MONGODB_NAME,
+        'host': 'mongomock://localhost/%s' % TEST_MONGODB_NAME,
         'port': 27017,
     }
+    # Costo mínimo de bcrypt para acelerar las pruebas
+    PASSWORD_HASH_ROUNDS = 4
+    # Las pruebas de las vistas verifican el envío directo de correos
+    MAIL_OUTBOX = False
+    # mongomock no soporta colecciones capped
+    SLOW_QUERY_LOG_SIZE = 0
+    METRICS_PUBLIC = True
+
+
+class BenchmarkConfig(TestingConfig):
+    # mongod local para ``flask bench --target mongod``
+    MONGODB_SETTINGS = {
+        'db': os.environ.get('BIBLAT_BENCH_MONGODB_NAME', 'biblat_bench'),
+        'host': os.environ.get('BIBLAT_BENCH_MONGODB_HOST', 'localhost'),
+        'port': int(os.environ.get('BIBLAT_BENCH_MONGODB_PORT', 27017)),
+    }
 
 
 class ProductionConfig(Config):
@@ -110,6 +323,7 @@ class ProductionConfig(Config):
 config = {
     'development': DevelopmentConfig,
     'testing': TestingConfig,
+    'benchmark': BenchmarkConfig,
     'production': ProductionConfig,
 
     'default': DevelopmentConfig
@@ -0,0 +1,26 @@
+# -*- coding: utf-8 -*-
+from pymongo import DeleteOne, InsertOne
+
+from biblat_manager.webapp import userids
+from biblat_manager.webapp.migrations import Migration
+from biblat_manager.webapp.models import User
+
+
+class BinaryUserIds(Migration):
+    """Ids de los usuarios como UUID binario (ver flask migrate-user-ids)"""
+    collection = 'users'
+    query = {'_id': {'$type': 'string'}}
+    description = 'Ids de usuario de string hexadecimal a UUID binario'
+
+    def migrate(self, doc):
+        id_field = User._fields['_id']
+        if not id_field._is_hex(doc['_id']):
+            return None
+        return [DeleteOne({'_id': doc['_id']}),
+                InsertOne(dict(doc, _id=id_field.to_mongo(doc['_id'])))]
+
+    def run(self, runner):
+        # El reemplazo del _id no cabe en un solo bulk_write de forma
+        # segura: migrate_user_ids guarda una copia de cada lote antes
+        return userids.migrate_user_ids(runner.batch_size,
+                                        progress=runner.progress)
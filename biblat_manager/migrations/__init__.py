@@ -0,0 +1,9 @@
+# -*- coding: utf-8 -*-
+"""
+    Migraciones de datos de ``flask migrate``.
+
+    Cada archivo ``NNNN_descripcion.py`` define una subclase de
+    ``biblat_manager.webapp.migrations.Migration``; se aplican en orden de
+    versión y las aplicadas se registran en la colección
+    ``schema_migrations``.
+"""
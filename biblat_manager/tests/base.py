@@ -4,13 +4,46 @@ import mongoengine
 from flask import current_app
 from flask_testing import TestCase
 
-from biblat_manager.webapp import create_app, dbmongo
+from biblat_manager.webapp import (count_cache, create_app, dbmongo,
+                                   fragment_cache, limiter, user_cache)
 
 
 class BaseTestCase(TestCase):
+    # Reutilizar la aplicación entre los tests de la clase. Sólo es seguro
+    # si los tests no registran handlers ni llaman a ``init_app`` de las
+    # extensiones; la configuración y las cachés en memoria se restauran
+    # antes de cada test
+    cache_app = False
 
     def create_app(self):
-        return create_app('testing')
+        cls = type(self)
+        if not cls.cache_app:
+            return create_app('testing')
+        app = cls.__dict__.get('_cached_app')
+        if app is None:
+            app = create_app('testing')
+            cls._cached_app = app
+            cls._cached_config = dict(app.config)
+        else:
+            self.reset_app(app, cls._cached_config)
+        return app
+
+    @staticmethod
+    def reset_app(app, config):
+        """Estado en memoria que ``create_app`` reinicia"""
+        app.config.clear()
+        app.config.update(config)
+        user_cache.configure(config.get('USER_CACHE_SIZE', 1024),
+                             config.get('USER_CACHE_TTL', 2))
+        fragment_cache.configure(config.get('FRAGMENT_CACHE_SIZE', 256),
+                                 config.get('FRAGMENT_CACHE_TTL', 300))
+        count_cache.clear()
+        limiter.init_app(app)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls._cached_app = None
+        super(BaseTestCase, cls).tearDownClass()
 
     def setUp(self):
         self.app = current_app
@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+"""
+    Ejecución de las pruebas en varios procesos (``flask test --parallel``).
+
+    Los tests se reparten en tramos contiguos para que los de una misma
+    clase queden juntos en lo posible (y aprovechen ``cache_app``). Cada
+    proceso se inicia con ``spawn`` y usa su propia base de datos
+    (``BIBLAT_TEST_MONGODB_NAME``).
+"""
+from concurrent.futures import ProcessPoolExecutor
+import io
+import multiprocessing
+import os
+import sys
+import time
+import unittest
+
+TEST_DB_ENV = 'BIBLAT_TEST_MONGODB_NAME'
+
+
+def iter_test_ids(suite):
+    for test in suite:
+        if isinstance(test, unittest.TestSuite):
+            for test_id in iter_test_ids(test):
+                yield test_id
+        else:
+            yield test.id()
+
+
+def split_tests(test_ids, workers):
+    """Divide ``test_ids`` en ``workers`` tramos contiguos similares"""
+    size, extra = divmod(len(test_ids), workers)
+    chunks = []
+    start = 0
+    for index in range(workers):
+        end = start + size + (1 if index < extra else 0)
+        if end > start:
+            chunks.append(test_ids[start:end])
+        start = end
+    return chunks
+
+
+def _run_chunk(args):
+    index, test_ids, coverage_include = args
+    os.environ[TEST_DB_ENV] = 'biblat_test_%d' % index
+    cov = None
+    if coverage_include:
+        import coverage
+        cov = coverage.Coverage(branch=True, include=coverage_include,
+                                data_suffix=True)
+        cov.start()
+    # Igual que en ``flask test``, los tests corren dentro del contexto de
+    # una aplicación
+    from biblat_manager.webapp import create_app
+    with create_app('testing').app_context():
+        suite = unittest.TestLoader().loadTestsFromNames(test_ids)
+        stream = io.StringIO()
+        result = unittest.TextTestRunner(stream=stream,
+                                         verbosity=2).run(suite)
+    if cov is not None:
+        cov.stop()
+        cov.save()
+    return {
+        'output': stream.getvalue(),
+        'run': result.testsRun,
+        'failures': len(result.failures),
+        'errors': len(result.errors),
+        'skipped': len(result.skipped),
+        'successful': result.wasSuccessful(),
+    }
+
+
+def run_parallel(suite, workers, coverage_include=None, stream=None):
+    """
+    Ejecuta ``suite`` en ``workers`` procesos; con ``coverage_include`` cada
+    proceso guarda su archivo ``.coverage.*`` para combinarlo después.
+    Regresa True si todas las pruebas pasaron.
+    """
+    stream = stream or sys.stderr
+    chunks = split_tests(list(iter_test_ids(suite)), workers)
+    start = time.perf_counter()
+    # Los procesos de ProcessPoolExecutor no son daemon: los tests pueden
+    # crear sus propios procesos (p. ej. la importación de usuarios)
+    with ProcessPoolExecutor(
+            max_workers=len(chunks) or 1,
+            mp_context=multiprocessing.get_context('spawn')) as executor:
+        results = list(executor.map(
+            _run_chunk,
+            [(index, chunk, coverage_include)
+             for index, chunk in enumerate(chunks)]))
+    elapsed = time.perf_counter() - start
+    for index, result in enumerate(results):
+        stream.write('== Proceso %d ==\n' % index)
+        stream.write(result['output'])
+    totals = dict((key, sum(result[key] for result in results))
+                  for key in ('run', 'failures', 'errors', 'skipped'))
+    stream.write('\nRan %d tests in %.3fs (%d procesos)\n\n' % (
+        totals['run'], elapsed, len(chunks)))
+    successful = all(result['successful'] for result in results)
+    if successful:
+        stream.write('OK%s\n' % (' (skipped=%d)' % totals['skipped']
+                                 if totals['skipped'] else ''))
+    else:
+        stream.write('FAILED (failures=%(failures)d, errors=%(errors)d)\n' %
+                     totals)
+    stream.flush()
+    return successful
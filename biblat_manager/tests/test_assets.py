@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+import gzip
+import json
+import os
+import shutil
+import tempfile
+
+from flask import current_app, render_template_string
+
+from biblat_manager.tests.base import BaseTestCase
+from biblat_manager.webapp import static_assets
+from biblat_manager.webapp.assets import build_assets
+
+BUNDLES = {
+    'main.css': ['assets/css/a.css', 'assets/scss/style.css'],
+    'main.js': ['assets/js/a.js', 'assets/js/b.js'],
+}
+
+
+class AssetsTestCase(BaseTestCase):
+
+    def setUp(self):
+        super(AssetsTestCase, self).setUp()
+        self.static_folder = tempfile.mkdtemp()
+        files = {
+            'assets/css/a.css': '@charset "UTF-8";\n'
+                                '.a { background: url(../img/a.png); }',
+            'assets/css/b.css': '.b { src: url("../fonts/b.woff"); }',
+            'assets/scss/style.css': '@import url(../css/b.css);\n'
+                                     '.c { background: url(data:x); }',
+            'assets/js/a.js': 'var a = 1',
+            'assets/js/b.js': 'var b = 2;',
+        }
+        for name, content in files.items():
+            path = os.path.join(self.static_folder, name)
+            if not os.path.isdir(os.path.dirname(path)):
+                os.makedirs(os.path.dirname(path))
+            with open(path, 'w') as f:
+                f.write(content)
+        self.original_folder = current_app.static_folder
+        current_app.static_folder = self.static_folder
+
+    def tearDown(self):
+        super(AssetsTestCase, self).tearDown()
+        current_app.static_folder = self.original_folder
+        static_assets.manifest = {}
+        shutil.rmtree(self.static_folder, ignore_errors=True)
+
+    def read(self, name):
+        with open(os.path.join(self.static_folder, name)) as f:
+            return f.read()
+
+    def test_build_assets(self):
+        """Test de los paquetes con hash, .gz y manifiesto"""
+        manifest = build_assets(self.static_folder, BUNDLES, files=[])
+        self.assertEqual(manifest,
+                         json.loads(self.read('dist/manifest.json')))
+        css = self.read(manifest['main.css'])
+        self.assertRegex(manifest['main.css'], r'^dist/main\.\w{12}\.css$')
+        self.assertIn('url(../assets/img/a.png)', css)
+        self.assertIn('url("../assets/fonts/b.woff")', css)
+        self.assertIn('url(data:x)', css)
+        self.assertNotIn('@import', css)
+        self.assertNotIn('@charset', css)
+        self.assertEqual('var a = 1;\nvar b = 2;\n',
+                         self.read(manifest['main.js']))
+        with gzip.open(os.path.join(self.static_folder,
+                                    manifest['main.js'] + '.gz')) as f:
+            self.assertEqual(b'var a = 1;\nvar b = 2;\n', f.read())
+        # El mismo contenido genera el mismo nombre
+        self.assertEqual(manifest, build_assets(self.static_folder, BUNDLES,
+                                                files=[]))
+
+    def test_static_url_and_cache_headers(self):
+        """Test de static_url y los encabezados de los archivos con hash"""
+        with current_app.test_request_context('/'):
+            self.assertEqual('/static/assets/js/a.js', render_template_string(
+                "{{ static_url('assets/js/a.js') }}"))
+        manifest = build_assets(self.static_folder, BUNDLES, files=[])
+        static_assets.load_manifest(self.static_folder)
+        self.assertEqual(12, len(static_assets.version))
+        with current_app.test_request_context('/'):
+            url = render_template_string("{{ bundle_urls('main.js')[0] }}")
+        self.assertEqual('/static/' + manifest['main.js'], url)
+        response = self.client.get(url, headers={'Accept-Encoding': 'gzip'})
+        self.assertStatus(response, 200)
+        self.assertEqual('gzip', response.headers['Content-Encoding'])
+        self.assertIn('immutable', response.headers['Cache-Control'])
+        self.assertIn('javascript', response.headers['Content-Type'])
+        response = self.client.get(url)
+        self.assertNotIn('Content-Encoding', response.headers)
+        self.assertEqual(b'var a = 1;\nvar b = 2;\n', response.data)
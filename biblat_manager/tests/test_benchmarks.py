@@ -0,0 +1,39 @@
+# -*- coding: utf-8 -*-
+from biblat_manager.benchmarks import core, scenarios
+from biblat_manager.tests.base import BaseTestCase
+from biblat_manager.webapp import limiter
+from biblat_manager.webapp.models import User
+
+
+class BenchmarkCoreTestCase(BaseTestCase):
+
+    def test_summarize(self):
+        """Test de percentiles y operaciones por segundo"""
+        samples = [i / 1000.0 for i in range(1, 101)]
+        stats = core.summarize(samples, sum(samples))
+        self.assertAlmostEqual(51.0, stats['p50_ms'])
+        self.assertAlmostEqual(95.0, stats['p95_ms'])
+        self.assertAlmostEqual(99.0, stats['p99_ms'])
+        self.assertEqual(100, stats['count'])
+
+    def test_compare_regression(self):
+        """Test de detección de regresiones contra la línea base"""
+        baseline = {'results': {'login': {'p95_ms': 10.0},
+                                'render': {'p95_ms': 10.0}}}
+        results = {'login': {'p95_ms': 13.0}, 'render': {'p95_ms': 10.5},
+                   'nuevo': {'p95_ms': 1.0}}
+        rows = {row[0]: row for row in core.compare(results, baseline, 0.2)}
+        self.assertTrue(rows['login'][4])
+        self.assertFalse(rows['render'][4])
+        self.assertNotIn('nuevo', rows)
+
+    def test_seed_and_login_scenario(self):
+        """Test de los escenarios de login y list_users"""
+        limiter.enabled = False
+        scenarios.seed_users(25)
+        self.assertEqual(25, User.objects.count())
+        stats = scenarios.bench_login(self.app._get_current_object(), 2)
+        self.assertEqual(2, stats['count'])
+        results = scenarios.bench_list_users(self.app._get_current_object(),
+                                             2, 25)
+        self.assertEqual(['first', 'middle'], sorted(results))
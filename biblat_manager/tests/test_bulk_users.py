@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+from flask import current_app, url_for
+from mock import patch
+
+from biblat_manager.tests.base import BaseTestCase
+from biblat_manager.webapp import controllers, mail, user_cache
+from biblat_manager.webapp.controllers import create_user
+from biblat_manager.webapp.models import OutboxEmail, User
+
+
+class BulkUserActionTestCase(BaseTestCase):
+    cache_app = True
+
+    def setUp(self):
+        super(BulkUserActionTestCase, self).setUp()
+        self.users = [create_user('user%d@biblat.unam.mx' % i, 'F00barbaz$',
+                                  i == 0) for i in range(4)]
+        self.ids = [user.id for user in self.users]
+
+    def test_confirm(self):
+        """Test de verificación de correos con un solo update_many"""
+        user_cache.set(self.ids[1], {'_id': self.ids[1]})
+        collection = User._get_collection()
+        with patch.object(type(collection), 'update_many',
+                          autospec=True,
+                          side_effect=type(collection).update_many) as update:
+            results = controllers.bulk_user_action(
+                'confirm', self.ids[:3] + ['missing'])
+            self.assertEqual(1, update.call_count)
+        self.assertEqual(['unchanged', 'confirmed', 'confirmed', 'not_found'],
+                         list(results.values()))
+        self.assertEqual(3, User.objects(email_confirmed=True).count())
+        self.assertIsNone(user_cache.get(self.ids[1]))
+
+    def test_delete(self):
+        """Test de borrado de usuarios seleccionados"""
+        results = controllers.bulk_user_action('delete', self.ids[1:3])
+        self.assertEqual({self.ids[1]: 'deleted', self.ids[2]: 'deleted'},
+                         dict(results))
+        self.assertEqual(2, User.objects.count())
+
+    def test_resend_and_reset_password(self):
+        """Test de envío de correos a los usuarios seleccionados"""
+        with current_app.test_request_context():
+            with mail.record_messages() as sent:
+                results = controllers.bulk_user_action('resend', self.ids[:2])
+            self.assertEqual(['unchanged', 'sent'], list(results.values()))
+            self.assertEqual([self.users[1].email], sent[0].recipients)
+            results = controllers.bulk_user_action(
+                'reset_password', self.ids[:2], queue=True)
+        self.assertEqual(['sent', 'sent'], list(results.values()))
+        self.assertEqual(2, OutboxEmail.objects.count())
+
+    def test_bulk_action_view(self):
+        """Test de la acción masiva en el listado de usuarios"""
+        user_data = {
+            'email': 'user0@biblat.unam.mx',
+            'password': 'F00barbaz$',
+        }
+        with current_app.app_context():
+            with self.client as c:
+                c.post(url_for('main.login'), data=user_data,
+                       follow_redirects=True)
+                response = c.post(url_for('main.bulk_user_action'),
+                                  data={'action': 'delete',
+                                        'user_id': self.ids[:2]},
+                                  follow_redirects=True)
+                self.assertStatus(response, 200)
+                body = response.data.decode('utf-8')
+                self.assertIn('No es posible eliminar su propio usuario', body)
+                self.assertIn('Usuarios eliminados: 1', body)
+        self.assertEqual(3, User.objects.count())
+        self.assertIsNotNone(User.get_by_id(self.ids[0]))
@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+from mock import patch
+
+from biblat_manager.tests.base import BaseTestCase
+from biblat_manager.webapp import controllers, user_cache
+from biblat_manager.webapp.cache import TTLCache
+from biblat_manager.webapp.models import User, load_user
+
+
+class FakeClock(object):
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class TTLCacheTestCase(BaseTestCase):
+
+    def test_lru_and_ttl(self):
+        """Test de expiración y desalojo LRU"""
+        clock = FakeClock()
+        cache = TTLCache(maxsize=2, ttl=10, clock=clock)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        self.assertEqual(1, cache.get('a'))
+        cache.set('c', 3)
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(1, cache.get('a'))
+        clock.now += 11
+        self.assertIsNone(cache.get('a'))
+        self.assertIsNone(cache.get('c'))
+        self.assertEqual(0, len(cache))
+
+
+class UserLoaderCacheTestCase(BaseTestCase):
+
+    def test_load_user_cached(self):
+        """Test de load_user sin consultar nuevamente la base"""
+        user = controllers.create_user('admin@biblat.unam.mx', 'F00barbaz$',
+                                       True)
+        self.assertEqual(user.email, load_user(user.id).email)
+        with self.app.app_context():
+            with patch.object(User, 'objects') as mock:
+                cached = load_user(user.id)
+                self.assertFalse(mock.called)
+        self.assertEqual(user.email, cached.email)
+        self.assertEqual(1, len(user_cache))
+
+    def test_save_invalidates_user(self):
+        """Test de invalidación al actualizar el usuario"""
+        user = controllers.create_user('admin@biblat.unam.mx', 'F00barbaz$',
+                                       False)
+        load_user(user.id)
+        controllers.set_user_email_confirmed(User.get_by_id(user.id))
+        self.assertEqual(0, len(user_cache))
+        self.assertTrue(load_user(user.id).email_confirmed)
+
+    def test_other_worker_change_expires(self):
+        """Test de un cambio hecho en otro proceso visible al vencer el TTL"""
+        user = controllers.create_user('admin@biblat.unam.mx', 'F00barbaz$',
+                                       True)
+        load_user(user.id)
+        # Otro worker borra al usuario: esta caché no recibe la señal
+        User._get_collection().delete_one({'_id': user.to_mongo()['_id']})
+        with self.app.app_context():
+            self.assertEqual(user.email, load_user(user.id).email)
+        clock = FakeClock()
+        clock.now = user_cache._data[user.id][0] + 1
+        with patch.object(user_cache, 'clock', clock):
+            with self.app.app_context():
+                self.assertIsNone(load_user(user.id))
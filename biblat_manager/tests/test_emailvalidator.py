@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+import random
+import time
+
+from biblat_manager.benchmarks.emails import (LEGACY_REGEX_EMAIL,
+                                              WORST_CASES,
+                                              run_email_benchmarks)
+from biblat_manager.tests.base import BaseTestCase
+from biblat_manager.webapp.emailvalidator import (is_valid_email,
+                                                  validate_emails)
+
+CORPUS = [
+    'user@biblat.unam.mx', 'USER@BIBLAT.UNAM.MX', 'a@b.c', 'a@b.c-',
+    'first.last@example.com', "o'reilly+tag@example.co.uk",
+    "!#$%&'*+/=?^_`{|}~-@example.com", 'user@sub-domain.example.com',
+    'user@123.example', 'user@example.com>', 'user@example.com extra',
+    'user@example..com', 'user@a.-b', 'user@-example.com',
+    'user@example-.com', 'user@example', 'user@.example.com', '@example.com',
+    'user', '', 'user@', '.user@example.com', 'user.@example.com',
+    'us..er@example.com', 'us er@example.com', 'user@@example.com',
+    'user@exa_mple.com', 'user@example.c', 'ñandú@example.com',
+    'user@ñandú.com', 'user@example.ñ', 'Kelvin@example.com',
+    'user@ınfo.ſite', 'user@e.x@y.z', 'a.b.c@d.e.f',
+]
+
+
+class EmailValidatorTestCase(BaseTestCase):
+
+    def assertSameAsLegacy(self, email):
+        self.assertEqual(bool(LEGACY_REGEX_EMAIL.match(email)),
+                         is_valid_email(email), repr(email))
+
+    def test_regression_corpus(self):
+        """Test de los mismos resultados que la expresión anterior"""
+        for email in CORPUS:
+            self.assertSameAsLegacy(email)
+        rnd = random.Random(2019)
+        alphabet = 'aZ09.@-_+!\' "ñKı'
+        for i in range(20000):
+            self.assertSameAsLegacy(''.join(
+                rnd.choice(alphabet) for j in range(rnd.randint(0, 10))))
+        with self.assertRaises(TypeError):
+            is_valid_email(None)
+
+    def test_validate_emails(self):
+        """Test de la validación por lotes"""
+        self.assertEqual([True, False, True],
+                         validate_emails(iter(['a@b.mx', 'a@b', 'a@b.mx'])))
+
+    def test_worst_case_inputs(self):
+        """Test de tiempo lineal con entradas maliciosas"""
+        for build in WORST_CASES.values():
+            start = time.perf_counter()
+            self.assertFalse(is_valid_email(build(200000)))
+            self.assertLess(time.perf_counter() - start, 0.5)
+        results = run_email_benchmarks(lengths=[100], iterations=1)
+        self.assertIn('email:linear:local_dots.100', results)
+        self.assertIn('email:regex:valid', results)
@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+import os
+import shutil
+import tempfile
+
+from flask import current_app, render_template_string, url_for
+
+from biblat_manager.tests.base import BaseTestCase
+from biblat_manager.webapp import bytecode_cache, fragment_cache
+
+TEMPLATE = "{% cache 'counter' %}{{ counter() }}{% endcache %}"
+
+
+class FragmentCacheTestCase(BaseTestCase):
+
+    def setUp(self):
+        super(FragmentCacheTestCase, self).setUp()
+        fragment_cache.invalidate()
+        self.calls = 0
+
+    def counter(self):
+        self.calls += 1
+        return self.calls
+
+    def test_fragment_cached_and_invalidated(self):
+        """Test de la etiqueta cache y su invalidación"""
+        with current_app.test_request_context('/'):
+            self.assertEqual('1', render_template_string(
+                TEMPLATE, counter=self.counter))
+            self.assertEqual('1', render_template_string(
+                TEMPLATE, counter=self.counter))
+            fragment_cache.invalidate('counter')
+            self.assertEqual('2', render_template_string(
+                TEMPLATE, counter=self.counter))
+
+    def test_fragment_per_release(self):
+        """Test de fragmentos separados por versión y archivos estáticos"""
+        assets = current_app.extensions['assets']
+        version = assets.version
+        try:
+            with current_app.test_request_context('/'):
+                render_template_string(TEMPLATE, counter=self.counter)
+                assets.version = 'abc123'
+                self.assertEqual('2', render_template_string(
+                    TEMPLATE, counter=self.counter))
+                current_app.config['WEBAPP_VERSION'] = 'v0.2.0'
+                self.assertEqual('3', render_template_string(
+                    TEMPLATE, counter=self.counter))
+        finally:
+            assets.version = version
+
+    def test_fragment_per_locale(self):
+        """Test de fragmentos separados por idioma"""
+        with current_app.test_request_context('/'):
+            render_template_string(TEMPLATE, counter=self.counter)
+        with current_app.test_request_context(
+                '/', headers={'Accept-Language': 'en-US'}):
+            self.assertEqual('2', render_template_string(
+                TEMPLATE, counter=self.counter))
+
+    def test_bytecode_cache(self):
+        """Test del bytecode de las plantillas en disco"""
+        with current_app.app_context():
+            with self.client as c:
+                response = c.get(url_for('main.login'))
+                self.assertStatus(response, 200)
+        cache = current_app.jinja_env.bytecode_cache
+        self.assertIsNotNone(cache)
+        self.assertTrue(os.listdir(cache.directory))
+        self.assertFalse(os.stat(cache.directory).st_mode & 0o077)
+
+    def test_bytecode_cache_dir(self):
+        """Test del directorio de bytecode configurado"""
+        path = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, path, True)
+        bytecode_dir = os.path.join(path, 'jinja')
+        cache = bytecode_cache(current_app, bytecode_dir)
+        self.assertEqual(bytecode_dir, cache.directory)
+        self.assertEqual(0o700, os.stat(bytecode_dir).st_mode & 0o777)
+        # Otros usuarios pueden escribir en el directorio
+        os.chmod(bytecode_dir, 0o777)
+        self.assertIsNone(bytecode_cache(current_app, bytecode_dir))
+        self.assertIsNone(bytecode_cache(current_app, ''))
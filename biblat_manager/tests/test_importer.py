@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+import csv
+import json
+import os
+import shutil
+import tempfile
+
+from mock import patch
+
+from biblat_manager.tests.base import BaseTestCase
+from biblat_manager.webapp import importer
+from biblat_manager.webapp.controllers import create_user
+from biblat_manager.webapp.models import Checkpoint, User
+
+
+class ImportUsersTestCase(BaseTestCase):
+
+    def setUp(self):
+        super(ImportUsersTestCase, self).setUp()
+        self.tmp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        super(ImportUsersTestCase, self).tearDown()
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def write(self, name, content):
+        path = os.path.join(self.tmp_dir, name)
+        with open(path, 'w') as f:
+            f.write(content)
+        return path
+
+    def read_report(self, path):
+        with open(path) as f:
+            return list(csv.reader(f))[1:]
+
+    def test_import_csv(self):
+        """Test de importación de CSV con reporte de errores"""
+        create_user('existing@biblat.unam.mx', 'F00barbaz$', True)
+        path = self.write('users.csv', '\n'.join([
+            'email,password,username,email_confirmed',
+            'ana@biblat.unam.mx,F00barbaz$,ana,true',
+            'luis@biblat.unam.mx,F00barbaz$,,',
+            'not-an-email,F00barbaz$,,',
+            'existing@biblat.unam.mx,F00barbaz$,,',
+            'ana@biblat.unam.mx,F00barbaz$,ana2,',
+            'sin@biblat.unam.mx,,,',
+            'otra@biblat.unam.mx,F00barbaz$,ana,',
+        ]))
+        summary = importer.import_users(path, chunk_size=3, workers=2,
+                                        rounds=4)
+        self.assertEqual(2, summary['imported'])
+        self.assertEqual(2, summary['skipped'])
+        self.assertEqual(3, summary['failed'])
+        ana = User.get_by_email('ana@biblat.unam.mx')
+        self.assertTrue(ana.email_confirmed)
+        self.assertTrue(ana.check_password_hash('F00barbaz$'))
+        luis = User.get_by_email('luis@biblat.unam.mx')
+        self.assertEqual('luis', luis.username)
+        self.assertFalse(luis.email_confirmed)
+        report = sorted(self.read_report(summary['report']),
+                        key=lambda row: int(row[0]))
+        self.assertEqual(['4', '5', '6', '7', '8'],
+                         [row[0] for row in report])
+        self.assertIn('ya registrado', report[1][2])
+        self.assertIn('Nombre de usuario', report[4][2])
+        self.assertEqual(0, Checkpoint.objects.count())
+
+    def test_import_jsonl_resume(self):
+        """Test de importación JSONL reanudada después de un error"""
+        rows = [json.dumps({'email': 'user%d@biblat.unam.mx' % i,
+                            'password': 'F00barbaz$'}) for i in range(5)]
+        path = self.write('users.jsonl', '\n'.join(rows + ['{invalid']))
+        original = importer.UserImporter.import_chunk
+        calls = []
+
+        def failing_chunk(self, chunk, pool):
+            calls.append(len(chunk))
+            if len(calls) == 2:
+                raise RuntimeError('interrumpido')
+            return original(self, chunk, pool)
+
+        with patch.object(importer.UserImporter, 'import_chunk',
+                          failing_chunk):
+            with self.assertRaises(RuntimeError):
+                importer.import_users(path, chunk_size=2, workers=1,
+                                      rounds=4)
+        self.assertEqual(2, User.objects.count())
+        summary = importer.import_users(path, chunk_size=2, workers=1,
+                                        rounds=4, resume=True)
+        self.assertEqual(5, summary['imported'])
+        self.assertEqual(1, summary['failed'])
+        self.assertEqual(5, User.objects.count())
+        self.assertIn('JSON inválido', self.read_report(summary['report'])[0][2])
+
+    def test_import_jsonl_invalid_types(self):
+        """Test de filas JSONL con valores que no son texto"""
+        rows = [
+            {'email': 'user0@biblat.unam.mx', 'password': 'F00barbaz$'},
+            {'email': 12345, 'password': 'F00barbaz$'},
+            {'email': 'user2@biblat.unam.mx', 'password': 12345678},
+            {'email': 'user3@biblat.unam.mx', 'password': 'F00barbaz$',
+             'username': ['user3']},
+        ]
+        path = self.write('users.jsonl',
+                          '\n'.join(json.dumps(row) for row in rows))
+        summary = importer.import_users(path, workers=1, rounds=4)
+        self.assertEqual(1, summary['imported'])
+        self.assertEqual(3, summary['failed'])
+        report = sorted(self.read_report(summary['report']),
+                        key=lambda row: int(row[0]))
+        self.assertEqual(['2', '12345'], report[0][:2])
+        self.assertTrue(report[0][2].endswith('email'))
+        self.assertTrue(report[1][2].endswith('password'))
+        self.assertTrue(report[2][2].endswith('username'))
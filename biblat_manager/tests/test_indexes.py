@@ -0,0 +1,39 @@
+# -*- coding: utf-8 -*-
+from biblat_manager.tests.base import BaseTestCase
+from biblat_manager.webapp import indexes
+from biblat_manager.webapp.models import User
+
+
+class IndexesTestCase(BaseTestCase):
+
+    def test_ensure_indexes(self):
+        """Test de creación de los índices declarados en User"""
+        indexes.ensure_indexes([User])
+        self.assertEqual([], User.compare_indexes()['missing'])
+        index_keys = [info['key'] for info in
+                      User._get_collection().index_information().values()]
+        self.assertIn([('email', 1), ('_id', 1)], index_keys)
+
+    def test_plan_stages(self):
+        """Test de detección de COLLSCAN en un plan de ejecución"""
+        plan = {
+            'stage': 'SORT',
+            'inputStage': {
+                'stage': 'FETCH',
+                'inputStage': {'stage': 'COLLSCAN'}
+            }
+        }
+        self.assertEqual(['SORT', 'FETCH', 'COLLSCAN'],
+                         indexes.plan_stages(plan))
+        shapes = {'collscan': lambda: FakeQuerySet(plan)}
+        name, stages, problems = indexes.audit_query_shapes(shapes)[0]
+        self.assertEqual(['SORT', 'COLLSCAN'], problems)
+
+
+class FakeQuerySet(object):
+
+    def __init__(self, plan):
+        self.plan = plan
+
+    def explain(self):
+        return {'queryPlanner': {'winningPlan': self.plan}}
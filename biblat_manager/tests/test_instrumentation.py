@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+import os
+import shutil
+import tempfile
+
+from flask import current_app, g, url_for
+from mock import patch
+
+from biblat_manager.tests.base import BaseTestCase
+from biblat_manager.webapp import instrumentation
+from biblat_manager.webapp.controllers import create_user
+from biblat_manager.webapp.instrumentation import (CommandTimingListener,
+                                                   server_timing_header, timed)
+
+
+class FakeCommandEvent(object):
+    duration_micros = 2500
+
+
+class InstrumentationTestCase(BaseTestCase):
+
+    def create_app(self):
+        app = super(InstrumentationTestCase, self).create_app()
+        self.profile_dir = tempfile.mkdtemp()
+        app.config.update(SERVER_TIMING=True, PROFILE=True,
+                          PROFILE_SAMPLE_RATE=1, PROFILE_SLOW_MS=0,
+                          PROFILE_DIR=self.profile_dir)
+        instrumentation.init_app(app)
+        return app
+
+    def tearDown(self):
+        super(InstrumentationTestCase, self).tearDown()
+        shutil.rmtree(self.profile_dir, ignore_errors=True)
+
+    def test_server_timing_header(self):
+        """Test del encabezado Server-Timing en el login"""
+        create_user('admin@biblat.unam.mx', 'F00barbaz$', True)
+        user_data = {
+            'email': 'admin@biblat.unam.mx',
+            'password': 'F00barbaz$',
+        }
+        with current_app.app_context():
+            with self.client as c:
+                response = c.get(url_for('main.login'))
+                self.assertIn('render;dur=',
+                              response.headers['Server-Timing'])
+                response = c.post(url_for('main.login'), data=user_data)
+                self.assertStatus(response, 302)
+                header = response.headers['Server-Timing']
+                self.assertIn('bcrypt;dur=', header)
+                self.assertIn('total;dur=', header)
+                self.assertTrue(os.listdir(self.profile_dir))
+
+    def test_command_listener(self):
+        """Test del tiempo de mongoDB reportado por el listener"""
+        with current_app.test_request_context():
+            g._timings = {}
+            CommandTimingListener().succeeded(FakeCommandEvent())
+            CommandTimingListener().succeeded(FakeCommandEvent())
+            self.assertEqual((0.005, 2), g._timings['mongo'])
+            header = server_timing_header(g._timings, 0.01)
+        self.assertEqual('mongo;dur=5.00;desc="MongoDB (2)", total;dur=10.00',
+                         header)
+
+    def test_breadcrumbs_computed_once(self):
+        """Test de breadcrumbs calculados una vez por petición"""
+        create_user('admin@biblat.unam.mx', 'F00barbaz$', True)
+        user_data = {
+            'email': 'admin@biblat.unam.mx',
+            'password': 'F00barbaz$',
+        }
+        with current_app.app_context():
+            with self.client as c:
+                with patch('biblat_manager.webapp.timed', wraps=timed) as mock:
+                    response = c.post(url_for('main.login'), data=user_data,
+                                      follow_redirects=True)
+                    self.assertStatus(response, 200)
+                    self.assert_template_used('main/index.html')
+                    mock.assert_called_once_with('breadcrumbs')
@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+import threading
+
+from werkzeug.serving import make_server
+
+from biblat_manager.benchmarks import loadtest, scenarios
+from biblat_manager.tests.base import BaseTestCase
+from biblat_manager.webapp import limiter
+from biblat_manager.webapp.models import User
+
+
+class LoadTestTestCase(BaseTestCase):
+
+    def setUp(self):
+        super(LoadTestTestCase, self).setUp()
+        limiter.enabled = False
+        scenarios.seed_users(30)
+        self.password = User.objects(username='bench0000001').first().password
+
+    def test_in_process_sessions(self):
+        """Test de sesiones concurrentes dentro del proceso"""
+        app = self.app._get_current_object()
+        results = loadtest.run_loadtest(
+            lambda: loadtest.AppTransport(app), sessions=2, duration=0.5,
+            edit_ratio=1, seed=1)
+        for endpoint in ('login.post', 'list_users', 'user_detail',
+                         'user_edit', 'user_edit.post', 'set_locale',
+                         'menutoggle'):
+            self.assertGreater(results['loadtest:%s' % endpoint]['count'], 0)
+        self.assertEqual(0, sum(stats['errors']
+                                for stats in results.values()))
+        # Las ediciones vuelven a calcular el hash de la contraseña
+        self.assertTrue(User.objects(username__startswith='bench',
+                                     _password__ne=self.password).count())
+
+    def test_session_credentials(self):
+        """Test de un usuario sintético confirmado por sesión"""
+        emails = [loadtest.session_credentials(i)['email'] for i in range(3)]
+        self.assertEqual(3, len(set(emails)))
+        for email in emails:
+            self.assertTrue(User.get_by_email(email).email_confirmed)
+
+    def test_http_sessions(self):
+        """Test de sesiones contra un servidor HTTP con cookies propias"""
+        server = make_server('127.0.0.1', 0, self.app._get_current_object(),
+                             threaded=True)
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        self.addCleanup(server.shutdown)
+        url = 'http://127.0.0.1:%d' % server.server_port
+        results = loadtest.run_loadtest(
+            lambda: loadtest.HttpTransport(url), sessions=1, duration=0.3,
+            edit_ratio=0)
+        self.assertEqual(1, results['loadtest:login.post']['count'])
+        self.assertGreater(results['loadtest:list_users']['count'], 0)
+        self.assertEqual(0, sum(stats['errors']
+                                for stats in results.values()))
+
+    def test_errors_by_endpoint(self):
+        """Test de errores agrupados por endpoint y código"""
+        app = self.app._get_current_object()
+        results = loadtest.run_loadtest(
+            lambda: loadtest.AppTransport(app), sessions=1, duration=0.1,
+            credentials={'email': 'nadie@biblat.unam.mx',
+                         'password': 'F00barbaz$'})
+        self.assertEqual({'200': 1},
+                         results['loadtest:login.post']['error_codes'])
+        self.assertNotIn('loadtest:list_users', results)
@@ -8,6 +8,7 @@ from biblat_manager.tests.base import BaseTestCase
 
 
 class MainTestCase(BaseTestCase):
+    cache_app = True
 
     def test_home_page(self):
         """Test de la página principal"""
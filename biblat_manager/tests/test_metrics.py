@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+from mock import patch
+from flask import current_app, url_for
+from prometheus_client import REGISTRY
+
+from biblat_manager.config import settings
+from biblat_manager.tests.base import BaseTestCase
+from biblat_manager.webapp import create_app, metrics
+from biblat_manager.webapp.controllers import create_user
+from biblat_manager.webapp.metrics import CommandMetricsListener
+
+
+class FakeCommandEvent(object):
+    connection_id = ('localhost', 27017)
+    request_id = 1
+    command_name = 'find'
+    command = {'find': 'users', 'filter': {}}
+    duration_micros = 1500
+
+
+def sample(name, **labels):
+    return REGISTRY.get_sample_value(name, labels) or 0
+
+
+class MetricsTestCase(BaseTestCase):
+
+    def test_metrics_endpoint(self):
+        """Test de las métricas de peticiones y de hash en /metrics"""
+        create_user('admin@biblat.unam.mx', 'F00barbaz$', True)
+        labels = {'endpoint': 'main.login', 'method': 'POST'}
+        before = sample('biblat_request_seconds_count', **labels)
+        hashes = sample('biblat_password_hash_seconds_count',
+                        operation='verify_and_update')
+        with current_app.app_context():
+            with self.client as c:
+                c.post(url_for('main.login'),
+                       data={'email': 'admin@biblat.unam.mx',
+                             'password': 'F00barbaz$'})
+                response = c.get(url_for('metrics'))
+                self.assertStatus(response, 200)
+                self.assertIn('biblat_request_seconds_bucket',
+                              response.data.decode('utf-8'))
+        self.assertEqual(before + 1,
+                         sample('biblat_request_seconds_count', **labels))
+        self.assertEqual(hashes + 1,
+                         sample('biblat_password_hash_seconds_count',
+                                operation='verify_and_update'))
+
+    def test_metrics_token(self):
+        """Test de /metrics protegido con METRICS_TOKEN"""
+        metrics.token = 's3cr3t'
+        try:
+            with current_app.app_context():
+                with self.client as c:
+                    response = c.get(url_for('metrics'))
+                    self.assertStatus(response, 401)
+                    response = c.get(
+                        url_for('metrics'),
+                        headers={'Authorization': 'Bearer s3cr3t'})
+                    self.assertStatus(response, 200)
+        finally:
+            metrics.token = None
+
+    def test_metrics_disabled_without_token(self):
+        """Test de /metrics sin token ni METRICS_PUBLIC"""
+        with patch.object(settings.config['testing'], 'METRICS_PUBLIC',
+                          False):
+            app = create_app('testing')
+        self.assertNotIn('metrics', app.view_functions)
+
+    def test_command_listener(self):
+        """Test de los comandos de mongoDB por comando y colección"""
+        before = sample('biblat_mongo_command_seconds_count',
+                        command='find', collection='users')
+        listener = CommandMetricsListener()
+        listener.started(FakeCommandEvent())
+        listener.succeeded(FakeCommandEvent())
+        self.assertEqual(before + 1,
+                         sample('biblat_mongo_command_seconds_count',
+                                command='find', collection='users'))
+        self.assertEqual({}, listener._collections)
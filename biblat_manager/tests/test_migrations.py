@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+import functools
+
+from mock import patch
+from mongomock.collection import BulkOperationBuilder
+from pymongo import UpdateOne
+
+from biblat_manager.tests.base import BaseTestCase
+from biblat_manager.webapp.migrations import (Migration, MigrationRunner,
+                                              load_migrations)
+from biblat_manager.webapp.models import Checkpoint
+
+
+class AddScore(Migration):
+    collection = 'items'
+    query = {'score': {'$exists': False}}
+
+    def migrate(self, doc):
+        return UpdateOne({'_id': doc['_id']},
+                         {'$set': {'score': doc['n'] * 2}})
+
+
+def _without_hint(method):
+    # mongomock no acepta el argumento ``hint`` de las operaciones de
+    # pymongo 3.11+
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        kwargs.pop('hint', None)
+        return method(self, *args, **kwargs)
+    return wrapper
+
+
+class MigrationsTestCase(BaseTestCase):
+
+    def setUp(self):
+        super(MigrationsTestCase, self).setUp()
+        for name in ('add_update', 'add_replace', 'add_delete'):
+            patcher = patch.object(
+                BulkOperationBuilder, name,
+                _without_hint(getattr(BulkOperationBuilder, name)))
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.migration = AddScore(2, 'add_score')
+        self.collection = self.migration.get_collection()
+        self.collection.insert_many([{'_id': i, 'n': i} for i in range(10)])
+
+    def test_load_migrations(self):
+        """Test de carga de los archivos de migración en orden"""
+        migrations = load_migrations()
+        self.assertEqual(1, migrations[0].version)
+        self.assertEqual('0001_binary_user_ids', migrations[0].label)
+        versions = [migration.version for migration in migrations]
+        self.assertEqual(sorted(versions), versions)
+
+    def test_upgrade_batches(self):
+        """Test de aplicación por lotes y registro de la migración"""
+        batches = []
+        runner = MigrationRunner([self.migration], batch_size=3,
+                                 progress=batches.append)
+        results = runner.upgrade()
+        self.assertEqual([3, 3, 3, 1], batches)
+        self.assertEqual(10, results[0][1]['modified'])
+        self.assertEqual(list(range(0, 20, 2)),
+                         [doc['score'] for doc in
+                          self.collection.find().sort('_id', 1)])
+        self.assertIn(2, runner.applied())
+        self.assertEqual([], runner.pending())
+        self.assertIsNone(Checkpoint.get_position(
+            self.migration.checkpoint_name))
+        self.assertEqual([], runner.upgrade())
+
+    def test_resume(self):
+        """Test de una migración interrumpida que continúa donde se quedó"""
+        runner = MigrationRunner([self.migration], batch_size=4)
+
+        def interrupt(count):
+            raise KeyboardInterrupt
+        runner.progress = interrupt
+        with self.assertRaises(KeyboardInterrupt):
+            runner.upgrade()
+        self.assertEqual(3, Checkpoint.get_position(
+            self.migration.checkpoint_name))
+        self.assertEqual({}, runner.applied())
+
+        batches = []
+        runner.progress = batches.append
+        summary = runner.upgrade()[0][1]
+        self.assertEqual([4, 2], batches)
+        self.assertEqual(10, summary['documents'])
+        self.assertEqual(0, self.collection.count_documents(
+            {'score': {'$exists': False}}))
+
+    def test_target(self):
+        """Test de aplicación hasta una versión"""
+        other = AddScore(3, 'other')
+        runner = MigrationRunner([other, self.migration])
+        self.assertEqual([2], [m.version for m in runner.pending(target=2)])
+        self.assertEqual([2, 3], [m.version for m in runner.pending()])
+
+    def test_estimate(self):
+        """Test de dry-run: estima sin escribir"""
+        runner = MigrationRunner([self.migration], batch_size=4)
+        estimate = runner.estimate(self.migration, sample=5)
+        self.assertEqual(10, estimate['documents'])
+        self.assertEqual(5, estimate['sampled'])
+        self.assertEqual(5, estimate['operations'])
+        self.assertEqual(3, estimate['batches'])
+        self.assertGreaterEqual(estimate['estimated_seconds'], 0)
+        self.assertEqual(0, self.collection.count_documents(
+            {'score': {'$exists': True}}))
+        self.assertEqual({}, runner.applied())
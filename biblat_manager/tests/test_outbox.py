@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+from mock import patch
+from flask import current_app, url_for
+
+from biblat_manager.tests.base import BaseTestCase
+from biblat_manager.webapp import mail, notifications, outbox
+from biblat_manager.webapp.controllers import create_user
+from biblat_manager.webapp.models import OutboxEmail
+
+
+class OutboxTestCase(BaseTestCase):
+
+    def setUp(self):
+        super(OutboxTestCase, self).setUp()
+        current_app.config['MAIL_OUTBOX'] = True
+
+    def test_enqueue_confirmation_email(self):
+        """Test de registro del correo de confirmación en el outbox"""
+        with mail.record_messages() as sent:
+            was_sent, error_msg = notifications.send_confirmation_email(
+                'newuser@biblat.unam.mx')
+            self.assertTrue(was_sent)
+            self.assertEqual(0, len(sent))
+        email = OutboxEmail.objects.first()
+        self.assertEqual(['newuser@biblat.unam.mx'], email.recipients)
+        self.assertEqual('pending', email.status)
+        self.assertIn('/user/confirm/', email.html)
+
+    def test_process_outbox(self):
+        """Test de envío de los correos pendientes en una conexión"""
+        for i in range(3):
+            outbox.enqueue_email('user%d@biblat.unam.mx' % i, 'Asunto',
+                                 '<p>Hola</p>')
+        with mail.record_messages() as sent:
+            with patch.object(mail, 'connect', wraps=mail.connect) as mock:
+                self.assertEqual((3, 0), outbox.process_outbox(batch_size=5))
+                self.assertEqual(1, mock.call_count)
+            self.assertEqual(3, len(sent))
+        self.assertEqual(3, OutboxEmail.objects(status='sent').count())
+        self.assertEqual((0, 0), outbox.process_outbox())
+
+    def test_sent_not_retried_on_save_error(self):
+        """Test de correo entregado que no se pudo registrar como enviado"""
+        outbox.enqueue_email('user@biblat.unam.mx', 'Asunto', '<p>Hola</p>')
+        batch = outbox.claim_batch(5)
+        with mail.record_messages() as sent:
+            with patch.object(OutboxEmail, 'save',
+                              side_effect=RuntimeError('mongo')):
+                self.assertEqual((1, 0), outbox.send_batch(batch))
+            self.assertEqual(1, len(sent))
+        email = OutboxEmail.objects.get()
+        self.assertEqual('sending', email.status)
+        self.assertEqual(0, email.attempts)
+
+    def test_retry_with_backoff(self):
+        """Test de reintento y error definitivo de envío"""
+        current_app.config['MAIL_OUTBOX_MAX_ATTEMPTS'] = 2
+        outbox.enqueue_email('user@biblat.unam.mx', 'Asunto', '<p>Hola</p>')
+        with patch('flask_mail.Connection.send') as mock:
+            mock.side_effect = IOError('relay caído')
+            self.assertEqual((0, 1), outbox.process_outbox())
+            email = OutboxEmail.objects.first()
+            self.assertEqual('pending', email.status)
+            self.assertEqual(1, email.attempts)
+            self.assertEqual('relay caído', email.last_error)
+            self.assertGreater(email.next_attempt, email.created_at)
+            # Sin esperar el backoff no se reintenta
+            self.assertEqual((0, 0), outbox.process_outbox())
+            email.next_attempt = email.created_at
+            email.save()
+            self.assertEqual((0, 1), outbox.process_outbox())
+        email.reload()
+        self.assertEqual('failed', email.status)
+
+    def test_user_add_enqueue(self):
+        """Test de registro de usuario sin envío directo de correo"""
+        user_data = {
+            'email': 'admin@biblat.unam.mx',
+            'password': 'F00barbaz$',
+        }
+        new_user_data = {
+            'username': 'newuser',
+            'email': 'newuser@biblat.unam.mx',
+            'password': 'F00barbaz$',
+            'confirm': 'F00barbaz$'
+        }
+        create_user(user_data['email'], user_data['password'], True)
+        with current_app.app_context():
+            with self.client as c:
+                with mail.record_messages() as sent:
+                    c.post(url_for('main.login'), data=user_data,
+                           follow_redirects=True)
+                    response = c.post(url_for('main.user_add'),
+                                      data=new_user_data,
+                                      follow_redirects=True)
+                    self.assertIn('Se envío un correo de confirmación a: %s'
+                                  % new_user_data['email'],
+                                  response.data.decode('utf-8'))
+                    self.assertEqual(0, len(sent))
+        self.assertEqual(1, OutboxEmail.objects(
+            recipients=new_user_data['email']).count())
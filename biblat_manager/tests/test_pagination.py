@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+from flask import current_app, url_for
+
+from biblat_manager.webapp import utils
+from biblat_manager.tests.base import BaseTestCase
+from biblat_manager.webapp.controllers import create_user
+from biblat_manager.webapp.models import User
+from biblat_manager.webapp.pagination import (
+    CountCache, KeysetPagination, decode_cursor, encode_cursor)
+
+
+class KeysetPaginationTestCase(BaseTestCase):
+    cache_app = True
+
+    def setUp(self):
+        super(KeysetPaginationTestCase, self).setUp()
+        for i in range(7):
+            User(username='user%d' % (6 - i), email='user%d@biblat.unam.mx' % i,
+                 password='F00barbaz$', email_confirmed=bool(i % 2)).save()
+
+    def walk(self, order_by):
+        pages = [KeysetPagination(User.objects, order_by=order_by,
+                                  per_page=3)]
+        while pages[-1].next_cursor:
+            pages.append(KeysetPagination(User.objects, order_by=order_by,
+                                          per_page=3,
+                                          cursor=pages[-1].next_cursor))
+        return pages
+
+    def test_walk_all_orders(self):
+        """Test de recorrido por cursor para cada columna ordenable"""
+        for order_by in (None, 'username', '-username', 'email', '-email',
+                         'email_confirmed', '-email_confirmed'):
+            pages = self.walk(order_by)
+            walked = [user.pk for page in pages for user in page.items]
+            keys = ('_id',) if not order_by else (order_by, '-_id'
+                                                  if order_by[0] == '-'
+                                                  else '_id')
+            expected = [user.pk for user in User.objects.order_by(*keys)]
+            self.assertEqual(expected, walked, order_by)
+            self.assertEqual([3, 3, 1], [len(p.items) for p in pages])
+            self.assertFalse(pages[0].has_prev)
+
+    def test_prev_cursor(self):
+        """Test de regreso a la página anterior"""
+        pages = self.walk('-email')
+        back = KeysetPagination(User.objects, order_by='-email', per_page=3,
+                                cursor=pages[2].prev_cursor)
+        self.assertEqual([u.pk for u in pages[1].items],
+                         [u.pk for u in back.items])
+        first = KeysetPagination(User.objects, order_by='-email', per_page=3,
+                                 cursor=back.prev_cursor)
+        self.assertEqual([u.pk for u in pages[0].items],
+                         [u.pk for u in first.items])
+        self.assertIsNone(first.prev_cursor)
+
+    def test_mixed_id_types(self):
+        """Test de recorrido por _id con ids string sin migrar y binarios"""
+        for i in range(4):
+            User._get_collection().insert_one({
+                '_id': utils.generate_uuid_32_string(),
+                'username': 'legacy%d' % i,
+                'email': 'legacy%d@biblat.unam.mx' % i,
+                'password': 'F00barbaz$', 'email_confirmed': False})
+        for order_by in (None, 'email_confirmed', '-email_confirmed'):
+            pages = self.walk(order_by)
+            walked = [user.pk for page in pages for user in page.items]
+            self.assertEqual(11, len(set(walked)), order_by)
+            self.assertEqual(11, len(walked), order_by)
+        back = KeysetPagination(User.objects, order_by='-email_confirmed',
+                                per_page=3, cursor=pages[2].prev_cursor)
+        self.assertEqual([u.pk for u in pages[1].items],
+                         [u.pk for u in back.items])
+
+    def test_cursor_token(self):
+        """Test de tokens opacos inválidos"""
+        token = encode_cursor({'id': 'abc', 'v': True, 'd': 'next'})
+        self.assertEqual({'id': 'abc', 'v': True, 'd': 'next'},
+                         decode_cursor(token))
+        self.assertIsNone(decode_cursor('no-es-un-token'))
+
+    def test_count_cache(self):
+        """Test del total en caché"""
+        cache = CountCache(ttl=60)
+        self.assertEqual(7, cache.get(User._get_collection()))
+        User(email='new@biblat.unam.mx', password='F00barbaz$').save()
+        self.assertEqual(7, cache.get(User._get_collection()))
+
+    def test_list_users_cursor(self):
+        """Test de la vista list_users con cursor"""
+        user_data = {
+            'email': 'admin@biblat.unam.mx',
+            'password': 'F00barbaz$',
+        }
+        create_user(user_data['email'], user_data['password'], True)
+        for i in range(6):
+            create_user('extra%d@biblat.unam.mx' % i, 'F00barbaz$', False)
+        with current_app.app_context():
+            with self.client as c:
+                c.post(url_for('main.login'), data=user_data,
+                       follow_redirects=True)
+                response = c.get(url_for('main.list_users', order_by='email'))
+                self.assertStatus(response, 200)
+                users = self.get_context_variable('users')
+                self.assertEqual(14, users.total)
+                self.assertEqual(10, len(users.items))
+                response = c.get(url_for('main.list_users', order_by='email',
+                                         cursor=users.next_cursor))
+                self.assertStatus(response, 200)
+                users = self.get_context_variable('users')
+                self.assertEqual(4, len(users.items))
+                self.assertIsNone(users.next_cursor)
+                self.assertIn('cursor=%s' % users.prev_cursor,
+                              response.data.decode('utf-8'))
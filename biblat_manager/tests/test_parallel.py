@@ -0,0 +1,40 @@
+# -*- coding: utf-8 -*-
+import unittest
+
+from flask import current_app
+
+from biblat_manager.tests.base import BaseTestCase
+from biblat_manager.tests.parallel import iter_test_ids, split_tests
+
+
+class SplitTestsTestCase(unittest.TestCase):
+
+    def test_split_tests(self):
+        """Test de reparto en tramos contiguos de tamaño similar"""
+        ids = ['t%d' % i for i in range(10)]
+        chunks = split_tests(ids, 3)
+        self.assertEqual([4, 3, 3], [len(chunk) for chunk in chunks])
+        self.assertEqual(ids, sum(chunks, []))
+        self.assertEqual(2, len(split_tests(ids[:2], 4)))
+
+    def test_iter_test_ids(self):
+        """Test de los ids de una suite anidada"""
+        suite = unittest.TestSuite([
+            unittest.TestLoader().loadTestsFromTestCase(SplitTestsTestCase)])
+        self.assertEqual(2, len(list(iter_test_ids(suite))))
+
+
+class CachedAppTestCase(BaseTestCase):
+    cache_app = True
+    apps = []
+
+    def test_a_config_change(self):
+        """Test de cambio de configuración en la aplicación reutilizada"""
+        self.apps.append(current_app._get_current_object())
+        current_app.config['MAIL_OUTBOX'] = True
+
+    def test_b_reused(self):
+        """Test de aplicación reutilizada con la configuración restaurada"""
+        self.apps.append(current_app._get_current_object())
+        self.assertIs(self.apps[0], self.apps[-1])
+        self.assertFalse(current_app.config['MAIL_OUTBOX'])
@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+import os
+import shutil
+import tempfile
+
+from flask import current_app
+from werkzeug.datastructures import MultiDict
+
+from biblat_manager.tests.base import BaseTestCase
+from biblat_manager.webapp import password_filter
+from biblat_manager.webapp.forms import PasswordForm
+from biblat_manager.webapp.passwordfilter import (PasswordFilter,
+                                                  build_password_filter,
+                                                  filter_size)
+
+
+class PasswordFilterTestCase(BaseTestCase):
+
+    def setUp(self):
+        super(PasswordFilterTestCase, self).setUp()
+        self.tmp_dir = tempfile.mkdtemp()
+        self.wordlist = os.path.join(self.tmp_dir, 'passwords.txt')
+        self.output = os.path.join(self.tmp_dir, 'passwords.bloom')
+        with open(self.wordlist, 'wb') as f:
+            f.write(b'\n'.join(('Leaked%05d$' % i).encode('ascii')
+                               for i in range(5000)))
+            f.write('\r\nContraseña#2019\n\n'.encode('utf-8'))
+
+    def tearDown(self):
+        super(PasswordFilterTestCase, self).tearDown()
+        password_filter.close()
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def test_filter(self):
+        """Test de consultas al filtro de Bloom"""
+        self.assertEqual(5001, build_password_filter(self.wordlist,
+                                                     self.output))
+        bits, hashes = filter_size(5001, 0.001)
+        self.assertEqual(28 + bits // 8, os.path.getsize(self.output))
+        bloom = PasswordFilter(self.output)
+        self.assertIn('Leaked00042$', bloom)
+        self.assertIn('Contraseña#2019', bloom)
+        false_positives = sum('Other%05d$' % i in bloom
+                              for i in range(5000))
+        self.assertLess(false_positives, 25)
+        self.assertEqual(hashes, bloom.hashes)
+        bloom.close()
+        self.assertNotIn('Leaked00042$', PasswordFilter())
+
+    def test_check_secure_password(self):
+        """Test de contraseñas filtradas en los formularios"""
+        build_password_filter(self.wordlist, self.output)
+        current_app.config['PASSWORD_FILTER_PATH'] = self.output
+        password_filter.init_app(current_app)
+        with current_app.test_request_context():
+            form = PasswordForm(MultiDict({'password': 'Leaked00042$',
+                                           'confirm': 'Leaked00042$'}))
+            self.assertFalse(form.validate())
+            self.assertIn('La contraseña es muy común',
+                          form.errors['password'])
+            form = PasswordForm(MultiDict({'password': 'F00barbaz$',
+                                           'confirm': 'F00barbaz$'}))
+            self.assertTrue(form.validate())
@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+from mock import patch
+from flask import current_app, url_for
+
+from biblat_manager.tests.base import BaseTestCase
+from biblat_manager.webapp import hasher
+from biblat_manager.webapp.controllers import create_user
+from biblat_manager.webapp.models import User
+from biblat_manager.webapp.passwords import native_thread_pool, pwd_context
+
+
+class PasswordHasherTestCase(BaseTestCase):
+
+    def test_hash_and_verify(self):
+        """Test de hash y verificación en el pool"""
+        hashed = hasher.hash('F00barbaz$')
+        self.assertTrue(hasher.verify('F00barbaz$', hashed))
+        self.assertFalse(hasher.verify('Quxquuxc0rge$', hashed))
+        self.assertIn('$2b,4$', hashed)
+
+    def test_login_wrong_password_verifies_once(self):
+        """Test de una sola verificación con contraseña incorrecta"""
+        user_data = {
+            'email': 'admin@biblat.unam.mx',
+            'password': 'Quxquuxc0rge$',
+        }
+        create_user(user_data['email'], 'F00barbaz$', True)
+        with current_app.app_context():
+            with self.client as c:
+                with patch.object(hasher, 'verify_and_update',
+                                  wraps=hasher.verify_and_update) as mock:
+                    response = c.post(url_for('main.login'), data=user_data,
+                                      follow_redirects=True)
+                    self.assertStatus(response, 200)
+                    self.assertIn('Contraseña incorrecta',
+                                  response.data.decode('utf-8'))
+                    self.assertEqual(1, mock.call_count)
+
+    def test_login_rehash_password(self):
+        """Test de actualización del hash al cambiar el costo"""
+        user_data = {
+            'email': 'admin@biblat.unam.mx',
+            'password': 'F00barbaz$',
+        }
+        user = create_user(user_data['email'], user_data['password'], True)
+        old_hash = pwd_context.hash(user_data['password'], rounds=5)
+        user._password = old_hash
+        user.save()
+        with current_app.app_context():
+            with self.client as c:
+                response = c.post(url_for('main.login'), data=user_data,
+                                  follow_redirects=True)
+                self.assertStatus(response, 200)
+                self.assert_template_used('main/index.html')
+        user = User.get_by_email(user_data['email'])
+        self.assertNotEqual(old_hash, user.password)
+        self.assertIn('$2b,4$', user.password)
+        self.assertTrue(user.check_password_hash(user_data['password']))
+
+    def test_gevent_native_thread_pool(self):
+        """Test del pool de hilos reales con workers gevent"""
+        from gevent.threadpool import ThreadPoolExecutor
+        with patch('biblat_manager.webapp.passwords.gevent_patched',
+                   return_value=True):
+            executor = native_thread_pool(2)
+        try:
+            self.assertIsInstance(executor, ThreadPoolExecutor)
+            self.assertTrue(executor.submit(pwd_context.verify, 'F00barbaz$',
+                                            pwd_context.hash('F00barbaz$'))
+                            .result())
+        finally:
+            executor.shutdown()
+
+    def test_sync_workers_without_pool(self):
+        """Test de hash en el hilo de la petición sin gevent"""
+        hasher.shutdown()
+        self.assertEqual('thread', hasher.executor_type)
+        self.assertTrue(hasher.verify('F00barbaz$',
+                                      hasher.hash('F00barbaz$')))
+        self.assertIsNone(hasher._executor)
+        with patch('biblat_manager.webapp.passwords.gevent_patched',
+                   return_value=True):
+            self.assertIsNotNone(hasher._get_executor())
+        hasher.shutdown()
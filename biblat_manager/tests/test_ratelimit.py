@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+from mock import patch
+from flask import current_app, url_for
+from prometheus_client import REGISTRY
+from werkzeug.middleware.proxy_fix import ProxyFix
+
+from biblat_manager.config import settings
+from biblat_manager.tests.base import BaseTestCase
+from biblat_manager.webapp import create_app, limiter
+from biblat_manager.webapp.ratelimit import MemoryBackend, MongoBackend
+
+
+class FakeClock(object):
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class RateLimitTestCase(BaseTestCase):
+
+    def test_memory_backend_refill(self):
+        """Test del llenado del token bucket en memoria"""
+        clock = FakeClock()
+        backend = MemoryBackend(clock=clock)
+        results = [backend.consume('k', 2, 1.0) for i in range(3)]
+        self.assertEqual([True, True, False], results)
+        clock.now += 1
+        self.assertTrue(backend.consume('k', 2, 1.0))
+        self.assertFalse(backend.consume('k', 2, 1.0))
+
+    def test_mongo_backend_shared_bucket(self):
+        """Test de token bucket compartido en mongoDB"""
+        clock = FakeClock()
+        worker_a = MongoBackend(clock=clock)
+        worker_b = MongoBackend(clock=clock)
+        self.assertTrue(worker_a.consume('k', 2, 1.0))
+        self.assertTrue(worker_b.consume('k', 2, 1.0))
+        self.assertFalse(worker_a.consume('k', 2, 1.0))
+        clock.now += 1
+        self.assertTrue(worker_b.consume('k', 2, 1.0))
+
+    def test_login_rejected_before_query(self):
+        """Test de rechazo de login sin consultar la base de datos"""
+        user_data = {
+            'email': 'admin@biblat.unam.mx',
+            'password': 'F00barbaz$',
+        }
+        limiter.rates['email'] = (2, 0.001)
+        login_url = url_for('main.login')
+        rejected = REGISTRY.get_sample_value(
+            'biblat_ratelimit_requests_total',
+            {'scope': 'login', 'result': 'rejected_email'}) or 0
+        with current_app.app_context():
+            with self.client as c:
+                for i in range(2):
+                    response = c.post(login_url, data=user_data)
+                    self.assertStatus(response, 200)
+                with patch('biblat_manager.webapp.main.views.User') as mock:
+                    response = c.post(login_url, data=user_data)
+                    self.assertStatus(response, 429)
+                    self.assertFalse(mock.objects.called)
+        stats = limiter.stats()['login']
+        self.assertEqual(2, stats['allowed'])
+        self.assertEqual(1, stats['rejected_email'])
+        self.assertEqual(rejected + 1, REGISTRY.get_sample_value(
+            'biblat_ratelimit_requests_total',
+            {'scope': 'login', 'result': 'rejected_email'}))
+
+    def test_proxy_fix_client_ip(self):
+        """Test de la IP del cliente detrás de un proxy de confianza"""
+        with patch.object(settings.config['testing'], 'PROXY_FIX', 1):
+            proxy_fix = create_app('testing').wsgi_app
+        seen = {}
+        proxy_fix.app = lambda environ, start_response: seen.update(environ)
+        proxy_fix({'REMOTE_ADDR': '10.0.0.2',
+                   'HTTP_X_FORWARDED_FOR': '203.0.113.7, 10.0.0.1'}, None)
+        self.assertEqual('10.0.0.1', seen['REMOTE_ADDR'])
+        self.assertIsNot(ProxyFix,
+                         type(create_app('testing').wsgi_app))
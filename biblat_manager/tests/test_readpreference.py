@@ -0,0 +1,48 @@
+# -*- coding: utf-8 -*-
+from flask import current_app, g
+from pymongo.read_preferences import Primary, SecondaryPreferred
+
+from biblat_manager.config.settings import mongodb_uri
+from biblat_manager.tests.base import BaseTestCase
+from biblat_manager.webapp.models import User
+from biblat_manager.webapp.readpreference import (for_listing,
+                                                  listing_read_preference,
+                                                  make_read_preference)
+
+
+class ReadPreferenceTestCase(BaseTestCase):
+
+    def test_mongodb_uri(self):
+        """Test de la base agregada a las URI de conexión"""
+        self.assertEqual('mongodb://a,b/biblat?replicaSet=rs0',
+                         mongodb_uri('mongodb://a,b/?replicaSet=rs0',
+                                     'biblat'))
+        self.assertEqual('mongodb://a/biblat', mongodb_uri('mongodb://a',
+                                                           'biblat'))
+        self.assertEqual('mongodb+srv://u:p@a/otra?w=majority',
+                         mongodb_uri('mongodb+srv://u:p@a/otra?w=majority',
+                                     'biblat'))
+
+    def test_listing_read_preference(self):
+        """Test de la preferencia de lectura de los listados"""
+        read_preference = listing_read_preference()
+        self.assertIsInstance(read_preference, SecondaryPreferred)
+        self.assertEqual(90, read_preference.max_staleness)
+        self.assertEqual(read_preference,
+                         for_listing(User.objects)._read_preference)
+        self.assertEqual(read_preference, for_listing(
+            User._get_collection()).read_preference)
+        self.assertIsInstance(User._get_collection().read_preference,
+                              Primary)
+        current_app.config['MONGODB_LISTING_READ_PREFERENCE'] = 'primary'
+        self.assertIsInstance(listing_read_preference(), Primary)
+        with self.assertRaises(ValueError):
+            make_read_preference('secondaryish')
+
+    def test_conditional_views_read_primary(self):
+        """Test de lectura del primario en las vistas con ETag"""
+        with current_app.test_request_context():
+            g.listing_from_primary = True
+            self.assertIsInstance(listing_read_preference(), Primary)
+            self.assertIsInstance(
+                for_listing(User.objects)._read_preference, Primary)
@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+from mock import patch
+from flask import current_app, url_for
+
+from biblat_manager.tests.base import BaseTestCase
+from biblat_manager.webapp import controllers, mail, utils
+from biblat_manager.webapp.controllers import create_user
+from biblat_manager.webapp.models import Checkpoint, OutboxEmail, User
+
+
+class ResendConfirmationsTestCase(BaseTestCase):
+
+    def setUp(self):
+        super(ResendConfirmationsTestCase, self).setUp()
+        for i in range(5):
+            create_user('user%d@biblat.unam.mx' % i, 'F00barbaz$', i == 0)
+
+    def test_resend_pooled_connections(self):
+        """Test de reenvío por lotes con un serializador y una conexión"""
+        with mail.record_messages() as sent:
+            with patch.object(mail, 'connect', wraps=mail.connect) as connect:
+                with patch('biblat_manager.webapp.utils.get_timed_serializer',
+                           wraps=utils.get_timed_serializer) as serializer:
+                    summary = controllers.resend_confirmation_emails(
+                        batch_size=2,
+                        checkpoint=controllers.RESEND_CONFIRMATIONS_CHECKPOINT)
+                    self.assertEqual(1, serializer.call_count)
+                self.assertEqual(2, connect.call_count)
+        self.assertEqual({'sent': 4, 'failed': 0}, summary)
+        self.assertEqual(['user%d@biblat.unam.mx' % i for i in range(1, 5)],
+                         sorted(msg.recipients[0] for msg in sent))
+        self.assertIsNone(Checkpoint.get_position(
+            controllers.RESEND_CONFIRMATIONS_CHECKPOINT))
+
+    def test_resend_resume(self):
+        """Test de reanudación desde el último lote con los totales"""
+        unconfirmed = User.objects(email_confirmed=False).order_by('_id')
+        Checkpoint.save_position(controllers.RESEND_CONFIRMATIONS_CHECKPOINT,
+                                 unconfirmed[1].pk, sent=1, failed=1)
+        with mail.record_messages() as sent:
+            summary = controllers.resend_confirmation_emails(
+                checkpoint=controllers.RESEND_CONFIRMATIONS_CHECKPOINT,
+                resume=True)
+        self.assertEqual({'sent': 3, 'failed': 1}, summary)
+        self.assertEqual(sorted(u.email for u in unconfirmed[2:]),
+                         sorted(msg.recipients[0] for msg in sent))
+
+    def test_resend_confirmation_view(self):
+        """Test de la acción de reenvío en el listado de usuarios"""
+        user_data = {
+            'email': 'user0@biblat.unam.mx',
+            'password': 'F00barbaz$',
+        }
+        user = User.get_by_email('user3@biblat.unam.mx')
+        Checkpoint.save_position(controllers.RESEND_CONFIRMATIONS_CHECKPOINT,
+                                 user.pk)
+        current_app.config['MAIL_OUTBOX'] = True
+        with current_app.app_context():
+            with self.client as c:
+                c.post(url_for('main.login'), data=user_data,
+                       follow_redirects=True)
+                response = c.post(url_for('main.resend_confirmations'),
+                                  data={'user_id': user.id},
+                                  follow_redirects=True)
+                self.assertStatus(response, 200)
+                self.assertIn('Se enviaron 1 correos de confirmación',
+                              response.data.decode('utf-8'))
+        self.assertEqual([user.email], OutboxEmail.objects.get().recipients)
+        # El checkpoint de la terminal no se modifica
+        self.assertEqual(user.pk, Checkpoint.get_position(
+            controllers.RESEND_CONFIRMATIONS_CHECKPOINT))
+
+    def test_resend_confirmation_view_without_outbox(self):
+        """Test de reenvío por SMTP sin outbox sólo para los seleccionados"""
+        user_data = {
+            'email': 'user0@biblat.unam.mx',
+            'password': 'F00barbaz$',
+        }
+        user = User.get_by_email('user3@biblat.unam.mx')
+        with current_app.app_context():
+            with self.client as c:
+                c.post(url_for('main.login'), data=user_data,
+                       follow_redirects=True)
+                response = c.get(url_for('main.list_users'))
+                self.assertNotIn('fa-envelope', response.data.decode('utf-8'))
+                with mail.record_messages() as sent:
+                    response = c.post(url_for('main.resend_confirmations'),
+                                      data={'user_id': user.id},
+                                      follow_redirects=True)
+                    self.assertIn('Se enviaron 1 correos de confirmación',
+                                  response.data.decode('utf-8'))
+                    response = c.post(url_for('main.resend_confirmations'),
+                                      follow_redirects=True)
+                    self.assertIn('flask resend-confirmations',
+                                  response.data.decode('utf-8'))
+        self.assertEqual([[user.email]], [msg.recipients for msg in sent])
+        self.assertEqual(0, OutboxEmail.objects.count())
+
+    def test_resend_rate_counts_failures(self):
+        """Test del límite de envíos contando también los fallidos"""
+        with patch('biblat_manager.webapp.controllers.time.sleep') as sleep:
+            with patch('flask_mail.Connection.send',
+                       side_effect=Exception('SMTP')):
+                summary = controllers.resend_confirmation_emails(rate=0.5)
+        self.assertEqual({'sent': 0, 'failed': 4}, summary)
+        self.assertEqual(3, sleep.call_count)
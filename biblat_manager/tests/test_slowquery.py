@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+import json
+
+from mock import patch
+from flask import current_app, url_for
+
+from biblat_manager.tests.base import BaseTestCase
+from biblat_manager.webapp import slow_query_log
+from biblat_manager.webapp.controllers import create_user
+from biblat_manager.webapp import slowquery
+from biblat_manager.webapp.slowquery import SlowQueryListener, command_shape
+
+
+class FakeCommandEvent(object):
+    connection_id = ('localhost', 27017)
+    request_id = 1
+    command_name = 'find'
+
+    def __init__(self, command, duration_ms):
+        self.command = command
+        self.duration_micros = duration_ms * 1000
+
+
+class SlowQueryTestCase(BaseTestCase):
+
+    def test_command_shape(self):
+        """Test de la forma del comando sin valores"""
+        shape = command_shape('find', {
+            'find': 'users',
+            'filter': {'email': 'admin@biblat.unam.mx',
+                       '_id': {'$in': ['a', 'b']}},
+            'sort': {'email': 1, '_id': 1},
+            'limit': 11,
+            'lsid': {'id': 'x'},
+        })
+        self.assertEqual({
+            'find': 'users',
+            'filter': {'email': '?', '_id': {'$in': ['?']}},
+            'sort': {'email': 1, '_id': 1},
+        }, json.loads(shape))
+        self.assertNotIn('admin@biblat.unam.mx', shape)
+
+    def test_listener_threshold(self):
+        """Test del registro de comandos más lentos que el umbral"""
+        listener = SlowQueryListener(slow_query_log)
+        command = {'find': 'users', 'filter': {'email': 'a@biblat.unam.mx'}}
+        with current_app.test_request_context(
+                '/usuarios', headers={'X-Request-ID': 'abc123'}):
+            for duration_ms in (5, 150, 300):
+                event = FakeCommandEvent(command, duration_ms)
+                listener.started(event)
+                listener.succeeded(event)
+        slow_query_log.flush()
+        entries = list(slow_query_log.collection.find())
+        self.assertEqual(2, len(entries))
+        self.assertEqual('abc123', entries[0]['request_id'])
+        groups = slow_query_log.summary()
+        self.assertEqual(1, len(groups))
+        self.assertEqual(2, groups[0]['count'])
+        self.assertEqual(300, groups[0]['p95_ms'])
+
+    def test_pending_commands_bounded(self):
+        """Test de comandos sin evento final y del propio registro"""
+        listener = SlowQueryListener(slow_query_log)
+        for request_id in range(slowquery.MAX_PENDING_COMMANDS + 10):
+            event = FakeCommandEvent({'find': 'users'}, 150)
+            event.request_id = request_id
+            listener.started(event)
+        self.assertEqual(slowquery.MAX_PENDING_COMMANDS,
+                         len(listener._commands))
+        event = FakeCommandEvent({'find': 'slow_queries'}, 150)
+        event.request_id = -1
+        listener.started(event)
+        self.assertNotIn((event.connection_id, -1), listener._commands)
+
+    def test_record_queue_full(self):
+        """Test de registros descartados con la cola llena"""
+        slow_query_log.queue_size = 1
+        slow_query_log._stop_writer()
+        with patch.object(slow_query_log, '_write_entries'):
+            for i in range(3):
+                slow_query_log.record('find', {'find': 'users'}, 250)
+        self.assertEqual(2, slow_query_log.dropped)
+        slow_query_log._stop_writer()
+
+    def test_slow_queries_view(self):
+        """Test de la vista de consultas lentas"""
+        user_data = {
+            'email': 'admin@biblat.unam.mx',
+            'password': 'F00barbaz$',
+        }
+        create_user(user_data['email'], user_data['password'], True)
+        slow_query_log.record('find', {'find': 'users',
+                                       'filter': {'email': 'x'}}, 250)
+        slow_query_log.flush()
+        with current_app.app_context():
+            with self.client as c:
+                c.post(url_for('main.login'), data=user_data,
+                       follow_redirects=True)
+                response = c.get(url_for('main.slow_queries'))
+                self.assertStatus(response, 200)
+                self.assert_template_used('main/slow_queries.html')
+                self.assertIn('{&#34;find&#34;: &#34;users&#34;',
+                              response.data.decode('utf-8'))
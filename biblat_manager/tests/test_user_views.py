@@ -15,6 +15,7 @@ url_pattern = re.compile('href="(.+?)">')
 
 
 class UserTestCase(BaseTestCase):
+    cache_app = True
 
     def test_login_view(self):
         """"Test de las vista de login"""
@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+import json
+
+from bson.binary import Binary
+from mock import patch
+from pymongo.errors import DuplicateKeyError
+
+from biblat_manager.tests.base import BaseTestCase
+from biblat_manager.webapp import userids, utils
+from biblat_manager.webapp.controllers import create_user
+from biblat_manager.webapp.models import (Checkpoint, LegacyId, User,
+                                          load_user)
+
+
+class UserIdsTestCase(BaseTestCase):
+
+    def insert_legacy(self, count):
+        """Usuarios con el id como string (formato anterior)"""
+        password = create_user('admin@biblat.unam.mx', 'F00barbaz$',
+                               True).password
+        ids = []
+        for i in range(count):
+            user_id = utils.generate_uuid_32_string()
+            User._get_collection().insert_one({
+                '_id': user_id, 'username': 'legacy%d' % i,
+                'email': 'legacy%d@biblat.unam.mx' % i,
+                'password': password, 'email_confirmed': False})
+            ids.append(user_id)
+        return ids
+
+    def test_binary_ids(self):
+        """Test de ids binarios con la forma hexadecimal en Python"""
+        user = create_user('user@biblat.unam.mx', 'F00barbaz$', False)
+        raw = User._get_collection().find_one()
+        self.assertIsInstance(raw['_id'], Binary)
+        self.assertEqual(4, raw['_id'].subtype)
+        self.assertEqual(32, len(user.id))
+        loaded = User.get_by_id(user.id)
+        self.assertEqual(user.id, loaded.id)
+        self.assertNotIsInstance(loaded.id, LegacyId)
+        self.assertEqual(json.dumps(user.id), json.dumps(loaded.pk))
+
+    def test_legacy_ids(self):
+        """Test de usuarios sin migrar"""
+        user_id = self.insert_legacy(1)[0]
+        user = User.get_by_id(user_id)
+        self.assertIsInstance(user.pk, LegacyId)
+        user.email_confirmed = True
+        user.save()
+        self.assertEqual(2, User.objects.count())
+        self.assertTrue(User._get_collection().find_one(
+            {'_id': user_id})['email_confirmed'])
+        self.assertEqual(user_id, load_user(user_id).id)
+
+    def test_migrate(self):
+        """Test de la migración por lotes reanudable"""
+        ids = self.insert_legacy(5)
+        stale = User.get_by_id(ids[0])
+        original = userids._replace
+        calls = []
+
+        def interrupted(collection, docs):
+            calls.append(len(docs))
+            if len(calls) == 2:
+                collection.delete_many(
+                    {'_id': {'$in': [doc['_id'] for doc in docs]}})
+                raise RuntimeError('interrumpido')
+            return original(collection, docs)
+
+        with patch.object(userids, '_replace', interrupted):
+            with self.assertRaises(RuntimeError):
+                userids.migrate_user_ids(batch_size=2)
+        self.assertEqual(4, User.objects.count())
+        # El lote interrumpido está respaldado en el Checkpoint
+        self.assertEqual(1, userids.migrate_user_ids(dry_run=True)['migrated'])
+        summary = userids.migrate_user_ids(batch_size=2)
+        self.assertEqual({'migrated': 5, 'skipped': 0, 'failed': 0}, summary)
+        self.assertEqual({'string': 0, 'binary': 6},
+                         userids.id_format_counts(User._get_collection()))
+        self.assertIsNone(Checkpoint.get_position(
+            userids.MIGRATION_CHECKPOINT))
+        self.assertEqual('legacy1@biblat.unam.mx',
+                         User.get_by_id(ids[1]).email)
+        # Un usuario cargado antes de la migración se sigue actualizando
+        stale.email_confirmed = True
+        stale.save()
+        self.assertEqual(6, User.objects.count())
+        self.assertTrue(User.get_by_id(ids[0]).email_confirmed)
+        report = userids.user_id_report(samples=3)
+        self.assertEqual(3, report['lookup']['count'])
+
+    def test_replace_keeps_concurrent_updates(self):
+        """Test de reemplazo con los cambios hechos después de leer el lote"""
+        ids = self.insert_legacy(2)
+        collection = User._get_collection()
+        docs = list(collection.find({'_id': {'$in': ids}}))
+        collection.update_one({'_id': ids[0]},
+                              {'$set': {'email_confirmed': True}})
+        self.assertEqual(0, userids._replace(collection, docs))
+        self.assertTrue(User.get_by_id(ids[0]).email_confirmed)
+        self.assertNotIsInstance(User.get_by_id(ids[0]).pk, LegacyId)
+
+    def test_replace_restores_on_conflict(self):
+        """Test de restauración del original si no se puede insertar"""
+        user_id = self.insert_legacy(1)[0]
+        collection = User._get_collection()
+        with patch.object(collection.__class__, 'insert_one',
+                          side_effect=[DuplicateKeyError('username'),
+                                       None]) as insert:
+            self.assertFalse(userids._replace_one(collection, user_id))
+        self.assertEqual(user_id, insert.call_args[0][0]['_id'])
@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+from flask import current_app, url_for
+
+from biblat_manager.tests.base import BaseTestCase
+from biblat_manager.webapp import collection_versions, controllers
+from biblat_manager.webapp.controllers import create_user
+
+
+class ConditionalGetTestCase(BaseTestCase):
+
+    def setUp(self):
+        super(ConditionalGetTestCase, self).setUp()
+        self.user = create_user('user@biblat.unam.mx', 'F00barbaz$', True)
+
+    def login(self, client):
+        client.post(url_for('main.login'), data={
+            'email': 'user@biblat.unam.mx', 'password': 'F00barbaz$'})
+        # Consume los mensajes flash del login
+        client.get(url_for('main.index'))
+
+    def test_versions(self):
+        """Test de las versiones por colección"""
+        version = collection_versions.get(['users'])['users'][0]
+        controllers.set_user_email_confirmed(self.user)
+        self.assertEqual(version + 1,
+                         collection_versions.get(['users'])['users'][0])
+        controllers.bulk_user_action('confirm', [self.user.id, 'missing'])
+        self.assertEqual(version + 1,
+                         collection_versions.get(['users'])['users'][0])
+        self.user.delete()
+        self.assertEqual(version + 2,
+                         collection_versions.get(['users'])['users'][0])
+        self.assertEqual((0, None), collection_versions.get(['x'])['x'])
+
+    def test_not_modified(self):
+        """Test de 304 Not Modified hasta que cambia la colección"""
+        with current_app.app_context():
+            with self.client as c:
+                self.login(c)
+                url = url_for('main.list_users')
+                response = c.get(url)
+                self.assertStatus(response, 200)
+                etag = response.headers['ETag']
+                self.assertIsNotNone(response.last_modified)
+                response = c.get(url, headers={'If-None-Match': etag})
+                self.assertStatus(response, 304)
+                self.assertEqual(b'', response.data)
+                # Otro listado, otro idioma u otro usuario: otro ETag
+                response = c.get(url_for('main.list_users', order_by='email'),
+                                 headers={'If-None-Match': etag})
+                self.assertStatus(response, 200)
+                c.get(url_for('main.set_locale', lang_code='en_US'))
+                c.get(url_for('main.index'))
+                response = c.get(url, headers={'If-None-Match': etag})
+                self.assertStatus(response, 200)
+                etag = response.headers['ETag']
+                # El menú abierto o cerrado forma parte del layout
+                c.get(url_for('main.set_menutoggle'))
+                response = c.get(url, headers={'If-None-Match': etag})
+                self.assertStatus(response, 200)
+                self.assertIn('<body class="open">',
+                              response.data.decode('utf-8'))
+                etag = response.headers['ETag']
+                create_user('other@biblat.unam.mx', 'F00barbaz$', False)
+                response = c.get(url, headers={'If-None-Match': etag})
+                self.assertStatus(response, 200)
+                self.assertIn('other@biblat.unam.mx',
+                              response.data.decode('utf-8'))
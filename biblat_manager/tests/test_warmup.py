@@ -0,0 +1,34 @@
+# -*- coding: utf-8 -*-
+import time
+
+from flask import current_app, url_for
+
+from biblat_manager.tests.base import BaseTestCase
+from biblat_manager.webapp import first_request_timer
+from biblat_manager.webapp.warmup import warm_up
+
+
+class WarmUpTestCase(BaseTestCase):
+
+    def test_warm_up(self):
+        """Test del warm-up de plantillas, catálogos y mongoDB"""
+        timings = warm_up(current_app, started=time.perf_counter())
+        self.assertEqual(['templates', 'translations', 'mongo', 'boot'],
+                         list(timings))
+        self.assertGreater(timings['templates'][1], 10)
+        self.assertEqual(len(current_app.config['LANGUAGES']),
+                         timings['translations'][1])
+        self.assertEqual(1, timings['mongo'][1])
+        domain = current_app.extensions['babel']._default_domain
+        self.assertIn('en_US', domain.cache)
+
+    def test_first_request_timer(self):
+        """Test de la latencia de la primera petición del worker"""
+        first_request_timer.pending = True
+        with current_app.app_context():
+            with self.client as c:
+                c.get(url_for('main.login'))
+                seconds = first_request_timer.seconds
+                self.assertIsNotNone(seconds)
+                c.get(url_for('main.login'))
+                self.assertEqual(seconds, first_request_timer.seconds)
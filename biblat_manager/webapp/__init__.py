@@ -1,20 +1,51 @@
 # -*- coding: utf-8 -*-
-from flask import Flask
+import os
+import stat
+
+from flask import Flask, g
 from flask.json import JSONEncoder
 from flask_babelex import Babel
 from flask_babelex import lazy_gettext as __
-from flask_breadcrumbs import Breadcrumbs
+from flask_breadcrumbs import Breadcrumbs, current_breadcrumbs
 from flask_login import LoginManager
 from flask_mongoengine import MongoEngine
 from flask_mail import Mail
+from jinja2 import FileSystemBytecodeCache
+from werkzeug.local import LocalProxy
+from werkzeug.middleware.proxy_fix import ProxyFix
 
 from biblat_manager.config import settings
+from biblat_manager.webapp.assets import Assets
+from biblat_manager.webapp.cache import TTLCache
+from biblat_manager.webapp.fragments import (FragmentCache,
+                                             FragmentCacheExtension)
+from biblat_manager.webapp.instrumentation import Instrumentation, timed
+from biblat_manager.webapp.metrics import Metrics
+from biblat_manager.webapp.pagination import CountCache
+from biblat_manager.webapp.passwordfilter import PasswordFilter
+from biblat_manager.webapp.passwords import PasswordHasher
+from biblat_manager.webapp.ratelimit import RateLimiter
+from biblat_manager.webapp.slowquery import SlowQueryLog
+from biblat_manager.webapp.versions import CollectionVersions
+from biblat_manager.webapp.warmup import FirstRequestTimer
 
 babel = Babel()
 breadcrumbs = Breadcrumbs()
 login_manager = LoginManager()
 dbmongo = MongoEngine()
 mail = Mail()
+hasher = PasswordHasher()
+password_filter = PasswordFilter()
+limiter = RateLimiter()
+user_cache = TTLCache()
+count_cache = CountCache()
+instrumentation = Instrumentation()
+metrics = Metrics()
+slow_query_log = SlowQueryLog()
+fragment_cache = FragmentCache()
+static_assets = Assets()
+first_request_timer = FirstRequestTimer()
+collection_versions = CollectionVersions()
 
 
 class CustomJSONEncoder(JSONEncoder):
@@ -34,6 +65,44 @@ def is_bool(value):
     return isinstance(value, bool)
 
 
+def _request_breadcrumbs():
+    """
+    Construye los breadcrumbs una sola vez por petición, el proxy de
+    Flask-Breadcrumbs los vuelve a construir cada vez que se accede a él.
+    """
+    if '_breadcrumbs' not in g:
+        with timed('breadcrumbs'):
+            g._breadcrumbs = list(current_breadcrumbs)
+    return g._breadcrumbs
+
+
+def breadcrumbs_context_processor():
+    return dict(breadcrumbs=LocalProxy(_request_breadcrumbs))
+
+
+def bytecode_cache(app, path):
+    """
+    Caché en disco del bytecode de las plantillas. Sin ``path`` se usa el
+    directorio por usuario (0700) de Jinja; un directorio configurado se
+    crea con modo 0700 y se descarta si pertenece a otro usuario o si otros
+    pueden escribir en él, porque Jinja carga el bytecode sin verificarlo.
+    Una cadena vacía desactiva la caché.
+    """
+    if path is None:
+        return FileSystemBytecodeCache()
+    if not path:
+        return None
+    # exist_ok: varios workers de gunicorn inician al mismo tiempo
+    os.makedirs(path, mode=0o700, exist_ok=True)
+    info = os.lstat(path)
+    if not stat.S_ISDIR(info.st_mode) or info.st_uid != os.getuid() or \
+            info.st_mode & 0o022:
+        app.logger.warning('Directorio de bytecode inseguro, se desactiva '
+                           'la caché: %s', path)
+        return None
+    return FileSystemBytecodeCache(path)
+
+
 def create_app(config_name):
     app = Flask(__name__)
 
@@ -52,11 +121,38 @@ def create_app(config_name):
     app.config.from_object(settings.config[config_name])
     settings.config[config_name].init_app(app)
 
+    # IP, esquema y host del cliente a partir de los encabezados
+    # X-Forwarded-* de los proxies de confianza (p. ej. para el límite de
+    # intentos por IP)
+    proxies = app.config.get('PROXY_FIX', 0)
+    if proxies:
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=proxies,
+                                x_proto=proxies, x_host=proxies)
+
+    # Plantillas: bytecode en disco para que los workers nuevos no compilen
+    # y caché de fragmentos ({% cache %}) para los parciales del layout
+    app.jinja_env.bytecode_cache = bytecode_cache(
+        app, app.config.get('JINJA_BYTECODE_CACHE_DIR'))
+    app.jinja_env.add_extension(FragmentCacheExtension)
+    fragment_cache.configure(app.config.get('FRAGMENT_CACHE_SIZE', 256),
+                             app.config.get('FRAGMENT_CACHE_TTL', 300))
+    app.jinja_env.fragment_cache = fragment_cache
+    # Archivos estáticos con hash de flask build-assets
+    static_assets.init_app(app)
+
     # i18n
     babel.init_app(app)
 
     # Breadcrumbs
     breadcrumbs.init_app(app)
+    app.context_processor(breadcrumbs_context_processor)
+
+    # Server-Timing y cProfile (opcional)
+    instrumentation.init_app(app)
+
+    # Métricas de Prometheus
+    metrics.init_app(app)
+    first_request_timer.init_app(app)
 
     from .main import main as main_blueprint
     # Login
@@ -65,13 +161,27 @@ def create_app(config_name):
     login_manager.login_message_category = 'info'
     login_manager.login_message = __(u'Por favor inicie sesión para acceder a esta página.')
     login_manager.init_app(app)
+    user_cache.configure(app.config.get('USER_CACHE_SIZE', 1024),
+                         app.config.get('USER_CACHE_TTL', 2))
 
-    # mongoDB
+    # mongoDB (el registro de consultas lentas se instala antes de conectar)
+    slow_query_log.init_app(app)
     dbmongo.init_app(app)
+    count_cache.ttl = app.config.get('COUNT_CACHE_TTL', 60)
+    count_cache.clear()
+    # Versiones por colección para ETag y 304 Not Modified
+    collection_versions.init_app(app)
 
     # Mail
     mail.init_app(app)
 
+    # Hash de contraseñas y filtro de contraseñas comunes
+    hasher.init_app(app)
+    password_filter.init_app(app)
+
+    # Límite de intentos de login
+    limiter.init_app(app)
+
     app.register_blueprint(main_blueprint)
 
     return app
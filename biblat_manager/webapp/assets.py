@@ -0,0 +1,218 @@
+# -*- coding: utf-8 -*-
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import posixpath
+import re
+
+from flask import current_app, request, send_from_directory, url_for
+
+# Paquetes de archivos, en el orden en que se cargan en base_layout.html
+BUNDLES = {
+    'main.css': [
+        'assets/css/normalize.css',
+        'assets/css/bootstrap.min.css',
+        'assets/css/font-awesome.min.css',
+        'assets/css/themify-icons.css',
+        'assets/css/flag-icon.min.css',
+        'assets/css/cs-skin-elastic.css',
+        'assets/scss/style.css',
+        'assets/css/lib/vector-map/jqvmap.min.css',
+        'assets/css/font_open_sans.css',
+    ],
+    'main.js': [
+        'assets/js/vendor/jquery-2.1.4.min.js',
+        'assets/js/popper.min.js',
+        'assets/js/plugins.js',
+        'assets/js/main.js',
+    ],
+}
+# Archivos sueltos que también se publican con hash
+FILES = [
+    'assets/js/html5shiv.min.js',
+    'images/favicon.ico',
+    'images/biblat-single.svg',
+    'images/biblat-logo.svg',
+]
+OUTPUT_DIR = 'dist'
+MANIFEST = 'manifest.json'
+# Extensiones que vale la pena comprimir
+COMPRESSIBLE = ('.css', '.js', '.svg', '.json')
+
+CSS_URL = re.compile(r'url\(\s*([\'"]?)([^\'")]+)\1\s*\)')
+CSS_IMPORT = re.compile(
+    r'@import\s+(?:url\()?\s*[\'"]?([^\'")\s;]+)[\'"]?\s*\)?\s*;')
+CSS_CHARSET = re.compile(r'@charset\s+[\'"][^\'"]*[\'"]\s*;')
+
+
+def _is_local(url):
+    return not re.match(r'^([a-z]+:|/|#)', url, re.IGNORECASE)
+
+
+def rewrite_css_urls(css, source, output):
+    """
+    Ajusta las rutas relativas de ``url()`` de ``source`` para que sigan
+    apuntando al mismo archivo desde ``output`` (ambas rutas relativas a
+    la carpeta static).
+    """
+    source_dir = posixpath.dirname(source)
+    output_dir = posixpath.dirname(output)
+
+    def replace(match):
+        quote, url = match.groups()
+        if not _is_local(url):
+            return match.group(0)
+        target = posixpath.normpath(posixpath.join(source_dir, url))
+        return 'url(%s%s%s)' % (
+            quote, posixpath.relpath(target, output_dir), quote)
+    return CSS_URL.sub(replace, css)
+
+
+def read_css(static_folder, path, output, seen=None):
+    """Lee ``path`` incluyendo sus ``@import`` locales"""
+    seen = set() if seen is None else seen
+    if path in seen:
+        return ''
+    seen.add(path)
+    with open(os.path.join(static_folder, path), encoding='utf-8') as f:
+        css = CSS_CHARSET.sub('', f.read())
+
+    imports = []
+
+    def inline(match):
+        url = match.group(1)
+        if not _is_local(url):
+            return match.group(0)
+        imported = posixpath.normpath(
+            posixpath.join(posixpath.dirname(path), url))
+        imports.append(read_css(static_folder, imported, output, seen))
+        return '/*@import %d*/' % (len(imports) - 1)
+    # Los archivos importados ya vienen con sus rutas ajustadas
+    css = rewrite_css_urls(CSS_IMPORT.sub(inline, css), path, output)
+    return re.sub(r'/\*@import (\d+)\*/',
+                  lambda match: imports[int(match.group(1))], css)
+
+
+def _write(static_folder, name, content):
+    """
+    Escribe ``content`` con el hash del contenido en el nombre, y una copia
+    ``.gz``. Regresa la ruta relativa a la carpeta static.
+    """
+    base, ext = posixpath.splitext(posixpath.basename(name))
+    digest = hashlib.sha256(content).hexdigest()[:12]
+    hashed = posixpath.join(OUTPUT_DIR, '%s.%s%s' % (base, digest, ext))
+    path = os.path.join(static_folder, hashed)
+    with open(path, 'wb') as f:
+        f.write(content)
+    if ext in COMPRESSIBLE:
+        # mtime=0 para que el .gz sea el mismo en cada build
+        with open(path + '.gz', 'wb') as raw:
+            with gzip.GzipFile(fileobj=raw, mode='wb', compresslevel=9,
+                               mtime=0) as f:
+                f.write(content)
+    return hashed
+
+
+def build_assets(static_folder, bundles=None, files=None):
+    """
+    Genera en ``static/dist`` los paquetes CSS/JS y los archivos sueltos con
+    hash en el nombre, sus versiones ``.gz`` y ``manifest.json``. Regresa
+    el manifiesto (nombre lógico -> ruta con hash).
+    """
+    bundles = BUNDLES if bundles is None else bundles
+    files = FILES if files is None else files
+    output_dir = os.path.join(static_folder, OUTPUT_DIR)
+    if not os.path.isdir(output_dir):
+        os.makedirs(output_dir)
+    manifest = {}
+    for name, sources in sorted(bundles.items()):
+        output = posixpath.join(OUTPUT_DIR, name)
+        if name.endswith('.css'):
+            parts = [read_css(static_folder, source, output)
+                     for source in sources]
+            content = '\n'.join(parts)
+        else:
+            parts = []
+            for source in sources:
+                with open(os.path.join(static_folder, source),
+                          encoding='utf-8') as f:
+                    parts.append(f.read().rstrip().rstrip(';'))
+            content = ';\n'.join(parts) + ';\n'
+        manifest[name] = _write(static_folder, name, content.encode('utf-8'))
+    for name in files:
+        with open(os.path.join(static_folder, name), 'rb') as f:
+            manifest[name] = _write(static_folder, name, f.read())
+    with open(os.path.join(output_dir, MANIFEST), 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    return manifest
+
+
+class Assets(object):
+    """
+    Archivos estáticos generados por ``flask build-assets``.
+
+    - ``static_url(name)``: URL del archivo con hash si está en el
+      manifiesto, si no la URL normal de ``static``.
+    - ``bundle_urls(name)``: URL del paquete o, si no se ha generado, de
+      cada uno de sus archivos.
+    - ``version``: hash del manifiesto (vacío sin ``flask build-assets``).
+
+    Los archivos de ``static/dist`` se sirven con ``Cache-Control``
+    immutable y, si el cliente acepta gzip, desde la copia ``.gz``.
+    """
+
+    def __init__(self):
+        self.manifest = {}
+        self.version = ''
+
+    def init_app(self, app):
+        self.max_age = app.config.get('ASSETS_MAX_AGE', 31536000)
+        self.load_manifest(app.static_folder)
+        app.add_url_rule('/static/%s/<path:filename>' % OUTPUT_DIR,
+                         'assets', self.send_asset)
+        app.jinja_env.globals.update(static_url=self.static_url,
+                                     bundle_urls=self.bundle_urls)
+        app.extensions['assets'] = self
+
+    def load_manifest(self, static_folder):
+        path = os.path.join(static_folder, OUTPUT_DIR, MANIFEST)
+        self.manifest = {}
+        if os.path.exists(path):
+            with open(path) as f:
+                self.manifest = json.load(f)
+        # Cambia con cada ``flask build-assets`` que modifica algún archivo
+        self.version = hashlib.sha1(json.dumps(
+            self.manifest, sort_keys=True).encode('utf-8')).hexdigest()[:12] \
+            if self.manifest else ''
+
+    def static_url(self, name):
+        hashed = self.manifest.get(name)
+        if hashed is None:
+            return url_for('static', filename=name)
+        return url_for('assets', filename=hashed[len(OUTPUT_DIR) + 1:])
+
+    def bundle_urls(self, name):
+        if name in self.manifest:
+            return [self.static_url(name)]
+        return [self.static_url(source) for source in BUNDLES[name]]
+
+    def send_asset(self, filename):
+        directory = os.path.join(current_app.static_folder, OUTPUT_DIR)
+        gzipped = filename + '.gz'
+        use_gzip = 'gzip' in request.headers.get('Accept-Encoding', '') and \
+            os.path.exists(os.path.join(directory, gzipped))
+        if use_gzip:
+            mimetype = mimetypes.guess_type(filename)[0] or \
+                'application/octet-stream'
+            response = send_from_directory(directory, gzipped,
+                                           mimetype=mimetype)
+            response.headers['Content-Encoding'] = 'gzip'
+        else:
+            response = send_from_directory(directory, filename)
+        response.headers['Vary'] = 'Accept-Encoding'
+        response.headers['Cache-Control'] = \
+            'public, max-age=%d, immutable' % self.max_age
+        response.expires = None
+        return response
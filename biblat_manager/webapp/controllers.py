@@ -1,6 +1,16 @@
 # -*- coding: utf-8 -*-
+import time
+from collections import OrderedDict
+
+from flask import current_app
 from flask_babelex import lazy_gettext as __
-from .models import User
+from . import collection_versions, count_cache, mail, notifications, utils
+from .instrumentation import timed
+from .metrics import count_mail
+from .models import Checkpoint, OutboxEmail, User, invalidate_user_ids
+
+RESEND_CONFIRMATIONS_CHECKPOINT = 'resend-confirmations'
+BULK_USER_ACTIONS = ('delete', 'confirm', 'resend', 'reset_password')
 
 
 # -------- USER --------
@@ -46,3 +56,171 @@ def create_user(user_email, user_password, user_email_confirmed):
     new_user = User(**user_data).save()
 
     return new_user
+
+
+def _send_user_messages(messages, queue=False, throttle=None):
+    """
+    Envía (o registra en el outbox con un solo ``insert_many``) los mensajes
+    ``(user_id, Message)``. ``throttle`` se llama antes de cada envío por
+    SMTP (p. ej. para limitar los correos por segundo).
+    Regresa ``{user_id: 'sent' | 'failed'}``.
+    """
+    results = {}
+    if not messages:
+        return results
+    if queue:
+        OutboxEmail.objects.insert([
+            OutboxEmail(recipients=msg.recipients, subject=msg.subject,
+                        html=msg.html) for _, msg in messages],
+            load_bulk=False)
+        count_mail('queued', len(messages))
+        return dict((user_id, 'sent') for user_id, _ in messages)
+    with mail.connect() as connection:
+        for user_id, msg in messages:
+            if throttle:
+                throttle()
+            try:
+                with timed('smtp'):
+                    connection.send(msg)
+                results[user_id] = 'sent'
+            except Exception as e:
+                count_mail('failed')
+                current_app.logger.error('Error al enviar correo a %s: %s',
+                                         msg.recipients[0], e)
+                results[user_id] = 'failed'
+    return results
+
+
+def bulk_user_action(action, user_ids, queue=False):
+    """
+    Aplica ``action`` a los usuarios ``user_ids`` con una sola consulta de
+    lectura y, según la acción, una sola escritura:
+    ``delete`` (``delete_many``), ``confirm`` (``update_many`` con
+    ``$set``), ``resend`` (correo de confirmación a los no confirmados) y
+    ``reset_password`` (correo para recuperar la contraseña). Con ``queue``
+    los correos se registran en el outbox.
+    Regresa un diccionario ordenado ``{user_id: resultado}``, donde el
+    resultado es ``deleted``, ``confirmed``, ``sent``, ``failed``,
+    ``unchanged`` (no había nada que hacer) o ``not_found``.
+    """
+    if action not in BULK_USER_ACTIONS:
+        raise ValueError('Acción inválida: %s' % action)
+    results = OrderedDict((str(user_id), 'not_found')
+                          for user_id in user_ids)
+    collection = User._get_collection()
+    id_field = User._fields['_id']
+    found = dict(
+        (id_field.to_python(doc['_id']), doc) for doc in collection.find(
+            User.ids_query(results), {'email': 1, 'email_confirmed': 1}))
+    if not found:
+        return results
+
+    def raw_ids(user_ids):
+        return {'_id': {'$in': [found[user_id]['_id']
+                                for user_id in user_ids]}}
+
+    if action == 'delete':
+        collection.delete_many(raw_ids(found))
+        invalidate_user_ids(found)
+        collection_versions.bump(User._get_collection_name())
+        count_cache.clear()
+        results.update((user_id, 'deleted') for user_id in found)
+    elif action == 'confirm':
+        pending = [user_id for user_id, doc in found.items()
+                   if not doc.get('email_confirmed')]
+        results.update((user_id, 'unchanged') for user_id in found)
+        if pending:
+            collection.update_many(raw_ids(pending),
+                                   {'$set': {'email_confirmed': True}})
+            invalidate_user_ids(pending)
+            collection_versions.bump(User._get_collection_name())
+            results.update((user_id, 'confirmed') for user_id in pending)
+    else:
+        ts = utils.get_timed_serializer()
+        if action == 'resend':
+            build = notifications.build_confirmation_message
+        else:
+            build = notifications.build_reset_password_message
+        messages = []
+        for user_id, doc in found.items():
+            email = doc.get('email')
+            if action == 'resend' and doc.get('email_confirmed'):
+                results[user_id] = 'unchanged'
+            elif email and utils.check_valid_email(email):
+                messages.append((user_id, build(email, ts)))
+            else:
+                results[user_id] = 'failed'
+        results.update(_send_user_messages(messages, queue))
+    return results
+
+
+def resend_confirmation_emails(user_ids=None, batch_size=100, rate=None,
+                               checkpoint=None, resume=False, queue=False,
+                               progress=None):
+    """
+    Reenvía el correo de confirmación a los usuarios con
+    ``email_confirmed=False`` (o sólo a ``user_ids``).
+    Parámetros:
+    ``batch_size`` usuarios por lote: un lote se lee con un cursor y se envía
+    sobre una conexión SMTP (``mail.connect()``),
+    ``rate`` máximo de correos por segundo, enviados o fallidos (None: sin
+    límite),
+    ``checkpoint`` nombre del ``Checkpoint`` que se guarda al terminar cada
+    lote (p. ej. ``RESEND_CONFIRMATIONS_CHECKPOINT`` en la terminal),
+    ``resume`` continuar después del último usuario del ``checkpoint``, con
+    los totales acumulados,
+    ``queue`` registrar los correos en el outbox en vez de enviarlos,
+    ``progress`` función que recibe el número de correos procesados.
+    Regresa un diccionario con los totales ``sent`` y ``failed``.
+    """
+    queryset = User.objects(email_confirmed=False)
+    if user_ids is not None:
+        queryset = queryset.filter(__raw__=User.ids_query(user_ids))
+    summary = {'sent': 0, 'failed': 0}
+    if checkpoint and resume:
+        saved = Checkpoint.objects(name=checkpoint).first()
+        if saved is not None:
+            summary.update(saved.data or {})
+            queryset = queryset.filter(_id__gt=saved.position)
+    users = queryset.order_by('_id').only('email').no_cache() \
+        .batch_size(batch_size)
+
+    ts = utils.get_timed_serializer()
+    started = time.time()
+    attempts = [0]
+
+    def throttle():
+        # Espera para no superar ``rate`` intentos de envío por segundo
+        wait = started + attempts[0] / float(rate) - time.time()
+        if wait > 0:
+            time.sleep(wait)
+        attempts[0] += 1
+
+    def flush(batch):
+        messages = []
+        for user in batch:
+            if utils.check_valid_email(user.email):
+                messages.append((user.pk, notifications
+                                 .build_confirmation_message(user.email, ts)))
+            else:
+                summary['failed'] += 1
+        results = _send_user_messages(messages, queue=queue,
+                                      throttle=throttle if rate else None)
+        for status in results.values():
+            summary[status] += 1
+        if checkpoint:
+            Checkpoint.save_position(checkpoint, batch[-1].pk, **summary)
+        if progress:
+            progress(len(batch))
+
+    batch = []
+    for user in users:
+        batch.append(user)
+        if len(batch) >= batch_size:
+            flush(batch)
+            batch = []
+    if batch:
+        flush(batch)
+    if checkpoint:
+        Checkpoint.clear(checkpoint)
+    return summary
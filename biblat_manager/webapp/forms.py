@@ -6,9 +6,12 @@ from wtforms import (
     StringField,
     PasswordField,
     BooleanField,
+    SelectField,
     validators,
     ValidationError)
 
+from . import password_filter
+
 
 def check_secure_password(form, field):
     strength = safe.check(field.data)
@@ -24,6 +27,9 @@ def check_secure_password(form, field):
     }
     if not strength.valid:
         raise ValidationError(messages[strength.message])
+    # Contraseñas filtradas (PASSWORD_FILTER_PATH)
+    if field.data in password_filter:
+        raise ValidationError(messages['password is too common'])
 
 
 class RegistrationForm(FlaskForm):
@@ -74,3 +80,24 @@ class PasswordForm(FlaskForm):
         check_secure_password
     ])
     confirm = PasswordField(__('Confirmar contraseña'))
+
+
+class UserActionForm(FlaskForm):
+    """
+    Formulario para las acciones sobre usuarios del listado, los ids se
+    reciben en el campo ``user_id`` (uno o varios)
+    """
+    pass
+
+
+class BulkUserActionForm(UserActionForm):
+    """
+    Acción sobre los usuarios seleccionados en el listado (ver
+    ``controllers.bulk_user_action``)
+    """
+    action = SelectField(__('Acción'), choices=[
+        ('confirm', __('Marcar correo como verificado')),
+        ('resend', __('Reenviar confirmación')),
+        ('reset_password', __('Enviar recuperación de contraseña')),
+        ('delete', __('Eliminar')),
+    ], validators=[validators.DataRequired()])
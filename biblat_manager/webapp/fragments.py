@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+import threading
+
+from flask import current_app
+from flask_babelex import get_locale
+from flask_login import current_user
+from jinja2 import nodes
+from jinja2.ext import Extension
+
+from .cache import TTLCache
+
+
+def current_role():
+    """Rol del usuario de la petición para separar los fragmentos"""
+    if current_user and current_user.is_authenticated:
+        return 'user'
+    return 'anonymous'
+
+
+class FragmentCache(object):
+    """
+    Caché de fragmentos de plantillas por nombre, idioma y rol del usuario,
+    y por versión de la aplicación (WEBAPP_VERSION) y de los archivos
+    estáticos (hash del manifiesto de ``flask build-assets``), para no
+    servir después de un despliegue HTML con las URL anteriores.
+    ``invalidate(name)`` incrementa la versión del fragmento, con lo que las
+    entradas anteriores dejan de usarse y salen de la caché por LRU/TTL.
+    """
+
+    def __init__(self, maxsize=256, ttl=300):
+        self._cache = TTLCache(maxsize, ttl)
+        self._versions = {}
+        self._lock = threading.Lock()
+
+    def configure(self, maxsize, ttl):
+        self._cache.configure(maxsize, ttl)
+
+    @staticmethod
+    def release():
+        assets = current_app.extensions.get('assets')
+        return (current_app.config.get('WEBAPP_VERSION', ''),
+                assets.version if assets is not None else '')
+
+    def key(self, name):
+        return (name, self._versions.get(name, 0), self.release(),
+                str(get_locale()), current_role())
+
+    def get_or_render(self, name, render):
+        key = self.key(name)
+        fragment = self._cache.get(key)
+        if fragment is None:
+            fragment = render()
+            self._cache.set(key, fragment)
+        return fragment
+
+    def invalidate(self, name=None):
+        """Invalida el fragmento ``name`` o, sin nombre, todos"""
+        if name is None:
+            self._cache.clear()
+            return
+        with self._lock:
+            self._versions[name] = self._versions.get(name, 0) + 1
+
+
+class FragmentCacheExtension(Extension):
+    """
+    Etiqueta ``{% cache 'nombre' %}...{% endcache %}`` para guardar un
+    fragmento en ``environment.fragment_cache``. El contenido no debe
+    depender de la petición más allá del idioma y el rol del usuario.
+    """
+    tags = {'cache'}
+
+    def parse(self, parser):
+        lineno = next(parser.stream).lineno
+        args = [parser.parse_expression()]
+        body = parser.parse_statements(['name:endcache'], drop_needle=True)
+        return nodes.CallBlock(self.call_method('_render', args), [], [],
+                               body).set_lineno(lineno)
+
+    def _render(self, name, caller):
+        cache = getattr(self.environment, 'fragment_cache', None)
+        if cache is None:
+            return caller()
+        return cache.get_or_render(name, caller)
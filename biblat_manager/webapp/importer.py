@@ -0,0 +1,271 @@
+# -*- coding: utf-8 -*-
+import csv
+import hashlib
+import io
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from mongoengine.errors import ValidationError
+from pymongo.errors import BulkWriteError
+
+from . import collection_versions, utils
+from .models import Checkpoint, User
+from .passwords import pwd_context
+
+FORMATS = ('csv', 'jsonl')
+TRUE_VALUES = ('1', 'true', 'yes', 'y', 'si', 'sí')
+# Campos que deben ser texto (en JSONL pueden venir números, listas...)
+TEXT_FIELDS = ('email', 'username', 'password')
+
+
+# Contextos de passlib por número de rondas, uno por proceso del pool
+_contexts = {}
+
+
+def _context(rounds):
+    if not rounds:
+        return pwd_context
+    if rounds not in _contexts:
+        _contexts[rounds] = pwd_context.using(
+            bcrypt_sha256__default_rounds=rounds,
+            bcrypt_sha256__min_rounds=rounds,
+            bcrypt_sha256__max_rounds=rounds)
+    return _contexts[rounds]
+
+
+def hash_password(plaintext, rounds=None):
+    """Hash de ``plaintext`` (función de módulo para el pool de procesos)"""
+    return _context(rounds).hash(plaintext)
+
+
+def detect_format(path):
+    extension = os.path.splitext(path)[1].lower().lstrip('.')
+    return 'jsonl' if extension in ('jsonl', 'ndjson', 'json') else 'csv'
+
+
+def read_rows(path, fmt=None):
+    """
+    Lee ``path`` (CSV con encabezados o JSON por línea) sin cargarlo
+    completo en memoria. Genera tuplas ``(línea, datos, error)``.
+    """
+    fmt = fmt or detect_format(path)
+    with io.open(path, encoding='utf-8', newline='') as f:
+        if fmt == 'csv':
+            reader = csv.DictReader(f)
+            for row in reader:
+                yield reader.line_num, row, None
+        else:
+            for line_num, line in enumerate(f, 1):
+                if not line.strip():
+                    continue
+                try:
+                    row = json.loads(line)
+                except ValueError as e:
+                    yield line_num, {}, 'JSON inválido: %s' % e
+                    continue
+                if not isinstance(row, dict):
+                    yield line_num, {}, 'Se esperaba un objeto JSON'
+                    continue
+                yield line_num, row, None
+
+
+def checkpoint_name(path):
+    digest = hashlib.sha1(os.path.abspath(path).encode('utf-8')).hexdigest()
+    return 'import-users:%s' % digest[:16]
+
+
+def _parse_bool(value, default):
+    if value is None or value == '':
+        return default
+    if isinstance(value, bool):
+        return value
+    return str(value).strip().lower() in TRUE_VALUES
+
+
+def _text(value):
+    """``value`` sin espacios si es un string, si no ``''``"""
+    return value.strip() if isinstance(value, str) else ''
+
+
+def _invalid_fields(row):
+    """Campos de ``TEXT_FIELDS`` con un valor que no es string"""
+    return [key for key in TEXT_FIELDS
+            if row.get(key) is not None and not isinstance(row[key], str)]
+
+
+class UserImporter(object):
+    """
+    Importa usuarios por lotes de ``chunk_size`` filas:
+
+    1. valida los correos del lote (``utils.validate_emails``) y descarta
+       duplicados del archivo,
+    2. descarta los correos y nombres de usuario ya registrados con una
+       sola consulta ``$in`` por lote,
+    3. calcula los hashes de las contraseñas en un pool de procesos,
+    4. escribe el lote con ``insert_many`` (``ordered=False``).
+
+    Las filas rechazadas se escriben en ``report`` (CSV: línea, correo,
+    error). Al terminar cada lote se guarda un ``Checkpoint`` con la última
+    línea procesada, con ``resume`` se continúa desde ahí.
+    """
+
+    def __init__(self, path, fmt=None, chunk_size=500, workers=None,
+                 resume=False, report=None, email_confirmed=False,
+                 rounds=None, progress=None):
+        self.path = path
+        self.fmt = fmt or detect_format(path)
+        self.chunk_size = chunk_size
+        self.workers = workers or os.cpu_count() or 1
+        self.resume = resume
+        self.report_path = report or '%s.errors.csv' % path
+        self.email_confirmed = email_confirmed
+        self.rounds = rounds
+        self.progress = progress
+        self.checkpoint = checkpoint_name(path)
+        self.summary = {'imported': 0, 'skipped': 0, 'failed': 0}
+        self._seen_emails = set()
+        self._report = None
+        self._report_writer = None
+
+    def error(self, line_num, email, message, skipped=False):
+        self.summary['skipped' if skipped else 'failed'] += 1
+        self._report_writer.writerow([line_num, email or '', message])
+
+    def run(self):
+        """Importa el archivo y regresa el resumen de la importación"""
+        start_line = 0
+        if self.resume:
+            checkpoint = Checkpoint.objects(name=self.checkpoint).first()
+            if checkpoint is not None:
+                start_line = checkpoint.position or 0
+                self.summary.update(checkpoint.data or {})
+        mode = 'a' if start_line else 'w'
+        with io.open(self.report_path, mode, encoding='utf-8',
+                     newline='') as report, \
+                ProcessPoolExecutor(self.workers) as pool:
+            self._report_writer = csv.writer(report)
+            if mode == 'w':
+                self._report_writer.writerow(['line', 'email', 'error'])
+            chunk = []
+            for line_num, row, error in read_rows(self.path, self.fmt):
+                if line_num <= start_line:
+                    continue
+                chunk.append((line_num, row, error))
+                if len(chunk) >= self.chunk_size:
+                    self.import_chunk(chunk, pool)
+                    chunk = []
+            if chunk:
+                self.import_chunk(chunk, pool)
+        Checkpoint.clear(self.checkpoint)
+        self.summary['report'] = self.report_path
+        return self.summary
+
+    def _validate(self, chunk):
+        """Regresa las filas válidas como ``(línea, documento, contraseña)``"""
+        valid = []
+        emails = [_text(row.get('email')) for _, row, _ in chunk]
+        valid_emails = utils.validate_emails(emails)
+        for (line_num, row, error), email, valid_email in zip(
+                chunk, emails, valid_emails):
+            password = row.get('password') or ''
+            invalid_fields = _invalid_fields(row)
+            if error:
+                self.error(line_num, email, error)
+            elif invalid_fields:
+                self.error(line_num, email or str(row.get('email')),
+                           'Tipo de dato inválido (se esperaba texto): %s' %
+                           ', '.join(invalid_fields))
+            elif not valid_email:
+                self.error(line_num, email, 'Correo electrónico inválido')
+            elif not password:
+                self.error(line_num, email, 'Contraseña vacía')
+            elif email in self._seen_emails:
+                self.error(line_num, email, 'Correo electrónico duplicado '
+                                            'en el archivo', skipped=True)
+            else:
+                self._seen_emails.add(email)
+                user = User(
+                    username=_text(row.get('username')) or
+                    email.split('@')[0],
+                    email=email,
+                    email_confirmed=_parse_bool(row.get('email_confirmed'),
+                                                self.email_confirmed))
+                valid.append((line_num, user, password))
+        return valid
+
+    def _skip_existing(self, rows):
+        """Descarta los correos y nombres de usuario ya registrados"""
+        emails = [user.email for _, user, _ in rows]
+        usernames = [user.username for _, user, _ in rows]
+        collection = User._get_collection()
+        existing = collection.find(
+            {'$or': [{'email': {'$in': emails}},
+                     {'username': {'$in': usernames}}]},
+            {'email': 1, 'username': 1})
+        taken_emails, taken_usernames = set(), set()
+        for doc in existing:
+            taken_emails.add(doc.get('email'))
+            taken_usernames.add(doc.get('username'))
+        remaining = []
+        for line_num, user, password in rows:
+            if user.email in taken_emails:
+                self.error(line_num, user.email,
+                           'Correo electrónico ya registrado', skipped=True)
+            elif user.username in taken_usernames:
+                self.error(line_num, user.email,
+                           'Nombre de usuario ya registrado: %s' %
+                           user.username)
+            else:
+                taken_usernames.add(user.username)
+                remaining.append((line_num, user, password))
+        return remaining
+
+    def import_chunk(self, chunk, pool):
+        rows = self._validate(chunk)
+        if rows:
+            rows = self._skip_existing(rows)
+        if rows:
+            hashes = pool.map(hash_password, [row[2] for row in rows],
+                              [self.rounds] * len(rows),
+                              chunksize=max(1, len(rows) // self.workers))
+            documents = []
+            for (line_num, user, _), hashed in zip(rows, hashes):
+                user._password = hashed
+                try:
+                    user.validate()
+                except ValidationError as e:
+                    self.error(line_num, user.email, str(e))
+                    continue
+                documents.append((line_num, user))
+            self._insert(documents)
+        last_line = chunk[-1][0]
+        Checkpoint.save_position(self.checkpoint, last_line,
+                                 **self.summary)
+        if self.progress:
+            self.progress(len(chunk))
+
+    def _insert(self, documents):
+        if not documents:
+            return
+        try:
+            User._get_collection().insert_many(
+                [user.to_mongo() for _, user in documents], ordered=False)
+            self.summary['imported'] += len(documents)
+        except BulkWriteError as e:
+            errors = e.details.get('writeErrors', [])
+            self.summary['imported'] += len(documents) - len(errors)
+            for write_error in errors:
+                line_num, user = documents[write_error['index']]
+                self.error(line_num, user.email, write_error['errmsg'])
+        finally:
+            collection_versions.bump(User._get_collection_name())
+
+
+def import_users(path, **kwargs):
+    """
+    Importa usuarios desde ``path`` (ver ``UserImporter``). Regresa un
+    diccionario con ``imported``, ``skipped`` (ya registrados o repetidos),
+    ``failed`` y la ruta del reporte de errores (``report``).
+    """
+    return UserImporter(path, **kwargs).run()
@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+from .models import OutboxEmail, User
+
+# Documentos cuyos índices se declaran en ``meta['indexes']``
+DOCUMENTS = [User, OutboxEmail]
+
+# Formas de consulta usadas por las vistas, ``index-audit`` ejecuta
+# ``explain()`` sobre cada una
+QUERY_SHAPES = {}
+
+
+def register_query(name):
+    """
+    Registra una función que regresa el queryset de una forma de consulta
+    para revisarlo con ``index-audit``.
+    """
+    def decorator(func):
+        QUERY_SHAPES[name] = func
+        return func
+    return decorator
+
+
+@register_query('User.get_by_id')
+def _user_by_id():
+    return User.objects(_id='0' * 32)
+
+
+@register_query('User.get_by_email / login')
+def _user_by_email():
+    return User.objects(email='usuario@biblat.unam.mx')
+
+
+def _register_list_users(order_by):
+    # KeysetPagination ordena por la columna y _id como desempate
+    id_order = '-_id' if order_by.startswith('-') else '_id'
+    register_query('list_users order_by=%s' % order_by)(
+        lambda: User.objects.order_by(order_by, id_order).limit(11))
+
+
+for _column in ('username', 'email', 'email_confirmed'):
+    _register_list_users(_column)
+    _register_list_users('-%s' % _column)
+
+
+def ensure_indexes(documents=None):
+    """
+    Construye (en segundo plano) los índices declarados en los documentos.
+    Regresa un diccionario ``{colección: índices faltantes antes de crear}``.
+    """
+    created = {}
+    for document in documents or DOCUMENTS:
+        missing = document.compare_indexes()['missing']
+        document.ensure_indexes()
+        created[document._get_collection_name()] = missing
+    return created
+
+
+def plan_stages(plan):
+    """Regresa todas las etapas (``stage``) de un plan de ejecución"""
+    stages = []
+    if isinstance(plan, dict):
+        if 'stage' in plan:
+            stages.append(plan['stage'])
+        for key in ('inputStage', 'queryPlan'):
+            stages.extend(plan_stages(plan.get(key)))
+        for child in plan.get('inputStages', []):
+            stages.extend(plan_stages(child))
+    return stages
+
+
+def audit_query_shapes(shapes=None):
+    """
+    Ejecuta ``explain()`` sobre cada forma de consulta registrada.
+    Regresa una lista de tuplas ``(nombre, etapas, problemas)``, donde
+    ``problemas`` incluye COLLSCAN y SORT en memoria.
+    """
+    results = []
+    for name, queryset in sorted((shapes or QUERY_SHAPES).items()):
+        try:
+            explain = queryset().explain()
+        except Exception as e:
+            results.append((name, [], ['ERROR: %s' % e]))
+            continue
+        winning_plan = explain.get('queryPlanner', {}).get('winningPlan', {})
+        stages = plan_stages(winning_plan)
+        problems = [stage for stage in stages
+                    if stage in ('COLLSCAN', 'SORT')]
+        results.append((name, stages, problems))
+    return results
@@ -0,0 +1,151 @@
+# -*- coding: utf-8 -*-
+import cProfile
+import os
+import random
+import re
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from flask import (before_render_template, g, has_request_context, request,
+                   template_rendered)
+from pymongo import monitoring
+
+# Métricas en el orden en que se reportan en el encabezado Server-Timing
+METRICS = OrderedDict([
+    ('mongo', 'MongoDB'),
+    ('render', 'Jinja'),
+    ('bcrypt', 'Hash de contraseñas'),
+    ('smtp', 'Envío de correo'),
+    ('breadcrumbs', 'Breadcrumbs'),
+])
+
+
+def record(name, seconds):
+    """
+    Suma ``seconds`` a la métrica ``name`` de la petición en curso. No hace
+    nada si la instrumentación no está activa o no hay petición.
+    """
+    if not has_request_context():
+        return
+    timings = g.get('_timings')
+    if timings is None:
+        return
+    total, count = timings.get(name, (0.0, 0))
+    timings[name] = (total + seconds, count + 1)
+
+
+@contextmanager
+def timed(name):
+    """Mide el bloque ``with`` como parte de la métrica ``name``"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(name, time.perf_counter() - start)
+
+
+class CommandTimingListener(monitoring.CommandListener):
+    """Suma la duración de los comandos de mongoDB a la métrica ``mongo``"""
+
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        record('mongo', event.duration_micros / 1e6)
+
+    def failed(self, event):
+        record('mongo', event.duration_micros / 1e6)
+
+
+_listener_registered = False
+
+
+def register_command_listener():
+    """
+    Registra el listener de comandos de pymongo, debe llamarse antes de
+    crear la conexión (``dbmongo.init_app``). Se registra una sola vez por
+    proceso.
+    """
+    global _listener_registered
+    if not _listener_registered:
+        monitoring.register(CommandTimingListener())
+        _listener_registered = True
+
+
+def server_timing_header(timings, total):
+    """Construye el valor del encabezado ``Server-Timing``"""
+    parts = []
+    for name, desc in METRICS.items():
+        if name in timings:
+            seconds, count = timings[name]
+            parts.append('%s;dur=%.2f;desc="%s (%d)"' % (
+                name, seconds * 1000, desc, count))
+    parts.append('total;dur=%.2f' % (total * 1000))
+    return ', '.join(parts)
+
+
+class Instrumentation(object):
+    """
+    Instrumentación opcional por petición.
+
+    Configuración:
+    - SERVER_TIMING: agrega el encabezado ``Server-Timing`` con el tiempo de
+      mongoDB, Jinja, hash de contraseñas, SMTP y breadcrumbs.
+    - PROFILE: activa cProfile para una fracción de las peticiones
+      (PROFILE_SAMPLE_RATE) y guarda en PROFILE_DIR un archivo ``.prof``
+      por cada petición más lenta que PROFILE_SLOW_MS.
+    """
+
+    def init_app(self, app):
+        self.server_timing = app.config.get('SERVER_TIMING', False)
+        self.profile = bool(app.config.get('PROFILE'))
+        if not (self.server_timing or self.profile):
+            return
+        register_command_listener()
+        self.sample_rate = float(app.config.get('PROFILE_SAMPLE_RATE', 0.01))
+        self.slow_ms = float(app.config.get('PROFILE_SLOW_MS', 500))
+        self.profile_dir = app.config.get('PROFILE_DIR', 'tmp/profiles')
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+        before_render_template.connect(self._before_render, app)
+        template_rendered.connect(self._after_render, app)
+        app.extensions['instrumentation'] = self
+
+    def _before_request(self):
+        g._timings = {}
+        g._request_start = time.perf_counter()
+        if self.profile and random.random() < self.sample_rate:
+            g._profiler = cProfile.Profile()
+            g._profiler.enable()
+
+    def _after_request(self, response):
+        start = g.get('_request_start')
+        if start is None:
+            return response
+        total = time.perf_counter() - start
+        profiler = g.pop('_profiler', None)
+        if profiler is not None:
+            profiler.disable()
+            if total * 1000 >= self.slow_ms:
+                self._dump_profile(profiler, total)
+        if self.server_timing:
+            response.headers['Server-Timing'] = server_timing_header(
+                g.get('_timings', {}), total)
+        return response
+
+    def _dump_profile(self, profiler, total):
+        if not os.path.isdir(self.profile_dir):
+            os.makedirs(self.profile_dir)
+        endpoint = re.sub(r'[^\w.-]', '_', request.endpoint or 'none')
+        filename = '%d-%s-%dms.prof' % (time.time() * 1000, endpoint,
+                                        total * 1000)
+        profiler.dump_stats(os.path.join(self.profile_dir, filename))
+
+    def _before_render(self, sender, template, context, **extra):
+        if has_request_context():
+            g.setdefault('_render_starts', []).append(time.perf_counter())
+
+    def _after_render(self, sender, template, context, **extra):
+        if has_request_context() and g.get('_render_starts'):
+            record('render', time.perf_counter() - g._render_starts.pop())
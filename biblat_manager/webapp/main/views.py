@@ -13,11 +13,16 @@ from flask_breadcrumbs import register_breadcrumb
 from flask_login import current_user, login_user, logout_user, login_required
 
 from . import main
-from biblat_manager.webapp import babel, controllers
+from biblat_manager.webapp import (babel, collection_versions, controllers,
+                                   count_cache, limiter, slow_query_log)
 from biblat_manager.webapp.forms import (
-    RegistrationForm, LoginForm, EmailForm, PasswordForm
+    RegistrationForm, LoginForm, EmailForm, PasswordForm, UserActionForm,
+    BulkUserActionForm
 )
 from biblat_manager.webapp.models import User
+from biblat_manager.webapp.pagination import KeysetPagination
+from biblat_manager.webapp.readpreference import (for_listing,
+                                                  listing_read_preference)
 from biblat_manager.webapp.utils import get_timed_serializer
 
 
@@ -45,6 +50,23 @@ def revistas():
     return render_template('main/index.html', **data)
 
 
+@main.route('/consultas-lentas', methods=['GET'])
+@register_breadcrumb(main, '.slow_queries', __('Consultas lentas'))
+@login_required
+def slow_queries():
+    """
+    Consultas de mongoDB más lentas que SLOW_QUERY_MS, agrupadas por forma
+    (sin valores), con el total, el p95 y los endpoints que las ejecutaron.
+    """
+    data = {
+        'html_title': 'Biblat Manager - %s' % _('Consultas lentas'),
+        'groups': slow_query_log.summary(
+            read_preference=listing_read_preference()),
+        'threshold_ms': slow_query_log.threshold_ms,
+    }
+    return render_template('main/slow_queries.html', **data)
+
+
 # i18n
 @babel.localeselector
 def get_locale():
@@ -91,20 +113,23 @@ def logout():
 
 
 @main.route('/login', methods=['GET', 'POST'])
+@limiter.limit('login')
 def login():
     if current_user.is_authenticated:
         return redirect(url_for('.index'))
     form = LoginForm()
     if request.method == 'POST' and form.validate():
         user = User.objects(email=form.email.data).first()
-        if user and user.check_password_hash(form.password.data) \
-                and user.email_confirmed:
+        # Una sola verificación del hash por intento de login
+        valid_password = user.verify_password(form.password.data) \
+            if user else False
+        if valid_password and user.email_confirmed:
             login_user(user, remember=form.remember.data)
             flash(_('Sesión iniciada como %s' % user.email), 'success')
             return redirect(session.get('next') or url_for('.index'))
         if not user:
             flash(_('Usuario no registrado'), 'error')
-        if user and not user.check_password_hash(form.password.data):
+        if user and not valid_password:
             flash(_('Contraseña incorrecta'), 'error')
         if user and not user.email_confirmed:
             flash(_('Correo electrónico no verificado'), 'error')
@@ -113,34 +138,116 @@ def login():
 
 # USER
 @main.route('/usuarios', methods=['GET', 'POST'])
-@main.route('/usuarios/<int:page>', methods=['GET', 'POST'])
 @register_breadcrumb(main, '.users', __('Usuarios'))
 @login_required
-def list_users(page=1):
-    # TODO: implementación de borrado de usuarios
-    # TODO: implementación de reenvío de correo de confirmación
+@collection_versions.conditional('users')
+def list_users():
     order_by = request.args.get('order_by', None)
+    cursor = request.args.get('cursor', None)
     column_list = {
         'username': _('Nombre de usuario'),
         'email': _('Correo electrónico'),
         'email_confirmed': _('Correo verificado?'),
     }
-    users = User.objects.order_by(order_by).paginate(page=page, per_page=10)
+    if order_by and order_by.lstrip('-') not in column_list:
+        order_by = None
+    # Listado desde los secundarios (MONGODB_LISTING_READ_PREFERENCE)
+    users = KeysetPagination(
+        for_listing(User.objects), order_by=order_by, per_page=10,
+        cursor=cursor, total=count_cache.get(
+            for_listing(User._get_collection())))
     data = {
         'html_title': 'Biblat Manager - %s' % _('Usuarios'),
         'users': users,
         'order_by': order_by,
-        'column_list': column_list
+        'column_list': column_list,
+        'action_form': UserActionForm(),
+        'bulk_form': BulkUserActionForm()
     }
     return render_template('main/users.html', **data)
 
 
+@main.route('/usuarios/acciones', methods=['POST'])
+@login_required
+def bulk_user_action():
+    """
+    Aplica la acción seleccionada a los usuarios marcados en el listado
+    (``user_id``) con una sola operación en mongoDB.
+    """
+    form = BulkUserActionForm()
+    user_ids = request.form.getlist('user_id')
+    if not form.validate_on_submit():
+        flash(_('Acción inválida'), 'error')
+    elif not user_ids:
+        flash(_('Seleccione al menos un usuario'), 'error')
+    else:
+        if form.action.data == 'delete' and current_user.id in user_ids:
+            user_ids.remove(current_user.id)
+            flash(_('No es posible eliminar su propio usuario'), 'warning')
+        results = controllers.bulk_user_action(
+            form.action.data, user_ids,
+            queue=current_app.config.get('MAIL_OUTBOX', False))
+        statuses = list(results.values())
+        counts = dict((status, statuses.count(status))
+                      for status in set(statuses))
+        if counts.get('deleted'):
+            flash(_('Usuarios eliminados: %(count)d',
+                    count=counts['deleted']), 'info')
+        if counts.get('confirmed'):
+            flash(_('Correos verificados: %(count)d',
+                    count=counts['confirmed']), 'info')
+        if counts.get('sent'):
+            flash(_('Correos enviados: %(count)d', count=counts['sent']),
+                  'info')
+        if counts.get('unchanged'):
+            flash(_('Usuarios sin cambios: %(count)d',
+                    count=counts['unchanged']), 'warning')
+        if counts.get('failed'):
+            flash(_('Usuarios con error: %(count)d', count=counts['failed']),
+                  'error')
+        if counts.get('not_found'):
+            flash(_('Usuarios no encontrados: %(count)d',
+                    count=counts['not_found']), 'error')
+    return redirect(request.referrer or url_for('.list_users'))
+
+
+@main.route('/usuarios/reenviar-confirmacion', methods=['POST'])
+@login_required
+def resend_confirmations():
+    """
+    Reenvía el correo de confirmación a los usuarios seleccionados
+    (``user_id``) o a todos los usuarios sin confirmar. Con el outbox
+    (MAIL_OUTBOX) los correos se registran y los envía ``flask
+    mail-worker``; sin él sólo se envían por SMTP los de los usuarios
+    seleccionados, para todos se debe usar ``flask resend-confirmations``.
+    El checkpoint de la terminal no se modifica.
+    """
+    form = UserActionForm()
+    if form.validate_on_submit():
+        user_ids = request.form.getlist('user_id') or None
+        queue = current_app.config.get('MAIL_OUTBOX', False)
+        if user_ids is None and not queue:
+            flash(_('Para reenviar todas las confirmaciones utilice el '
+                    'comando: flask resend-confirmations'), 'error')
+        else:
+            summary = controllers.resend_confirmation_emails(
+                user_ids=user_ids, queue=queue)
+            if summary['sent']:
+                flash(_('Se enviaron %(sent)d correos de confirmación',
+                        sent=summary['sent']), 'info')
+            if summary['failed']:
+                flash(_('Ocurrió un error en el envío de %(failed)d correos '
+                        'de confirmación', failed=summary['failed']), 'error')
+    return redirect(request.referrer or url_for('.list_users'))
+
+
 @main.route('/usuarios/detalle/<user_id>', methods=['GET', 'POST'])
 @register_breadcrumb(main, '.users.detail', __('Detalle'),
                      endpoint_arguments_constructor=lambda: {
                          'user_id': request.view_args['user_id']
                      })
 @login_required
+@collection_versions.conditional('users')
 def user_detail(user_id):
     user = User.get_by_id(user_id)
     data = {
@@ -245,6 +352,7 @@ def confirm_email(token):
 
 
 @main.route('/reset/password', methods=['GET', 'POST'])
+@limiter.limit('reset')
 def reset():
     form = EmailForm()
 
@@ -0,0 +1,181 @@
+# -*- coding: utf-8 -*-
+import os
+import time
+
+from flask import Response, abort, g, request
+from flask_mail import email_dispatched
+from prometheus_client import (CONTENT_TYPE_LATEST, REGISTRY,
+                               CollectorRegistry, Counter, Histogram,
+                               generate_latest)
+from prometheus_client import multiprocess
+from pymongo import monitoring
+
+# Con varios workers de gunicorn, cada proceso escribe sus métricas en
+# archivos dentro de este directorio y /metrics las suma al leerlas
+# (ver biblat_manager/config/gunicorn_conf.py).
+MULTIPROC_DIR_ENV = 'prometheus_multiproc_dir'
+
+REQUEST_SECONDS = Histogram(
+    'biblat_request_seconds', 'Tiempo de respuesta por endpoint',
+    ['endpoint', 'method'])
+REQUESTS = Counter(
+    'biblat_requests_total', 'Peticiones por endpoint y estado',
+    ['endpoint', 'method', 'status'])
+MONGO_COMMAND_SECONDS = Histogram(
+    'biblat_mongo_command_seconds', 'Duración de los comandos de mongoDB',
+    ['command', 'collection'],
+    buckets=(.0005, .001, .0025, .005, .01, .025, .05, .1, .25, .5, 1, 2.5))
+MONGO_COMMAND_ERRORS = Counter(
+    'biblat_mongo_command_errors_total', 'Comandos de mongoDB con error',
+    ['command', 'collection'])
+PASSWORD_HASH_SECONDS = Histogram(
+    'biblat_password_hash_seconds', 'Tiempo de hash/verificación de bcrypt',
+    ['operation'],
+    buckets=(.005, .01, .025, .05, .1, .25, .5, 1, 2.5))
+MAIL_MESSAGES = Counter(
+    'biblat_mail_messages_total',
+    'Correos enviados (sent), con error (failed) o encolados en el outbox '
+    '(queued)', ['result'])
+RATELIMIT_REQUESTS = Counter(
+    'biblat_ratelimit_requests_total',
+    'Peticiones evaluadas por el límite de intentos: permitidas (allowed) o '
+    'rechazadas por IP o por correo (rejected_ip, rejected_email)',
+    ['scope', 'result'])
+CACHE_REQUESTS = Counter(
+    'biblat_cache_requests_total', 'Consultas a las cachés en memoria',
+    ['cache', 'result'])
+WORKER_BOOT_SECONDS = Histogram(
+    'biblat_worker_boot_seconds',
+    'Tiempo desde el fork hasta que el worker queda listo (warm-up)',
+    buckets=(.05, .1, .25, .5, 1, 2.5, 5, 10, 30))
+FIRST_REQUEST_SECONDS = Histogram(
+    'biblat_first_request_seconds',
+    'Latencia de la primera petición de cada worker',
+    buckets=(.01, .025, .05, .1, .25, .5, 1, 2.5, 5))
+
+
+def count_cache_request(cache, hit):
+    """Registra un acierto o fallo de la caché ``cache``"""
+    CACHE_REQUESTS.labels(cache, 'hit' if hit else 'miss').inc()
+
+
+def count_ratelimit(scope, result):
+    RATELIMIT_REQUESTS.labels(scope, result).inc()
+
+
+def count_mail(result, amount=1):
+    MAIL_MESSAGES.labels(result).inc(amount)
+
+
+def _count_dispatched(message, app):
+    """Receptor de ``email_dispatched``, cubre todas las formas de envío"""
+    count_mail('sent')
+
+
+class CommandMetricsListener(monitoring.CommandListener):
+    """
+    Registra la duración de los comandos de mongoDB por comando y colección.
+    El nombre de la colección sólo viene en el evento ``started``, se guarda
+    hasta que el comando termina.
+    """
+
+    def __init__(self):
+        self._collections = {}
+
+    @staticmethod
+    def _key(event):
+        return event.connection_id, event.request_id
+
+    def started(self, event):
+        collection = event.command.get(event.command_name)
+        if not isinstance(collection, str):
+            collection = ''
+        self._collections[self._key(event)] = collection
+
+    def _labels(self, event):
+        return (event.command_name,
+                self._collections.pop(self._key(event), ''))
+
+    def succeeded(self, event):
+        MONGO_COMMAND_SECONDS.labels(*self._labels(event)).observe(
+            event.duration_micros / 1e6)
+
+    def failed(self, event):
+        labels = self._labels(event)
+        MONGO_COMMAND_SECONDS.labels(*labels).observe(
+            event.duration_micros / 1e6)
+        MONGO_COMMAND_ERRORS.labels(*labels).inc()
+
+
+_listener_registered = False
+
+
+def register_command_listener():
+    """Registra el listener una sola vez por proceso, antes de conectar"""
+    global _listener_registered
+    if not _listener_registered:
+        monitoring.register(CommandMetricsListener())
+        _listener_registered = True
+
+
+def metrics_registry():
+    """
+    Regresa el registro a exportar: en modo multiproceso se construye uno
+    nuevo que suma los archivos de todos los workers.
+    """
+    if os.environ.get(MULTIPROC_DIR_ENV):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return registry
+    return REGISTRY
+
+
+class Metrics(object):
+    """
+    Métricas de Prometheus en ``/metrics``.
+
+    Configuración:
+    - METRICS_ENABLED: registra las métricas de peticiones y de mongoDB y
+      la ruta ``/metrics``.
+    - METRICS_TOKEN: /metrics exige el encabezado
+      ``Authorization: Bearer <token>``.
+    - METRICS_PUBLIC: sin METRICS_TOKEN, /metrics sólo se sirve (sin
+      autenticación) si se activa; si no, las métricas se registran pero
+      la ruta no existe.
+    """
+
+    def init_app(self, app):
+        self.enabled = app.config.get('METRICS_ENABLED', True)
+        if not self.enabled:
+            return
+        self.token = app.config.get('METRICS_TOKEN')
+        register_command_listener()
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+        email_dispatched.connect(_count_dispatched)
+        if self.token or app.config.get('METRICS_PUBLIC', False):
+            app.add_url_rule('/metrics', 'metrics', self.metrics_view)
+        else:
+            app.logger.info('/metrics desactivado: defina METRICS_TOKEN o '
+                            'METRICS_PUBLIC')
+        app.extensions['metrics'] = self
+
+    def _before_request(self):
+        g._metrics_start = time.perf_counter()
+
+    def _after_request(self, response):
+        start = g.get('_metrics_start')
+        if start is not None:
+            endpoint = request.endpoint or 'none'
+            REQUEST_SECONDS.labels(endpoint, request.method).observe(
+                time.perf_counter() - start)
+            REQUESTS.labels(endpoint, request.method,
+                            response.status_code).inc()
+        return response
+
+    def metrics_view(self):
+        if self.token and request.headers.get('Authorization') != \
+                'Bearer %s' % self.token:
+            abort(401)
+        return Response(generate_latest(metrics_registry()),
+                        content_type=CONTENT_TYPE_LATEST)
@@ -0,0 +1,207 @@
+# -*- coding: utf-8 -*-
+import datetime
+import importlib
+import pkgutil
+import re
+import time
+
+from mongoengine.connection import get_db
+
+from .models import Checkpoint
+
+MIGRATIONS_PACKAGE = 'biblat_manager.migrations'
+STATE_COLLECTION = 'schema_migrations'
+# Archivos de migración: NNNN_descripcion.py
+MODULE_NAME = re.compile(r'^(\d{4})_(\w+)$')
+
+
+class Migration(object):
+    """
+    Migración de datos versionada. Cada archivo ``NNNN_nombre.py`` del
+    paquete ``biblat_manager.migrations`` define una subclase; la versión
+    y el nombre se toman del archivo.
+
+    Por omisión se recorren por ``_id`` los documentos de ``collection``
+    que cumplen ``query`` y ``migrate(doc)`` regresa las operaciones de
+    pymongo (``UpdateOne``, ``DeleteOne``...) de cada documento, que se
+    escriben con un ``bulk_write`` por lote. Las migraciones que necesitan
+    otro proceso sobrescriben ``run``.
+    """
+    collection = None
+    query = {}
+    projection = None
+    description = ''
+
+    def __init__(self, version, name):
+        self.version = version
+        self.name = name
+
+    @property
+    def label(self):
+        return '%04d_%s' % (self.version, self.name)
+
+    @property
+    def checkpoint_name(self):
+        return 'migration:%s' % self.label
+
+    def get_collection(self):
+        return get_db()[self.collection]
+
+    def migrate(self, doc):
+        """Operaciones de escritura para ``doc`` (lista, una o None)"""
+        raise NotImplementedError
+
+    def run(self, runner):
+        """Aplica la migración; regresa un diccionario de contadores"""
+        return runner.run_batches(self)
+
+
+def _as_list(ops):
+    if ops is None:
+        return []
+    if isinstance(ops, (list, tuple)):
+        return list(ops)
+    return [ops]
+
+
+def load_migrations(package=MIGRATIONS_PACKAGE):
+    """Regresa las migraciones de ``package`` ordenadas por versión"""
+    module = importlib.import_module(package)
+    migrations = []
+    for info in pkgutil.iter_modules(module.__path__):
+        match = MODULE_NAME.match(info.name)
+        if not match:
+            continue
+        migration_module = importlib.import_module(
+            '%s.%s' % (package, info.name))
+        classes = [obj for obj in vars(migration_module).values()
+                   if isinstance(obj, type) and issubclass(obj, Migration) and
+                   obj.__module__ == migration_module.__name__]
+        if len(classes) != 1:
+            raise ValueError('%s debe definir exactamente una migración' %
+                             info.name)
+        migrations.append(classes[0](int(match.group(1)), match.group(2)))
+    versions = [migration.version for migration in migrations]
+    if len(set(versions)) != len(versions):
+        raise ValueError('Hay versiones de migración repetidas: %s' %
+                         sorted(versions))
+    return sorted(migrations, key=lambda migration: migration.version)
+
+
+class MigrationRunner(object):
+    """
+    Aplica las migraciones pendientes y registra cada una en la colección
+    ``schema_migrations`` (``_id`` = versión). Los documentos se leen por
+    lotes de ``batch_size`` ordenados por ``_id`` (paginación por llave,
+    sin ``skip``) y después de cada ``bulk_write`` se guarda el último
+    ``_id`` en un ``Checkpoint``: si el proceso se interrumpe, la siguiente
+    ejecución continúa en el lote siguiente.
+
+    ``query`` debe seguir siendo válida para los documentos ya migrados
+    (p. ej. ``{'campo': {'$exists': False}}``) o la migración debe ser
+    idempotente, porque el último lote puede repetirse.
+    """
+
+    def __init__(self, migrations=None, batch_size=1000, progress=None):
+        self.migrations = load_migrations() if migrations is None \
+            else sorted(migrations, key=lambda migration: migration.version)
+        self.batch_size = batch_size
+        self.progress = progress
+
+    @property
+    def state(self):
+        return get_db()[STATE_COLLECTION]
+
+    def applied(self):
+        """Regresa ``{versión: registro}`` de las migraciones aplicadas"""
+        return dict((doc['_id'], doc) for doc in self.state.find())
+
+    def pending(self, target=None):
+        applied = self.applied()
+        return [migration for migration in self.migrations
+                if migration.version not in applied and
+                (target is None or migration.version <= target)]
+
+    def run_batches(self, migration):
+        collection = migration.get_collection()
+        checkpoint = Checkpoint.objects(
+            name=migration.checkpoint_name).first()
+        summary = {'documents': 0, 'operations': 0, 'modified': 0}
+        last_id = None
+        if checkpoint is not None:
+            summary.update(checkpoint.data or {})
+            last_id = checkpoint.position
+        while True:
+            query = migration.query
+            if last_id is not None:
+                query = {'$and': [query, {'_id': {'$gt': last_id}}]}
+            docs = list(collection.find(query, migration.projection)
+                        .sort('_id', 1).limit(self.batch_size))
+            if not docs:
+                break
+            ops = []
+            for doc in docs:
+                ops.extend(_as_list(migration.migrate(doc)))
+            if ops:
+                result = collection.bulk_write(ops, ordered=False)
+                summary['modified'] += (result.modified_count +
+                                        result.inserted_count +
+                                        result.upserted_count +
+                                        result.deleted_count)
+            summary['documents'] += len(docs)
+            summary['operations'] += len(ops)
+            last_id = docs[-1]['_id']
+            Checkpoint.save_position(migration.checkpoint_name, last_id,
+                                     **summary)
+            if self.progress:
+                self.progress(len(docs))
+        return summary
+
+    def apply(self, migration):
+        """Aplica ``migration`` y la registra como aplicada"""
+        start = time.perf_counter()
+        summary = migration.run(self)
+        self.state.replace_one({'_id': migration.version}, {
+            '_id': migration.version,
+            'name': migration.name,
+            'description': migration.description,
+            'applied_at': datetime.datetime.utcnow(),
+            'seconds': round(time.perf_counter() - start, 3),
+            'summary': summary,
+        }, upsert=True)
+        Checkpoint.clear(migration.checkpoint_name)
+        return summary
+
+    def upgrade(self, target=None):
+        """
+        Aplica en orden las migraciones pendientes hasta ``target`` (todas
+        si es None); regresa una lista de ``(migración, contadores)``.
+        """
+        return [(migration, self.apply(migration))
+                for migration in self.pending(target)]
+
+    def estimate(self, migration, sample=100):
+        """
+        Estima la duración de ``migration`` sin escribir: mide la lectura
+        y ``migrate`` de ``sample`` documentos y lo extrapola al total de
+        documentos que cumplen ``query``. No incluye el ``bulk_write``,
+        que depende del servidor y de los índices.
+        """
+        collection = migration.get_collection()
+        total = collection.count_documents(migration.query)
+        start = time.perf_counter()
+        docs = list(collection.find(migration.query, migration.projection)
+                    .sort('_id', 1).limit(sample))
+        operations = 0
+        for doc in docs:
+            operations += len(_as_list(migration.migrate(doc)))
+        elapsed = time.perf_counter() - start
+        per_document = elapsed / len(docs) if docs else 0.0
+        return {
+            'documents': total,
+            'sampled': len(docs),
+            'operations': operations,
+            'seconds_per_document': per_document,
+            'estimated_seconds': per_document * total,
+            'batches': -(-total // self.batch_size),
+        }
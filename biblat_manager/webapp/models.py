@@ -1,18 +1,116 @@
 # -*- coding: utf-8 -*-
+import datetime
+import uuid
+
+from bson.binary import Binary, UUID_SUBTYPE
+from flask import g, has_app_context
 from flask_login import UserMixin
-from mongoengine import queryset_manager
-from . import dbmongo as db, login_manager, notifications, utils
+from mongoengine import queryset_manager, signals
+from mongoengine.base import BaseField
+from mongoengine.errors import SaveConditionError
+from . import (collection_versions, dbmongo as db, hasher, login_manager,
+               notifications, user_cache, utils)
+from .metrics import count_cache_request
+
+
+class LegacyId(str):
+    """Id leído de un documento que aún guarda el id como string"""
+
+
+class CompactIdField(BaseField):
+    """
+    Id de 32 caracteres hexadecimales (``utils.generate_uuid_32_string``).
+    En Python, URLs, sesión y cursores se usa el string; en mongoDB se
+    guarda como UUID binario (BSON subtipo 4, 16 bytes en vez de 32).
+
+    Mientras ``flask migrate-user-ids`` migra los documentos anteriores,
+    las consultas por igualdad (y ``User.ids_query``) buscan ambas formas,
+    y los documentos con el id como string (``LegacyId``) se actualizan
+    con el mismo id.
+    """
+
+    def to_python(self, value):
+        if isinstance(value, uuid.UUID):
+            return value.hex
+        if isinstance(value, bytes) and len(value) == 16:
+            return uuid.UUID(bytes=bytes(value)).hex
+        return value
+
+    def to_mongo(self, value):
+        if isinstance(value, LegacyId) or not self._is_hex(value):
+            return str(value) if isinstance(value, str) else value
+        return Binary(uuid.UUID(hex=value).bytes, UUID_SUBTYPE)
+
+    def validate(self, value):
+        if not self._is_hex(value):
+            self.error('El id debe ser un string hexadecimal de 32 '
+                       'caracteres')
+
+    def prepare_query_value(self, op, value):
+        if op is None:
+            return {'$in': self.query_values([value])}
+        return self.to_mongo(self.to_python(value))
+
+    def query_values(self, values):
+        """Formas binaria y string de cada id de ``values``"""
+        result = []
+        for value in values:
+            value = self.to_python(value)
+            if self._is_hex(value):
+                result.append(self.to_mongo(str(value)))
+            result.append(value)
+        return result
+
+    @staticmethod
+    def _is_hex(value):
+        if not isinstance(value, str) or len(value) != 32:
+            return False
+        try:
+            int(value, 16)
+        except ValueError:
+            return False
+        return True
 
 
 class User(UserMixin, db.Document):
-    _id = db.StringField(max_length=32, primary_key=True,
+    _id = CompactIdField(primary_key=True,
                          default=lambda: utils.generate_uuid_32_string())
     username = db.StringField(max_length=100, unique=True)
     email = db.StringField(max_length=100, required=True)
     _password = db.StringField(required=True, db_field='password')
     email_confirmed = db.BooleanField(default=False)
 
-    meta = {'collection': 'users'}
+    meta = {
+        'collection': 'users',
+        'index_background': True,
+        'indexes': [
+            # get_by_email, login y order_by email en /usuarios
+            ('email', '_id'),
+            # order_by username y email_confirmed en /usuarios
+            ('username', '_id'),
+            ('email_confirmed', '_id'),
+        ]
+    }
+
+    @classmethod
+    def _from_son(cls, son, *args, **kwargs):
+        document = super(User, cls)._from_son(son, *args, **kwargs)
+        if isinstance(son.get('_id'), str):
+            # Documento sin migrar: se actualiza con el id string
+            document._data['_id'] = LegacyId(son['_id'])
+        return document
+
+    def save(self, *args, **kwargs):
+        if isinstance(self.pk, LegacyId) and not self._created and \
+                kwargs.get('save_condition') is None:
+            # Sin upsert: si el documento ya se migró (p. ej. el usuario
+            # venía de ``user_cache``) se actualiza el documento con id binario
+            try:
+                return super(User, self).save(*args, save_condition={},
+                                              **kwargs)
+            except SaveConditionError:
+                self._data['_id'] = str(self.pk)
+        return super(User, self).save(*args, **kwargs)
 
     def __init__(self, *args, **kwargs):
         if 'password' in kwargs:
@@ -28,7 +126,7 @@ class User(UserMixin, db.Document):
 
     @password.setter
     def password(self, plaintext):
-        self._password = utils.pwd_context.hash(plaintext)
+        self._password = hasher.hash(plaintext)
 
     def check_password_hash(self, plaintext):
         """
@@ -37,7 +135,22 @@ class User(UserMixin, db.Document):
         if not self._password:
             return False
         else:
-            return utils.pwd_context.verify(plaintext, self._password)
+            return hasher.verify(plaintext, self._password)
+
+    def verify_password(self, plaintext):
+        """
+        Compara el string ``plaintext`` con el hash de la contraseña almacenada
+        con una sola verificación. Si la contraseña es correcta y el hash fue
+        calculado con otro costo (PASSWORD_HASH_ROUNDS), se recalcula y se
+        guarda el nuevo hash.
+        """
+        if not self._password:
+            return False
+        valid, new_hash = hasher.verify_and_update(plaintext, self._password)
+        if valid and new_hash:
+            self._password = new_hash
+            self.save()
+        return valid
 
     def send_confirmation_email(self):
         if not self._check_valid_email():
@@ -60,6 +173,11 @@ class User(UserMixin, db.Document):
         """
         return utils.check_valid_email(self.email)
 
+    @classmethod
+    def ids_query(cls, user_ids):
+        """Filtro ``$in`` de pymongo para ``user_ids`` (ambas formas)"""
+        return {'_id': {'$in': cls._fields['_id'].query_values(user_ids)}}
+
     @queryset_manager
     def get_by_id(doc_cls, queryset, user_id):
         return queryset.filter(_id=user_id).first()
@@ -78,6 +196,117 @@ class User(UserMixin, db.Document):
         return self.email
 
 
+class OutboxEmail(db.Document):
+    """
+    Correo pendiente de envío. Las vistas lo registran con
+    ``outbox.enqueue_email`` y el comando ``flask mail-worker`` lo envía.
+    """
+    STATUS = ('pending', 'sending', 'sent', 'failed')
+
+    recipients = db.ListField(db.StringField(max_length=100), required=True)
+    subject = db.StringField(required=True)
+    html = db.StringField()
+    status = db.StringField(choices=STATUS, default='pending')
+    attempts = db.IntField(default=0)
+    last_error = db.StringField()
+    created_at = db.DateTimeField(default=datetime.datetime.utcnow)
+    next_attempt = db.DateTimeField(default=datetime.datetime.utcnow)
+    locked_until = db.DateTimeField()
+    sent_at = db.DateTimeField()
+
+    meta = {
+        'collection': 'email_outbox',
+        'index_background': True,
+        'indexes': [
+            ('status', 'next_attempt'),
+            ('status', 'locked_until'),
+        ]
+    }
+
+    def __unicode__(self):
+        return '%s: %s' % (', '.join(self.recipients), self.subject)
+
+
+class Checkpoint(db.Document):
+    """
+    Posición guardada de un proceso por lotes (``name``), para reanudarlo
+    donde se quedó si se interrumpe.
+    """
+    name = db.StringField(max_length=100, primary_key=True)
+    position = db.DynamicField()
+    data = db.DictField()
+    updated_at = db.DateTimeField(default=datetime.datetime.utcnow)
+
+    meta = {'collection': 'checkpoints'}
+
+    @classmethod
+    def get_position(cls, name):
+        checkpoint = cls.objects(name=name).first()
+        return checkpoint.position if checkpoint else None
+
+    @classmethod
+    def save_position(cls, name, position, **data):
+        cls(name=name, position=position, data=data,
+            updated_at=datetime.datetime.utcnow()).save()
+
+    @classmethod
+    def clear(cls, name):
+        cls.objects(name=name).delete()
+
+
 @login_manager.user_loader
 def load_user(user_id):
-    return User.objects(pk=user_id).first()
+    """
+    Carga el usuario de la sesión. Se busca primero en los usuarios ya
+    cargados durante la petición (``g``), luego en ``user_cache`` (TTL corto
+    entre peticiones) y por último en mongoDB.
+
+    ``user_cache`` es local a cada proceso: ``invalidate_user`` e
+    ``invalidate_user_ids`` sólo limpian la caché del worker que hace la
+    escritura. En los demás workers un usuario modificado, desactivado o
+    borrado puede seguir en caché hasta ``USER_CACHE_TTL`` segundos (2 por
+    omisión), por lo que el TTL debe mantenerse corto.
+    """
+    loaded_users = g.setdefault('loaded_users', {})
+    if user_id in loaded_users:
+        return loaded_users[user_id]
+    son = user_cache.get(user_id)
+    count_cache_request('user', son is not None)
+    if son is not None:
+        user = User._from_son(son)
+    else:
+        user = User.objects(pk=user_id).first()
+        if user is not None:
+            user_cache.set(user_id, user.to_mongo())
+    loaded_users[user_id] = user
+    return user
+
+
+def invalidate_user(sender, document, **kwargs):
+    """
+    Elimina al usuario de las cachés de ``load_user`` cada vez que se
+    guarda o se borra (incluye ``controllers.set_user_password`` y
+    ``controllers.set_user_email_confirmed``).
+    """
+    user_id = str(document.pk)
+    user_cache.delete(user_id)
+    if has_app_context():
+        g.get('loaded_users', {}).pop(user_id, None)
+
+
+def invalidate_user_ids(user_ids):
+    """
+    Elimina a los usuarios ``user_ids`` de las cachés de ``load_user``
+    después de una escritura directa en la colección (``update_many``,
+    ``delete_many``), que no emite las señales de mongoengine.
+    """
+    loaded_users = g.get('loaded_users', {}) if has_app_context() else {}
+    for user_id in user_ids:
+        user_cache.delete(str(user_id))
+        loaded_users.pop(str(user_id), None)
+
+
+signals.post_save.connect(invalidate_user, sender=User)
+signals.post_delete.connect(invalidate_user, sender=User)
+collection_versions.track(User)
+
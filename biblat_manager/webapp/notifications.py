@@ -1,8 +1,23 @@
 # -*- coding: utf-8 -*-
 import six
 from flask import url_for, render_template, current_app
+from flask_mail import Message
 from . import utils
 
+CONFIRMATION_SUBJECT = "Confirmación de correo electrónico"
+RESET_PASSWORD_SUBJECT = "Instrucciones para recuperar su contraseña"
+
+
+def deliver_email(recipient, subject, html):
+    """
+    Registra el correo en el outbox cuando ``MAIL_OUTBOX`` está activo (lo
+    envía ``flask mail-worker``), en otro caso lo envía de inmediato.
+    """
+    if current_app.config.get('MAIL_OUTBOX'):
+        from .outbox import enqueue_email
+        return enqueue_email(recipient, subject, html)
+    return utils.send_email(recipient, subject, html)
+
 
 def send_confirmation_email(recipient_email):
     """
@@ -22,9 +37,9 @@ def send_confirmation_email(recipient_email):
         return False, 'Token inválido: %s' % str(e)
     else:
         confirm_url = url_for('main.confirm_email', token=token, _external=True)
-        sent_results = utils.send_email(
+        sent_results = deliver_email(
             recipient_email,
-            "Confirmación de correo electrónico",
+            CONFIRMATION_SUBJECT,
             render_template('email/activate.html', confirm_url=confirm_url))
         return sent_results
 
@@ -47,9 +62,40 @@ def send_reset_password_email(recipient_email):
         return False, 'Token inválido: %s' % str(e)
     else:
         recover_url = url_for('main.reset_with_token', token=token, _external=True)
-        sent_results = utils.send_email(
+        sent_results = deliver_email(
             recipient_email,
-            "Instrucciones para recuperar su contraseña",
+            RESET_PASSWORD_SUBJECT,
             render_template('email/recover.html', recover_url=recover_url))
 
         return sent_results
+
+
+def build_confirmation_message(recipient_email, ts):
+    """
+    Regresa el ``Message`` de confirmación para ``recipient_email``, firmando
+    el token con el serializador ``ts`` (se reutiliza en los envíos masivos).
+    """
+    token = ts.dumps(recipient_email,
+                     salt=current_app.config.get('TOKEN_EMAIL_SALT'))
+    confirm_url = url_for('main.confirm_email', token=token, _external=True)
+    return Message(subject=CONFIRMATION_SUBJECT,
+                   sender=current_app.config['MAIL_DEFAULT_SENDER'],
+                   recipients=[recipient_email],
+                   html=render_template('email/activate.html',
+                                        confirm_url=confirm_url))
+
+
+def build_reset_password_message(recipient_email, ts):
+    """
+    Regresa el ``Message`` con las instrucciones para recuperar la
+    contraseña de ``recipient_email``, firmando el token con ``ts``.
+    """
+    token = ts.dumps(recipient_email,
+                     salt=current_app.config.get('TOKEN_EMAIL_SALT'))
+    recover_url = url_for('main.reset_with_token', token=token,
+                          _external=True)
+    return Message(subject=RESET_PASSWORD_SUBJECT,
+                   sender=current_app.config['MAIL_DEFAULT_SENDER'],
+                   recipients=[recipient_email],
+                   html=render_template('email/recover.html',
+                                        recover_url=recover_url))
@@ -0,0 +1,144 @@
+# -*- coding: utf-8 -*-
+import datetime
+
+from flask import current_app
+from flask_mail import Message
+from mongoengine.queryset.visitor import Q
+
+from . import mail
+from .metrics import count_mail
+from .models import OutboxEmail
+
+
+def enqueue_email(recipient, subject, html):
+    """
+    Registra un correo en el outbox para que lo envíe ``flask mail-worker``.
+    Regresa lo mismo que ``utils.send_email``:
+     - (True, '') em caso de éxito.
+     - (False, 'MENSAJE DE ERROR/EXCEPCIÓN') en caso de error/excepción
+    """
+    recipients = recipient if isinstance(recipient, list) else [recipient, ]
+    try:
+        OutboxEmail(recipients=recipients, subject=subject, html=html).save()
+        count_mail('queued')
+        return True, ''
+    except Exception as e:
+        return False, e
+
+
+def claim_batch(size):
+    """
+    Reserva hasta ``size`` correos pendientes (o cuya reserva expiró porque
+    el worker que los tomó se detuvo) y los marca como ``sending``.
+    """
+    now = datetime.datetime.utcnow()
+    lock_seconds = current_app.config.get('MAIL_OUTBOX_LOCK_SECONDS', 300)
+    locked_until = now + datetime.timedelta(seconds=lock_seconds)
+    query = (Q(status='pending', next_attempt__lte=now) |
+             Q(status='sending', locked_until__lte=now))
+    batch = []
+    while len(batch) < size:
+        email = OutboxEmail.objects(query).order_by('next_attempt').modify(
+            set__status='sending', set__locked_until=locked_until, new=True)
+        if email is None:
+            break
+        batch.append(email)
+    return batch
+
+
+def retry_delay(attempts):
+    """Segundos de espera antes del siguiente intento (backoff exponencial)"""
+    base = current_app.config.get('MAIL_OUTBOX_RETRY_DELAY', 30)
+    return base * 2 ** (attempts - 1)
+
+
+def _mark_failed(email, error):
+    count_mail('failed')
+    email.attempts += 1
+    email.last_error = str(error)
+    max_attempts = current_app.config.get('MAIL_OUTBOX_MAX_ATTEMPTS', 5)
+    if email.attempts >= max_attempts:
+        email.status = 'failed'
+    else:
+        email.status = 'pending'
+        email.next_attempt = datetime.datetime.utcnow() + \
+            datetime.timedelta(seconds=retry_delay(email.attempts))
+    email.locked_until = None
+    email.save()
+
+
+def _mark_sent(email, attempts=3):
+    """
+    Registra ``email`` como enviado. Un error aquí nunca lo regresa a
+    ``pending``: se reintenta la escritura y, si no se logra, sólo se
+    registra en el log (el correo quedaría en ``sending`` y se volvería a
+    enviar al expirar su reserva).
+    """
+    email.status = 'sent'
+    email.attempts += 1
+    email.sent_at = datetime.datetime.utcnow()
+    email.locked_until = None
+    email.last_error = None
+    for attempt in range(attempts):
+        try:
+            email.save()
+            return True
+        except Exception as e:
+            error = e
+    current_app.logger.error('Correo %s enviado pero no registrado: %s',
+                             email.pk, error)
+    return False
+
+
+def send_batch(batch):
+    """
+    Envía los correos de ``batch`` sobre una sola conexión SMTP (Flask-Mail
+    la renueva cada ``MAIL_MAX_EMAILS`` envíos) y registra el resultado de
+    cada uno. Cada correo se saca de los pendientes antes de enviarlo, de
+    modo que un error al registrar un correo ya entregado no lo reintenta.
+    Regresa la tupla ``(enviados, fallidos)``.
+    """
+    sent = failed = 0
+    if not batch:
+        return sent, failed
+    sender = current_app.config['MAIL_DEFAULT_SENDER']
+    pending = list(batch)
+    try:
+        with mail.connect() as connection:
+            while pending:
+                email = pending.pop(0)
+                try:
+                    connection.send(Message(subject=email.subject,
+                                            sender=sender,
+                                            recipients=email.recipients,
+                                            html=email.html))
+                except Exception as e:
+                    failed += 1
+                    _mark_failed(email, e)
+                else:
+                    sent += 1
+                    _mark_sent(email)
+    except Exception as e:
+        # Error de conexión: el resto del lote se reintenta más tarde
+        for email in pending:
+            _mark_failed(email, e)
+            failed += 1
+    return sent, failed
+
+
+def process_outbox(batch_size=None):
+    """
+    Envía lotes de correos pendientes hasta vaciar el outbox.
+    Regresa la tupla ``(enviados, fallidos)``.
+    """
+    batch_size = batch_size or current_app.config.get(
+        'MAIL_OUTBOX_BATCH_SIZE', 50)
+    total_sent = total_failed = 0
+    while True:
+        batch = claim_batch(batch_size)
+        if not batch:
+            break
+        sent, failed = send_batch(batch)
+        total_sent += sent
+        total_failed += failed
+    return total_sent, total_failed
@@ -0,0 +1,199 @@
+# -*- coding: utf-8 -*-
+import base64
+import json
+import threading
+import time
+
+from .metrics import count_cache_request
+
+
+def encode_cursor(data):
+    """Codifica ``data`` como un token opaco para usar en URLs"""
+    raw = json.dumps(data, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(token):
+    """
+    Decodifica un token generado por ``encode_cursor``.
+    Regresa None si el token es inválido.
+    """
+    if not token:
+        return None
+    try:
+        padding = '=' * (-len(token) % 4)
+        data = json.loads(
+            base64.urlsafe_b64decode(str(token) + padding).decode('utf-8'))
+    except (ValueError, TypeError):
+        return None
+    if not isinstance(data, dict) or 'id' not in data:
+        return None
+    return data
+
+
+class CountCache(object):
+    """
+    Caché del total de documentos por colección. Usa
+    ``estimated_document_count`` (metadatos de la colección, sin recorrerla)
+    y, una vez vencido el ``ttl``, regresa el valor anterior mientras lo
+    actualiza en un hilo en segundo plano.
+    """
+
+    def __init__(self, ttl=60, clock=time.time):
+        self.ttl = ttl
+        self.clock = clock
+        self._counts = {}
+        self._refreshing = set()
+        self._lock = threading.Lock()
+
+    def _refresh(self, collection):
+        try:
+            count = collection.estimated_document_count()
+            with self._lock:
+                self._counts[collection.full_name] = (self.clock(), count)
+        finally:
+            with self._lock:
+                self._refreshing.discard(collection.full_name)
+
+    def get(self, collection):
+        name = collection.full_name
+        with self._lock:
+            cached = self._counts.get(name)
+            refresh = name not in self._refreshing and (
+                cached is None or cached[0] + self.ttl < self.clock())
+            if refresh:
+                self._refreshing.add(name)
+        count_cache_request('count', cached is not None)
+        if cached is None:
+            # La primera vez se calcula en la misma petición
+            self._refresh(collection)
+            return self._counts[name][1]
+        if refresh:
+            threading.Thread(target=self._refresh, args=(collection,),
+                             daemon=True).start()
+        return cached[1]
+
+    def clear(self):
+        with self._lock:
+            self._counts.clear()
+
+
+class KeysetPagination(object):
+    """
+    Paginación por cursor (keyset) de un queryset de mongoengine, ordenado
+    por ``order_by`` y ``_id`` como desempate. Cada página es una consulta
+    ``$gt``/``$lt`` sobre el índice ``(campo, _id)``, sin ``skip()`` ni
+    ``count()``, por lo que cualquier página cuesta lo mismo que la primera.
+
+    ``cursor`` es el token opaco recibido en ``next_cursor``/``prev_cursor``.
+
+    Mientras ``flask migrate-user-ids`` convierte los ids string a
+    UUID binario la colección tiene ids de ambos tipos: mongoDB ordena
+    todos los string antes que los binarios y ``$gt``/``$lt`` sólo
+    comparan valores del mismo tipo, por lo que el desempate por ``_id``
+    agrega los documentos del otro tipo (``_id_after``).
+    """
+
+    def __init__(self, queryset, order_by=None, per_page=10, cursor=None,
+                 total=None):
+        self.queryset = queryset
+        self.per_page = per_page
+        self.total = total
+        document = queryset._document
+        field_name = (order_by or '').lstrip('-+')
+        if field_name and field_name in document._fields:
+            self.field = field_name
+            self.db_field = document._fields[field_name].db_field
+            self.direction = -1 if order_by.startswith('-') else 1
+        else:
+            self.field = self.db_field = None
+            self.direction = 1
+        self.cursor = decode_cursor(cursor)
+        self._fetch()
+
+    def _sort_keys(self, direction):
+        prefix = '' if direction == 1 else '-'
+        keys = ['%s_id' % prefix]
+        if self.field:
+            keys.insert(0, '%s%s' % (prefix, self.field))
+        return keys
+
+    @property
+    def _id_field(self):
+        document = self.queryset._document
+        return document._fields[document._meta['id_field']]
+
+    @staticmethod
+    def _id_after(cursor_id, op):
+        """
+        Ids posteriores a ``cursor_id`` con ``op``: al avanzar desde un id
+        string siguen todos los binarios y al retroceder desde uno binario
+        siguen todos los string.
+        """
+        id_filter = {'_id': {op: cursor_id}}
+        if isinstance(cursor_id, str) and op == '$gt':
+            return {'$or': [id_filter, {'_id': {'$type': 'binData'}}]}
+        if not isinstance(cursor_id, str) and op == '$lt':
+            return {'$or': [id_filter, {'_id': {'$type': 'string'}}]}
+        return id_filter
+
+    def _after(self, cursor, direction):
+        """Filtro de los documentos posteriores a ``cursor`` en ``direction``"""
+        op = '$gt' if direction == 1 else '$lt'
+        # ``s``: el id se guarda como string (documento sin migrar)
+        cursor_id = cursor['id'] if cursor.get('s') else \
+            self._id_field.to_mongo(cursor['id'])
+        id_filter = self._id_after(cursor_id, op)
+        if not self.db_field:
+            return id_filter
+        value = cursor.get('v')
+        same_value = dict(id_filter, **{self.db_field: value})
+        # null es el menor valor al ordenar y no se compara con $gt/$lt
+        if value is None:
+            if direction == 1:
+                return {'$or': [{self.db_field: {'$ne': None}}, same_value]}
+            return same_value
+        after = [{self.db_field: {op: value}}, same_value]
+        if direction == -1:
+            after.append({self.db_field: None})
+        return {'$or': after}
+
+    def _fetch(self):
+        cursor = self.cursor
+        backwards = bool(cursor) and cursor.get('d') == 'prev'
+        direction = -self.direction if backwards else self.direction
+        queryset = self.queryset
+        if cursor:
+            queryset = queryset.filter(__raw__=self._after(cursor, direction))
+        items = list(queryset.order_by(*self._sort_keys(direction))
+                     .limit(self.per_page + 1))
+        has_more = len(items) > self.per_page
+        items = items[:self.per_page]
+        if backwards:
+            items.reverse()
+            self.has_prev = has_more
+            self.has_next = True
+        else:
+            self.has_next = has_more
+            self.has_prev = bool(cursor)
+        self.items = items
+
+    def _cursor_for(self, item, direction):
+        data = {'id': item.pk, 'd': direction}
+        if isinstance(self._id_field.to_mongo(item.pk), str):
+            data['s'] = 1
+        if self.field:
+            data['v'] = item[self.field]
+        return encode_cursor(data)
+
+    @property
+    def next_cursor(self):
+        if not self.has_next or not self.items:
+            return None
+        return self._cursor_for(self.items[-1], 'next')
+
+    @property
+    def prev_cursor(self):
+        if not self.has_prev or not self.items:
+            return None
+        return self._cursor_for(self.items[0], 'prev')
@@ -0,0 +1,135 @@
+# -*- coding: utf-8 -*-
+import hashlib
+import math
+import mmap
+import os
+import struct
+import threading
+
+# Encabezado: firma, bits del filtro, funciones hash y contraseñas. La
+# firma cambia con las funciones hash: los filtros anteriores se rechazan
+MAGIC = b'BBLTBLM3'
+HEADER = struct.Struct('<8sQIQ')
+
+
+def _hashes(password):
+    """
+    Dos hashes de 64 bits de ``password`` (doble hashing), tomados del
+    SHA-256 (``blake2b`` no existe en Python 3.5)
+    """
+    if not isinstance(password, bytes):
+        password = password.encode('utf-8')
+    digest = hashlib.sha256(password).digest()
+    return (int.from_bytes(digest[:8], 'little'),
+            int.from_bytes(digest[8:16], 'little') | 1)
+
+
+def filter_size(count, error_rate):
+    """
+    Regresa ``(bits, funciones hash)`` de un filtro de Bloom para
+    ``count`` contraseñas con la tasa de falsos positivos ``error_rate``
+    """
+    count = max(count, 1)
+    bits = int(math.ceil(-count * math.log(error_rate) / math.log(2) ** 2))
+    bits = (bits + 7) // 8 * 8
+    hashes = max(1, int(round(bits / count * math.log(2))))
+    return bits, hashes
+
+
+def _wordlist(path):
+    with open(path, 'rb') as f:
+        for line in f:
+            word = line.rstrip(b'\r\n')
+            if word:
+                yield word
+
+
+def build_password_filter(wordlist, output, error_rate=0.001):
+    """
+    Genera en ``output`` el filtro de Bloom de las contraseñas de
+    ``wordlist`` (una por línea). Para 10 millones de contraseñas y
+    ``error_rate`` de 0.001 el archivo mide ~18 MB. Regresa el número de
+    contraseñas.
+    """
+    count = sum(1 for _ in _wordlist(wordlist))
+    bits, hashes = filter_size(count, error_rate)
+    array = bytearray(bits // 8)
+    for word in _wordlist(wordlist):
+        h1, h2 = _hashes(word)
+        for k in range(hashes):
+            position = (h1 + k * h2) % bits
+            array[position >> 3] |= 1 << (position & 7)
+    tmp = output + '.tmp'
+    with open(tmp, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, bits, hashes, count))
+        f.write(array)
+    # Reemplazo atómico: los workers con el archivo anterior mapeado no se
+    # ven afectados
+    os.replace(tmp, output)
+    return count
+
+
+class PasswordFilter(object):
+    """
+    Filtro de Bloom de contraseñas comunes o filtradas, generado con
+    ``flask build-password-filter``. El archivo se mapea en memoria
+    (``mmap``) de sólo lectura, por lo que las páginas las comparte el
+    sistema operativo entre todos los workers de gunicorn; cada consulta
+    lee ``hashes`` bytes del filtro.
+
+    Configuración:
+    - PASSWORD_FILTER_PATH: ruta del filtro (None: desactivado).
+    """
+
+    def __init__(self, path=None):
+        self.path = path
+        self._mmap = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.close()
+        self.path = app.config.get('PASSWORD_FILTER_PATH')
+        if self.path and not os.path.exists(self.path):
+            app.logger.warning('No existe el filtro de contraseñas %s, '
+                               'genérelo con flask build-password-filter',
+                               self.path)
+            self.path = None
+        app.extensions['password_filter'] = self
+
+    @property
+    def enabled(self):
+        return bool(self.path)
+
+    def _open(self):
+        with self._lock:
+            if self._mmap is None or self._pid != os.getpid():
+                with open(self.path, 'rb') as f:
+                    data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                magic, bits, hashes, count = HEADER.unpack_from(data)
+                if magic != MAGIC:
+                    data.close()
+                    raise ValueError('Archivo de filtro inválido: %s' %
+                                     self.path)
+                self.bits, self.hashes, self.count = bits, hashes, count
+                self._mmap = data
+                self._pid = os.getpid()
+            return self._mmap
+
+    def __contains__(self, password):
+        if not self.enabled:
+            return False
+        data = self._open()
+        h1, h2 = _hashes(password)
+        bits = self.bits
+        for k in range(self.hashes):
+            position = (h1 + k * h2) % bits
+            if not data[HEADER.size + (position >> 3)] & (1 << (position & 7)):
+                return False
+        return True
+
+    def close(self):
+        if self._mmap is not None and self._pid == os.getpid():
+            self._mmap.close()
+        self._mmap = None
+        self._pid = None
@@ -0,0 +1,133 @@
+# -*- coding: utf-8 -*-
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from passlib.context import CryptContext
+
+from .instrumentation import timed
+from .metrics import PASSWORD_HASH_SECONDS
+
+pwd_context = CryptContext(schemes=['bcrypt_sha256'])
+
+
+def _hash(plaintext):
+    return pwd_context.hash(plaintext)
+
+
+def _verify(plaintext, hashed):
+    return pwd_context.verify(plaintext, hashed)
+
+
+def _verify_and_update(plaintext, hashed):
+    return pwd_context.verify_and_update(plaintext, hashed)
+
+
+def gevent_patched():
+    """Regresa True si gevent reemplazó ``threading`` (workers gevent)"""
+    try:
+        from gevent import monkey
+    except ImportError:
+        return False
+    return monkey.is_module_patched('threading')
+
+
+def native_thread_pool(max_workers):
+    """
+    Pool de hilos del sistema operativo. Con gevent, ``ThreadPoolExecutor``
+    crearía greenlets y bcrypt bloquearía el event loop; el pool de gevent
+    usa hilos reales y ``result()`` cede el control mientras espera.
+    """
+    if gevent_patched():
+        from gevent.threadpool import ThreadPoolExecutor as GeventExecutor
+        return GeventExecutor(max_workers)
+    return ThreadPoolExecutor(max_workers)
+
+
+class PasswordHasher(object):
+    """
+    Calcula y verifica los hashes de contraseñas (bcrypt_sha256). Con
+    workers gevent el cálculo se ejecuta en un pool acotado de hilos reales
+    o de procesos, para que no bloquee el event loop mientras el worker
+    atiende otras peticiones.
+
+    Con workers sync o de hilos el hash se calcula en el hilo de la
+    petición: ``submit(...).result()`` bloquearía ese hilo el mismo tiempo
+    y sólo agregaría el traspaso al pool.
+
+    Configuración:
+    - PASSWORD_HASH_ROUNDS: costo de bcrypt, los hashes con otro costo se
+      recalculan al iniciar sesión (``needs_update``).
+    - PASSWORD_HASH_EXECUTOR: pool con workers gevent: 'thread' (hilos
+      reales fuera del event loop), 'process' o 'sync' (sin pool).
+    - PASSWORD_HASH_WORKERS: tamaño máximo del pool.
+    """
+
+    def __init__(self, app=None):
+        self.executor_type = 'sync'
+        self.max_workers = 1
+        self._executor = None
+        self._pid = None
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        rounds = app.config.get('PASSWORD_HASH_ROUNDS')
+        if rounds:
+            rounds = int(rounds)
+            pwd_context.update(
+                bcrypt_sha256__default_rounds=rounds,
+                bcrypt_sha256__min_rounds=rounds,
+                bcrypt_sha256__max_rounds=rounds)
+        self.shutdown()
+        self.executor_type = app.config.get('PASSWORD_HASH_EXECUTOR', 'thread')
+        self.max_workers = int(app.config.get('PASSWORD_HASH_WORKERS', 2))
+        app.extensions['password_hasher'] = self
+
+    def _get_executor(self):
+        """
+        Crea el pool de forma perezosa y lo vuelve a crear si el proceso
+        cambió (p. ej. después del fork de gunicorn). Sin gevent no se usa
+        pool.
+        """
+        if self.executor_type == 'sync' or not gevent_patched():
+            return None
+        with self._lock:
+            if self._executor is None or self._pid != os.getpid():
+                if self.executor_type == 'process':
+                    self._executor = ProcessPoolExecutor(self.max_workers)
+                else:
+                    self._executor = native_thread_pool(self.max_workers)
+                self._pid = os.getpid()
+            return self._executor
+
+    def _run(self, func, *args):
+        executor = self._get_executor()
+        operation = func.__name__.lstrip('_')
+        with timed('bcrypt'), PASSWORD_HASH_SECONDS.labels(operation).time():
+            if executor is None:
+                return func(*args)
+            return executor.submit(func, *args).result()
+
+    def hash(self, plaintext):
+        """Regresa el hash de ``plaintext``"""
+        return self._run(_hash, plaintext)
+
+    def verify(self, plaintext, hashed):
+        """Compara ``plaintext`` con ``hashed``"""
+        return self._run(_verify, plaintext, hashed)
+
+    def verify_and_update(self, plaintext, hashed):
+        """
+        Compara ``plaintext`` con ``hashed`` con una sola verificación.
+        Regresa una tupla ``(valid, new_hash)``, donde ``new_hash`` es None
+        salvo que la contraseña sea válida y el hash necesite actualizarse.
+        """
+        return self._run(_verify_and_update, plaintext, hashed)
+
+    def shutdown(self):
+        if self._executor is not None and self._pid == os.getpid():
+            self._executor.shutdown(wait=False)
+        self._executor = None
+        self._pid = None
@@ -0,0 +1,219 @@
+# -*- coding: utf-8 -*-
+import datetime
+import functools
+import threading
+import time
+from collections import defaultdict
+
+from flask import abort, current_app, request
+from flask_babelex import gettext as _
+from mongoengine.connection import get_db
+from pymongo.errors import DuplicateKeyError
+
+from .metrics import count_ratelimit
+
+
+def parse_rate(rate):
+    """
+    Convierte un string ``'capacidad/segundos'`` (p. ej. ``'5/60'``) en la
+    tupla ``(capacidad, tokens_por_segundo)``.
+    """
+    capacity, period = str(rate).split('/')
+    capacity = float(capacity)
+    return capacity, capacity / float(period)
+
+
+class MemoryBackend(object):
+    """
+    Token buckets en la memoria del proceso. Es el backend predeterminado,
+    cada worker de gunicorn lleva sus propios contadores.
+    """
+
+    def __init__(self, max_keys=10000, clock=time.time):
+        self.max_keys = max_keys
+        self.clock = clock
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def consume(self, key, capacity, refill_rate):
+        now = self.clock()
+        with self._lock:
+            tokens, last = self._buckets.get(key, (capacity, now))
+            tokens = min(capacity, tokens + (now - last) * refill_rate)
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+            if key not in self._buckets and \
+                    len(self._buckets) >= self.max_keys:
+                self._prune(now, refill_rate, capacity)
+            self._buckets[key] = (tokens, now)
+        return allowed
+
+    def _prune(self, now, refill_rate, capacity):
+        """Elimina los buckets que ya se llenaron (equivalen a uno nuevo)"""
+        for key, (tokens, last) in list(self._buckets.items()):
+            if tokens + (now - last) * refill_rate >= capacity:
+                del self._buckets[key]
+        if len(self._buckets) >= self.max_keys:
+            self._buckets.clear()
+
+    def reset(self):
+        with self._lock:
+            self._buckets.clear()
+
+
+class MongoBackend(object):
+    """
+    Token buckets compartidos entre workers en la colección
+    ``RATELIMIT_COLLECTION``. Cada bucket se actualiza con compare-and-set
+    sobre el campo ``ts`` y expira con un índice TTL.
+    """
+
+    def __init__(self, collection_name='rate_limits', clock=time.time,
+                 max_retries=5):
+        self.collection_name = collection_name
+        self.clock = clock
+        self.max_retries = max_retries
+        self._indexed = False
+
+    @property
+    def collection(self):
+        collection = get_db()[self.collection_name]
+        if not self._indexed:
+            collection.create_index('expires', expireAfterSeconds=0)
+            self._indexed = True
+        return collection
+
+    def consume(self, key, capacity, refill_rate):
+        collection = self.collection
+        for attempt in range(self.max_retries):
+            now = self.clock()
+            expires = datetime.datetime.utcfromtimestamp(
+                now + capacity / refill_rate)
+            bucket = collection.find_one({'_id': key})
+            if bucket is None:
+                try:
+                    collection.insert_one({'_id': key,
+                                           'tokens': capacity - 1,
+                                           'ts': now,
+                                           'expires': expires})
+                    return True
+                except DuplicateKeyError:
+                    continue
+            tokens = min(capacity,
+                         bucket['tokens'] + (now - bucket['ts']) * refill_rate)
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+            result = collection.update_one(
+                {'_id': key, 'ts': bucket['ts']},
+                {'$set': {'tokens': tokens, 'ts': now, 'expires': expires}})
+            if result.modified_count:
+                return allowed
+        # Demasiada contención sobre el mismo bucket
+        return False
+
+    def reset(self):
+        get_db()[self.collection_name].delete_many({})
+
+
+class RateLimiter(object):
+    """
+    Limita las peticiones POST de las vistas de autenticación con token
+    buckets por IP del cliente y por correo electrónico. La petición se
+    rechaza antes de consultar mongoDB o calcular algún hash.
+
+    La IP es ``request.remote_addr``: detrás de nginx o de otro proxy se
+    debe configurar PROXY_FIX para que sea la del cliente y no la del
+    proxy. Los contadores de ``stats`` se exportan en /metrics
+    (``biblat_ratelimit_requests_total``).
+
+    Configuración:
+    - RATELIMIT_ENABLED: activa el limitador.
+    - RATELIMIT_BACKEND: 'memory' (por proceso) o 'mongo' (compartido).
+    - RATELIMIT_IP / RATELIMIT_EMAIL: tasa ``'capacidad/segundos'``.
+    """
+
+    def __init__(self, app=None):
+        self.backend = None
+        self.enabled = False
+        self.rates = {}
+        self._stats = defaultdict(lambda: defaultdict(int))
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.enabled = app.config.get('RATELIMIT_ENABLED', True)
+        self.rates = {
+            'ip': parse_rate(app.config.get('RATELIMIT_IP', '30/60')),
+            'email': parse_rate(app.config.get('RATELIMIT_EMAIL', '5/60')),
+        }
+        backend = app.config.get('RATELIMIT_BACKEND', 'memory')
+        if backend == 'mongo':
+            self.backend = MongoBackend(
+                app.config.get('RATELIMIT_COLLECTION', 'rate_limits'))
+        elif backend == 'memory':
+            self.backend = MemoryBackend()
+        else:
+            raise ValueError('RATELIMIT_BACKEND inválido: %s' % backend)
+        self._stats.clear()
+        app.extensions['ratelimiter'] = self
+
+    def _count(self, scope, name):
+        with self._lock:
+            self._stats[scope][name] += 1
+        count_ratelimit(scope, name)
+
+    def hit(self, scope, ip=None, email=None):
+        """
+        Consume un token de los buckets de ``ip`` y ``email`` para ``scope``.
+        Regresa False si alguno de los buckets está vacío.
+        """
+        checks = (('ip', ip), ('email', email))
+        for key_type, value in checks:
+            if not value:
+                continue
+            capacity, refill_rate = self.rates[key_type]
+            key = '%s:%s:%s' % (scope, key_type, value)
+            if not self.backend.consume(key, capacity, refill_rate):
+                self._count(scope, 'rejected_%s' % key_type)
+                return False
+        self._count(scope, 'allowed')
+        return True
+
+    def limit(self, scope):
+        """
+        Decorador para vistas: las peticiones POST que superan el límite
+        regresan el estado 429.
+        """
+        def decorator(view):
+            @functools.wraps(view)
+            def wrapper(*args, **kwargs):
+                if self.enabled and request.method == 'POST':
+                    email = request.form.get('email', '').strip().lower()
+                    if not self.hit(scope, request.remote_addr, email):
+                        current_app.logger.warning(
+                            'Límite de peticiones excedido en %s: %s %s',
+                            scope, request.remote_addr, email)
+                        abort(429, _('Demasiados intentos, espere un '
+                                     'momento antes de volver a intentarlo'))
+                return view(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def stats(self):
+        """
+        Regresa los contadores por ``scope`` de este proceso: peticiones
+        permitidas y rechazadas por IP o por correo electrónico (trabajo
+        evitado). En /metrics se suman los de todos los workers.
+        """
+        with self._lock:
+            return {scope: dict(counts)
+                    for scope, counts in self._stats.items()}
+
+    def reset(self):
+        if self.backend is not None:
+            self.backend.reset()
+        with self._lock:
+            self._stats.clear()
@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+from functools import lru_cache
+
+from flask import current_app, g, has_app_context
+from mongoengine.queryset import QuerySet
+from pymongo import read_preferences
+
+MODES = {
+    'primary': read_preferences.Primary,
+    'primaryPreferred': read_preferences.PrimaryPreferred,
+    'secondary': read_preferences.Secondary,
+    'secondaryPreferred': read_preferences.SecondaryPreferred,
+    'nearest': read_preferences.Nearest,
+}
+
+
+@lru_cache(maxsize=None)
+def make_read_preference(mode, max_staleness=-1):
+    """
+    Regresa la preferencia de lectura de pymongo para ``mode``. Con
+    ``max_staleness`` (segundos, mínimo 90) se descartan los secundarios
+    con más retraso respecto al primario.
+    """
+    if mode not in MODES:
+        raise ValueError('Preferencia de lectura inválida: %s' % mode)
+    if mode == 'primary':
+        return read_preferences.Primary()
+    return MODES[mode](max_staleness=max_staleness)
+
+
+def listing_read_preference():
+    """
+    Preferencia de lectura de los listados y reportes
+    (MONGODB_LISTING_READ_PREFERENCE). El login y las escrituras usan
+    siempre el primario (la preferencia de la conexión).
+
+    Las vistas con ``collection_versions.conditional`` leen del primario
+    (``g.listing_from_primary``): el ETag se calcula con la versión leída
+    del primario y un secundario atrasado guardaría filas viejas bajo el
+    ETag nuevo, que se seguiría respondiendo con 304.
+    """
+    if has_app_context() and g.get('listing_from_primary'):
+        return make_read_preference('primary')
+    config = current_app.config
+    return make_read_preference(
+        config.get('MONGODB_LISTING_READ_PREFERENCE', 'primary'),
+        int(config.get('MONGODB_LISTING_MAX_STALENESS', -1)))
+
+
+def for_listing(source):
+    """
+    Regresa el queryset o la colección ``source`` con la preferencia de
+    lectura de los listados.
+    """
+    read_preference = listing_read_preference()
+    if isinstance(source, QuerySet):
+        return source.read_preference(read_preference)
+    return source.with_options(read_preference=read_preference)
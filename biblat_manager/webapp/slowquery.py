@@ -0,0 +1,302 @@
+# -*- coding: utf-8 -*-
+import datetime
+import json
+import logging
+import math
+import os
+import queue
+import threading
+import uuid
+from collections import OrderedDict
+
+from flask import g, has_request_context, request
+from mongoengine.connection import get_db
+from pymongo import monitoring
+from pymongo.errors import CollectionInvalid
+
+logger = logging.getLogger(__name__)
+
+# Partes del comando que describen la forma de la consulta
+SHAPE_KEYS = ('filter', 'query', 'sort', 'projection', 'hint', 'pipeline',
+              'updates', 'deletes')
+# Partes que no contienen datos de los usuarios y se guardan sin cambios
+UNREDACTED_KEYS = ('sort', 'projection', 'hint')
+# Comandos en curso que se conservan; los que no emiten ``succeeded`` ni
+# ``failed`` se descartan al superar el límite
+MAX_PENDING_COMMANDS = 1000
+# Registros que el hilo de escritura guarda con un solo ``insert_many``
+WRITE_BATCH_SIZE = 100
+
+
+def redact(value):
+    """
+    Reemplaza los valores de ``value`` por ``'?'`` conservando las llaves
+    (campos y operadores). De las listas sólo se conserva la forma del
+    primer elemento.
+    """
+    if isinstance(value, dict):
+        return {key: redact(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [redact(item) for item in value[:1]]
+    return '?'
+
+
+def command_collection(command_name, command):
+    collection = command.get(command_name)
+    if isinstance(collection, str):
+        return collection
+    # getMore guarda el id del cursor en lugar de la colección
+    return command.get('collection', '')
+
+
+def command_shape(command_name, command):
+    """Forma del comando, sin valores, como string JSON"""
+    shape = {command_name: command_collection(command_name, command)}
+    for key in SHAPE_KEYS:
+        if key in command:
+            value = command[key]
+            shape[key] = value if key in UNREDACTED_KEYS else redact(value)
+    return json.dumps(shape, default=str)
+
+
+def get_request_id():
+    """
+    Id de la petición en curso: el encabezado ``X-Request-ID`` del proxy o
+    uno nuevo. Se genera sólo cuando se necesita.
+    """
+    if not has_request_context():
+        return None
+    if 'request_id' not in g:
+        g.request_id = request.headers.get('X-Request-ID') or \
+            uuid.uuid4().hex
+    return g.request_id
+
+
+def percentile(values, percent):
+    """Percentil ``percent`` (0-100) por rango más cercano"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = int(math.ceil(percent / 100.0 * len(ordered))) - 1
+    return ordered[max(rank, 0)]
+
+
+class SlowQueryListener(monitoring.CommandListener):
+    """
+    Guarda en ``log`` los comandos más lentos que ``log.threshold_ms``. Los
+    eventos se emiten en el mismo hilo que ejecuta el comando, por lo que el
+    endpoint y el id de la petición se toman del contexto de Flask. Los
+    comandos sobre la colección del registro (las escrituras del propio
+    ``log``) se ignoran.
+    """
+
+    def __init__(self, log):
+        self.log = log
+        self._commands = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(event):
+        return event.connection_id, event.request_id
+
+    def started(self, event):
+        if not self.log.threshold_ms:
+            return
+        collection = command_collection(event.command_name, event.command)
+        if collection == self.log.collection_name:
+            return
+        with self._lock:
+            self._commands[self._key(event)] = event.command
+            while len(self._commands) > MAX_PENDING_COMMANDS:
+                self._commands.popitem(last=False)
+
+    def succeeded(self, event):
+        self._finish(event)
+
+    def failed(self, event):
+        self._finish(event)
+
+    def _finish(self, event):
+        with self._lock:
+            command = self._commands.pop(self._key(event), None)
+        if command is None:
+            return
+        duration_ms = event.duration_micros / 1000.0
+        if duration_ms < self.log.threshold_ms:
+            return
+        self.log.record(event.command_name, command, duration_ms)
+
+
+class SlowQueryLog(object):
+    """
+    Registro de consultas lentas en una colección capped de mongoDB, sin
+    necesidad de activar el profiler del servidor.
+
+    ``record`` sólo agrega el registro a una cola acotada; un hilo de cada
+    proceso los guarda por lotes, fuera de la petición y del listener de
+    pymongo. Si la cola está llena el registro se descarta (``dropped``).
+    El hilo crea la colección capped una sola vez, antes de la primera
+    escritura: ``init_app`` se ejecuta antes de conectar a mongoDB (y
+    también sin servidor, p. ej. en ``flask build-assets``).
+
+    Configuración:
+    - SLOW_QUERY_MS: umbral en milisegundos, con 0 se desactiva.
+    - SLOW_QUERY_COLLECTION: nombre de la colección.
+    - SLOW_QUERY_LOG_SIZE: tamaño máximo de la colección en bytes, con 0
+      se usa una colección normal.
+    - SLOW_QUERY_QUEUE_SIZE: registros pendientes de escribir por proceso.
+    """
+
+    def __init__(self):
+        self.threshold_ms = 0
+        self.collection_name = 'slow_queries'
+        self.log_size = 0
+        self.queue_size = 1000
+        self.dropped = 0
+        self._created = False
+        self._listener_registered = False
+        self._queue = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        """Debe llamarse antes de ``dbmongo.init_app``"""
+        self.threshold_ms = float(app.config.get('SLOW_QUERY_MS', 0))
+        self.collection_name = app.config.get('SLOW_QUERY_COLLECTION',
+                                              'slow_queries')
+        self.log_size = int(app.config.get('SLOW_QUERY_LOG_SIZE', 0))
+        self.queue_size = int(app.config.get('SLOW_QUERY_QUEUE_SIZE', 1000))
+        self.dropped = 0
+        self._created = False
+        self._stop_writer()
+        if self.threshold_ms and not self._listener_registered:
+            monitoring.register(SlowQueryListener(self))
+            self._listener_registered = True
+        app.extensions['slow_query_log'] = self
+
+    @property
+    def collection(self):
+        return get_db()[self.collection_name]
+
+    def create_collection(self):
+        """Crea la colección capped (``SLOW_QUERY_LOG_SIZE``) si no existe"""
+        db = get_db()
+        if self.log_size and \
+                self.collection_name not in db.list_collection_names():
+            try:
+                db.create_collection(self.collection_name, capped=True,
+                                     size=self.log_size)
+            except CollectionInvalid:
+                # Otro worker la creó
+                pass
+        self._created = True
+
+    def _writer_queue(self):
+        """
+        Cola del proceso actual; el hilo de escritura se inicia con el
+        primer registro y de nuevo después de un fork.
+        """
+        with self._lock:
+            if self._queue is None or self._pid != os.getpid():
+                self._queue = queue.Queue(maxsize=self.queue_size)
+                self._pid = os.getpid()
+                thread = threading.Thread(target=self._write_entries,
+                                          args=(self._queue,),
+                                          name='slow-query-log', daemon=True)
+                thread.start()
+            return self._queue
+
+    def _stop_writer(self):
+        with self._lock:
+            if self._queue is not None and self._pid == os.getpid():
+                try:
+                    self._queue.put_nowait(None)
+                except queue.Full:
+                    pass
+            self._queue = None
+
+    def _write_entries(self, entries_queue):
+        while True:
+            entries = []
+            stop = False
+            item = entries_queue.get()
+            while True:
+                if item is None:
+                    stop = True
+                else:
+                    entries.append(item)
+                if stop or len(entries) >= WRITE_BATCH_SIZE:
+                    break
+                try:
+                    item = entries_queue.get_nowait()
+                except queue.Empty:
+                    break
+            if entries:
+                try:
+                    if not self._created:
+                        self.create_collection()
+                    self.collection.insert_many(entries, ordered=False)
+                except Exception as e:
+                    logger.warning('No se pudieron registrar %d consultas '
+                                   'lentas: %s', len(entries), e)
+            for _ in range(len(entries) + stop):
+                entries_queue.task_done()
+            if stop:
+                return
+
+    def flush(self):
+        """Espera a que se escriban los registros pendientes"""
+        entries_queue = self._queue
+        if entries_queue is not None and self._pid == os.getpid():
+            entries_queue.join()
+
+    def record(self, command_name, command, duration_ms):
+        endpoint = request.endpoint if has_request_context() else None
+        entry = {
+            'shape': command_shape(command_name, command),
+            'command': command_name,
+            'collection': command_collection(command_name, command),
+            'duration_ms': duration_ms,
+            'endpoint': endpoint,
+            'request_id': get_request_id(),
+            'created_at': datetime.datetime.utcnow(),
+        }
+        try:
+            self._writer_queue().put_nowait(entry)
+        except queue.Full:
+            self.dropped += 1
+
+    def summary(self, read_preference=None):
+        """
+        Agrupa las consultas registradas por forma. Regresa una lista de
+        diccionarios con ``shape``, ``command``, ``collection``, ``count``,
+        ``p95_ms``, ``max_ms``, ``endpoints`` y ``last_seen``, ordenada por
+        el tiempo total. ``read_preference`` permite leer de un secundario.
+        """
+        collection = self.collection
+        if read_preference is not None:
+            collection = collection.with_options(
+                read_preference=read_preference)
+        pipeline = [{'$group': {
+            '_id': '$shape',
+            'command': {'$first': '$command'},
+            'collection': {'$first': '$collection'},
+            'count': {'$sum': 1},
+            'durations': {'$push': '$duration_ms'},
+            'max_ms': {'$max': '$duration_ms'},
+            'endpoints': {'$addToSet': '$endpoint'},
+            'last_seen': {'$max': '$created_at'},
+        }}]
+        groups = []
+        for group in collection.aggregate(pipeline):
+            durations = group.pop('durations')
+            group['shape'] = group.pop('_id')
+            group['p95_ms'] = percentile(durations, 95)
+            group['total_ms'] = sum(durations)
+            group['endpoints'] = sorted(e for e in group['endpoints'] if e)
+            groups.append(group)
+        groups.sort(key=lambda group: group['total_ms'], reverse=True)
+        return groups
+
+    def clear(self):
+        self.collection.delete_many({})
@@ -0,0 +1,182 @@
+# -*- coding: utf-8 -*-
+import logging
+import time
+
+from mongoengine.connection import get_db
+from pymongo.errors import (AutoReconnect, DuplicateKeyError,
+                            OperationFailure, PyMongoError)
+
+from . import collection_versions
+from .models import Checkpoint, User, invalidate_user_ids
+from .slowquery import percentile
+
+logger = logging.getLogger(__name__)
+
+MIGRATION_CHECKPOINT = 'migrate-user-ids'
+INSERT_RETRIES = 3
+
+
+def id_format_counts(collection):
+    """Número de documentos con el id como string y como UUID binario"""
+    return {
+        'string': collection.count_documents({'_id': {'$type': 'string'}}),
+        'binary': collection.count_documents({'_id': {'$type': 'binData'}}),
+    }
+
+
+def index_sizes(collection):
+    """
+    Tamaño en bytes de los índices de ``collection`` y tamaño promedio de
+    los documentos (``collStats``). Regresa None si el servidor no lo
+    soporta (mongomock).
+    """
+    try:
+        stats = get_db().command({'collStats': collection.name})
+    except (OperationFailure, NotImplementedError):
+        return None
+    return {
+        'total_index_size': stats.get('totalIndexSize'),
+        'index_sizes': stats.get('indexSizes', {}),
+        'avg_obj_size': stats.get('avgObjSize'),
+    }
+
+
+def lookup_latency(collection, samples=200):
+    """
+    Latencia en milisegundos de ``find_one`` por ``_id`` para ``samples``
+    ids de la colección (p50, p95 y media).
+    """
+    ids = [doc['_id'] for doc in
+           collection.find({}, {'_id': 1}).limit(samples)]
+    durations = []
+    for user_id in ids:
+        start = time.perf_counter()
+        collection.find_one({'_id': user_id}, {'_id': 1})
+        durations.append((time.perf_counter() - start) * 1000)
+    return {
+        'count': len(durations),
+        'p50_ms': percentile(durations, 50),
+        'p95_ms': percentile(durations, 95),
+        'mean_ms': sum(durations) / len(durations) if durations else 0.0,
+    }
+
+
+def user_id_report(samples=200):
+    """Formato de los ids, tamaño de los índices y latencia de búsqueda"""
+    collection = User._get_collection()
+    return {
+        'ids': id_format_counts(collection),
+        'indexes': index_sizes(collection),
+        'lookup': lookup_latency(collection, samples),
+    }
+
+
+def _replace_one(collection, user_id, backup=None):
+    """
+    Reemplaza el documento con id string ``user_id`` por una copia con el
+    id binario. Se borra antes de insertar porque ``username`` es único.
+
+    ``find_one_and_delete`` lee y borra el documento en una sola operación,
+    de modo que la copia incluye cualquier cambio hecho después de leer el
+    lote. Entre el borrado y la inserción (un round-trip) el usuario no
+    existe: una petición en ese intervalo no lo encuentra (``load_user``
+    cierra su sesión o falla el login) y una escritura de un ``User``
+    cargado antes se pierde. La inserción se reintenta si se pierde la
+    conexión; si no se logra se restaura el documento original.
+
+    ``backup`` es la copia del ``Checkpoint`` de un lote interrumpido: sólo
+    se inserta si el documento no existe con ninguno de los dos ids.
+    Regresa False si no se pudo migrar el documento.
+    """
+    binary_id = User._fields['_id'].to_mongo(user_id)
+    doc = collection.find_one_and_delete({'_id': user_id})
+    if doc is None:
+        if backup is None or \
+                collection.find_one({'_id': binary_id}, {'_id': 1}):
+            # Ya migrado o borrado después de leer el lote
+            return True
+        doc = backup
+    for attempt in range(INSERT_RETRIES):
+        try:
+            collection.insert_one(dict(doc, _id=binary_id))
+            return True
+        except DuplicateKeyError:
+            if collection.find_one({'_id': binary_id}, {'_id': 1}):
+                return True
+            break
+        except AutoReconnect:
+            time.sleep(0.1 * 2 ** attempt)
+    try:
+        collection.insert_one(doc)
+    except PyMongoError as e:
+        # Queda la copia del Checkpoint para la siguiente ejecución
+        logger.error('No se pudo restaurar el usuario %s: %s', user_id, e)
+    return False
+
+
+def _replace(collection, docs, restore=False):
+    """
+    Migra los documentos ``docs`` uno por uno (``_replace_one``); con
+    ``restore`` se usan como respaldo. Regresa el número de documentos
+    que no se pudieron migrar.
+    """
+    return len([doc for doc in docs
+                if not _replace_one(collection, doc['_id'],
+                                    doc if restore else None)])
+
+
+def migrate_user_ids(batch_size=1000, dry_run=False, progress=None):
+    """
+    Migra los ids string de los usuarios a UUID binario por lotes de
+    ``batch_size``, documento por documento (``_replace_one``). Antes de
+    reemplazar cada lote se guarda una copia en un ``Checkpoint``; si el
+    proceso se interrumpe, la siguiente ejecución termina ese lote
+    (restaurando la copia de los documentos que se borraron y no se
+    insertaron) y continúa después del último id procesado. Los ids que
+    no son hexadecimales de 32 caracteres se omiten.
+    Con ``dry_run`` sólo se cuentan los documentos a migrar.
+    Regresa un diccionario con ``migrated``, ``skipped`` y ``failed``.
+    """
+    collection = User._get_collection()
+    id_field = User._fields['_id']
+    summary = {'migrated': 0, 'skipped': 0, 'failed': 0}
+    query = {'_id': {'$type': 'string'}}
+    if dry_run:
+        for doc in collection.find(query, {'_id': 1}):
+            valid = id_field._is_hex(doc['_id'])
+            summary['migrated' if valid else 'skipped'] += 1
+        return summary
+
+    checkpoint = Checkpoint.objects(name=MIGRATION_CHECKPOINT).first()
+    last_id = None
+    if checkpoint is not None:
+        data = dict(checkpoint.data or {})
+        pending = data.pop('pending', [])
+        summary.update(data)
+        last_id = checkpoint.position
+        if pending:
+            failed = _replace(collection, pending, restore=True)
+            summary['failed'] += failed
+            summary['migrated'] += len(pending) - failed
+    while True:
+        if last_id is not None:
+            query['_id']['$gt'] = last_id
+        docs = list(collection.find(query).sort('_id', 1).limit(batch_size))
+        if not docs:
+            break
+        last_id = docs[-1]['_id']
+        valid = [doc for doc in docs if id_field._is_hex(doc['_id'])]
+        summary['skipped'] += len(docs) - len(valid)
+        if valid:
+            Checkpoint.save_position(MIGRATION_CHECKPOINT, last_id,
+                                     pending=valid, **summary)
+            failed = _replace(collection, valid)
+            summary['failed'] += failed
+            summary['migrated'] += len(valid) - failed
+            invalidate_user_ids(doc['_id'] for doc in valid)
+            collection_versions.bump(collection.name)
+        Checkpoint.save_position(MIGRATION_CHECKPOINT, last_id, **summary)
+        if progress:
+            progress(len(docs))
+    Checkpoint.clear(MIGRATION_CHECKPOINT)
+    return summary
@@ -1,18 +1,14 @@
 # -*- coding: utf-8 -*-
-import re
 import uuid
 from itsdangerous import URLSafeTimedSerializer
 from flask import current_app
 from flask_mail import Message
-from passlib.context import CryptContext
 from biblat_manager.webapp import mail
-
-REGEX_EMAIL = re.compile(
-    r"[a-z0-9!#$%&'*+/=?^_`{|}~-]+(?:\.[a-z0-9!#$%&'*+/=?^_`{|}~-]+)*@(?:["
-    r"a-z0-9](?:[a-z0-9-]*[a-z0-9])?\.)+[a-z0-9](?:[a-z0-9-]*[a-z0-9])?",
-    re.IGNORECASE)  # RFC 2822 (simplified)
-
-pwd_context = CryptContext(schemes=['bcrypt_sha256'])
+from biblat_manager.webapp.emailvalidator import (is_valid_email,
+                                                  validate_emails)  # NOQA
+from biblat_manager.webapp.instrumentation import timed
+from biblat_manager.webapp.metrics import count_mail
+from biblat_manager.webapp.passwords import pwd_context  # NOQA
 
 
 def generate_uuid_32_string():
@@ -27,10 +23,7 @@ def get_timed_serializer():
 
 
 def check_valid_email(email):
-    validation = True
-    if not REGEX_EMAIL.match(email):
-        validation = False
-    return validation
+    return is_valid_email(email)
 
 
 def send_email(recipient, subject, html):
@@ -52,7 +45,9 @@ def send_email(recipient, subject, html):
                       sender=current_app.config['MAIL_DEFAULT_SENDER'],
                       recipients=recipients,
                       html=html)
-        mail.send(msg)
+        with timed('smtp'):
+            mail.send(msg)
         return True, ''
     except Exception as e:
+        count_mail('failed')
         return False, e
@@ -0,0 +1,132 @@
+# -*- coding: utf-8 -*-
+import datetime
+import functools
+import hashlib
+import time
+
+from flask import current_app, g, request, session
+from flask_babelex import get_locale
+from flask_login import current_user
+from mongoengine import signals
+from mongoengine.connection import get_db
+
+
+class CollectionVersions(object):
+    """
+    Contador de versión por colección, guardado en mongoDB para que lo
+    compartan todos los workers. Cada escritura de un documento registrado
+    con ``track`` incrementa la versión de su colección; las escrituras
+    directas con pymongo (``insert_many``, ``update_many``...) deben llamar
+    a ``bump``.
+
+    ``conditional(*colecciones)`` es un decorador para vistas GET que
+    calcula un ETag fuerte y ``Last-Modified`` a partir de las versiones y
+    responde ``304 Not Modified`` antes de ejecutar la vista. Sólo se
+    compara ``If-None-Match``: la fecha de modificación no distingue el
+    idioma ni el usuario. Las vistas decoradas leen los listados del
+    primario, igual que las versiones.
+
+    Configuración:
+    - CONDITIONAL_GET: activa las respuestas condicionales (default: True).
+    - CONDITIONAL_GET_WINDOW: segundos de vigencia del ETag aunque no haya
+      cambios, para no reutilizar indefinidamente el token CSRF de la
+      página (default: 1800).
+    """
+
+    def __init__(self, collection_name='collection_versions'):
+        self.collection_name = collection_name
+        self.enabled = True
+        self.window = 1800
+
+    def init_app(self, app):
+        self.enabled = app.config.get('CONDITIONAL_GET', True)
+        self.window = int(app.config.get('CONDITIONAL_GET_WINDOW', 1800))
+        app.extensions['collection_versions'] = self
+
+    @property
+    def collection(self):
+        return get_db()[self.collection_name]
+
+    def bump(self, *names):
+        """Incrementa la versión de las colecciones ``names``"""
+        now = datetime.datetime.utcnow().replace(microsecond=0)
+        for name in names:
+            self.collection.update_one(
+                {'_id': name},
+                {'$inc': {'version': 1}, '$set': {'updated_at': now}},
+                upsert=True)
+
+    def get(self, names):
+        """
+        Regresa ``{colección: (versión, updated_at)}`` con una sola
+        consulta; las colecciones sin escrituras tienen la versión 0.
+        """
+        versions = dict((name, (0, None)) for name in names)
+        for doc in self.collection.find({'_id': {'$in': list(names)}}):
+            versions[doc['_id']] = (doc.get('version', 0),
+                                    doc.get('updated_at'))
+        return versions
+
+    def _bump_document(self, sender, document, **kwargs):
+        self.bump(sender._get_collection_name())
+
+    def track(self, document_cls):
+        """Incrementa la versión al guardar o borrar ``document_cls``"""
+        signals.post_save.connect(self._bump_document, sender=document_cls,
+                                  weak=False)
+        signals.post_delete.connect(self._bump_document,
+                                    sender=document_cls, weak=False)
+
+    def etag(self, versions):
+        """
+        ETag de la petición: versiones de las colecciones, URL, idioma,
+        usuario, estado del menú (``session['menutoggle']``, lo usa
+        ``base_layout.html``) y ventana de tiempo
+        (``CONDITIONAL_GET_WINDOW``).
+        """
+        parts = ['%s:%d' % (name, version)
+                 for name, (version, _) in sorted(versions.items())]
+        parts.extend([
+            request.full_path,
+            str(get_locale()),
+            (current_user.get_id() or '') if current_user else '',
+            session.get('menutoggle', ''),
+            str(int(time.time() // self.window)) if self.window else '',
+        ])
+        return hashlib.sha1('|'.join(parts).encode('utf-8')).hexdigest()
+
+    def conditional(self, *names):
+        """
+        Decorador para vistas cuyo contenido sólo depende de las colecciones
+        ``names``, el idioma y el usuario.
+        """
+        def decorator(view):
+            @functools.wraps(view)
+            def wrapper(*args, **kwargs):
+                # Los mensajes flash pendientes forman parte de la página
+                if not self.enabled or request.method != 'GET' or \
+                        session.get('_flashes'):
+                    return view(*args, **kwargs)
+                versions = self.get(names)
+                etag = self.etag(versions)
+                # El contenido debe ser tan reciente como las versiones
+                # (ver ``readpreference.listing_read_preference``)
+                g.listing_from_primary = True
+                modified = [updated_at for _, updated_at in versions.values()
+                            if updated_at is not None]
+                last_modified = max(modified) if modified else None
+                if request.if_none_match.contains(etag):
+                    response = current_app.response_class(status=304)
+                else:
+                    response = current_app.make_response(
+                        view(*args, **kwargs))
+                    if response.status_code != 200:
+                        return response
+                response.set_etag(etag)
+                if last_modified is not None:
+                    response.last_modified = last_modified
+                response.headers['Cache-Control'] = 'private, no-cache'
+                response.vary.add('Cookie')
+                return response
+            return wrapper
+        return decorator
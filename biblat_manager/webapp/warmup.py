@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+import time
+from collections import OrderedDict
+
+from babel import Locale
+from flask import _request_ctx_stack, current_app
+from flask_babelex import get_domain
+from mongoengine.connection import get_db
+
+from .metrics import FIRST_REQUEST_SECONDS, WORKER_BOOT_SECONDS
+
+
+def warm_templates(app):
+    """Compila todas las plantillas (usa el bytecode en disco si existe)"""
+    names = [name for name in app.jinja_env.list_templates()
+             if name.endswith(('.html', '.txt'))]
+    for name in names:
+        app.jinja_env.get_template(name)
+    return len(names)
+
+
+def warm_translations(app):
+    """Carga los catálogos de cada idioma de ``LANGUAGES``"""
+    babel = app.extensions['babel']
+    languages = list(app.config.get('LANGUAGES', {}))
+    for language in languages:
+        locale = babel.load_locale(language)
+        with app.test_request_context():
+            # Flask-BabelEx guarda el catálogo por idioma en el dominio
+            _request_ctx_stack.top.babel_locale = locale or \
+                Locale.parse(language)
+            get_domain().get_translations()
+    return len(languages)
+
+
+def warm_mongo(app):
+    """Abre la conexión a mongoDB del worker (después del fork)"""
+    with app.app_context():
+        get_db().command('ping')
+    return 1
+
+
+WARMERS = OrderedDict([
+    ('templates', warm_templates),
+    ('translations', warm_translations),
+    ('mongo', warm_mongo),
+])
+
+
+def warm_up(app, started=None):
+    """
+    Prepara un worker antes de que reciba peticiones. Regresa un
+    diccionario ``paso -> (segundos, elementos)``; si se indica ``started``
+    (``time.perf_counter()`` al hacer el fork) incluye ``boot``, el tiempo
+    total de arranque del worker.
+    """
+    timings = OrderedDict()
+    for name, warmer in WARMERS.items():
+        start = time.perf_counter()
+        try:
+            count = warmer(app)
+        except Exception as e:
+            app.logger.warning('Warm-up de %s fallido: %s', name, e)
+            count = 0
+        timings[name] = (time.perf_counter() - start, count)
+    if started is not None:
+        boot = time.perf_counter() - started
+        timings['boot'] = (boot, 1)
+        WORKER_BOOT_SECONDS.observe(boot)
+    return timings
+
+
+def format_timings(timings):
+    return ', '.join('%s=%.1fms (%d)' % (name, seconds * 1000, count)
+                     for name, (seconds, count) in timings.items())
+
+
+class FirstRequestTimer(object):
+    """Mide la latencia de la primera petición que atiende el proceso"""
+
+    def __init__(self):
+        self.pending = True
+        self.seconds = None
+
+    def init_app(self, app):
+        self.pending = True
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+
+    def _before_request(self):
+        if self.pending:
+            self._start = time.perf_counter()
+
+    def _after_request(self, response):
+        if self.pending and getattr(self, '_start', None) is not None:
+            self.pending = False
+            self.seconds = time.perf_counter() - self._start
+            FIRST_REQUEST_SECONDS.observe(self.seconds)
+            current_app.logger.info('Primera petición del worker: %.1fms',
+                                    self.seconds * 1000)
+        return response